@@ -14,3 +14,12 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+# Serving workers can load the TTS model up front instead of on the
+# first narration request (see TTS_PRELOAD in settings).
+from django.conf import settings
+
+if settings.TTS_PRELOAD:
+    from lessons.tts_kokoro import warm
+
+    warm(settings.TTS_PRELOAD_LANGS)
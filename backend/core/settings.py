@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "lessons.metrics.TimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -56,10 +57,16 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "lessons.authentication.JWTAuthentication",
     ),
 }
 
+# Users resolved from JWTs are cached per process by (user id, jti) and
+# dropped when the user is saved or deleted. Other workers pick up a
+# change within the TTL. AUTH_USER_CACHE_TTL=0 disables the cache.
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", "60"))  # seconds
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+
 ROOT_URLCONF = 'core.urls'
 
 
@@ -92,6 +99,25 @@ DATABASES = {
     }
 }
 
+# DB_PROFILE=production keeps connections open between requests and
+# switches SQLite to WAL so readers don't block on the writer.
+DB_PROFILE = os.getenv("DB_PROFILE", "default")
+SQLITE_PRAGMAS = {}
+
+if DB_PROFILE == "production":
+    DATABASES["default"].update({
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "600")),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {"timeout": 20},
+    })
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 20000,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -137,5 +163,102 @@ CORS_ALLOWED_ORIGINS = os.getenv("CORS_ALLOWED_ORIGINS", "").split(",")
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+MEDIA_MAX_AGE = int(os.getenv("MEDIA_MAX_AGE", str(365 * 24 * 3600)))
+# "" serves bytes from Django; "x-accel-redirect" (nginx) or "x-sendfile"
+# hands the body to the fronting server.
+MEDIA_ACCEL = os.getenv("MEDIA_ACCEL", "")
+MEDIA_ACCEL_PREFIX = os.getenv("MEDIA_ACCEL_PREFIX", "/protected-media/")
+
+# Uploads always go to a temp file in chunks, never into memory, and are
+# post-processed (thumbnail sizes, MP4 faststart + duration) after commit.
+FILE_UPLOAD_HANDLERS = ["django.core.files.uploadhandler.TemporaryFileUploadHandler"]
+FILE_UPLOAD_TEMP_DIR = os.getenv("FILE_UPLOAD_TEMP_DIR") or None
+UPLOAD_AUTOPROCESS = os.getenv("UPLOAD_AUTOPROCESS", "True") == "True"
+THUMBNAIL_WIDTHS = [int(w) for w in os.getenv("THUMBNAIL_WIDTHS", "160,320,640").split(",")]
+THUMBNAIL_FORMATS = os.getenv("THUMBNAIL_FORMATS", "webp,jpeg").split(",")
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
 VOICE_RSS_API_KEY = os.getenv("VOICE_RSS_API_KEY")
-FINE_VOICE_API_KEY = os.getenv("FINE_VOICE_API_KEY")
\ No newline at end of file
+FINE_VOICE_API_KEY = os.getenv("FINE_VOICE_API_KEY")
+
+# Kokoro TTS
+# "kokoro" (PyTorch), "onnx" (ONNX Runtime) or "fake" (deterministic offline stand-in for tests and benchmarks)
+TTS_ENGINE = os.getenv("TTS_ENGINE", "kokoro")
+TTS_FAKE_RTF = float(os.getenv("TTS_FAKE_RTF", "0"))
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "2"))  # 0 = synthesize in the request thread
+# ONNX engine: a Kokoro-82M ONNX export (config.json, onnx/model*.onnx,
+# optionally voices/*.bin). Threads are per TTS worker process; intra-op
+# defaults to cores / workers so the workers don't oversubscribe the CPU.
+# 0 = ORT default (all cores).
+TTS_ONNX_DIR = os.getenv("TTS_ONNX_DIR", os.path.join(BASE_DIR, "kokoro-onnx"))
+TTS_ONNX_PRECISION = os.getenv("TTS_ONNX_PRECISION", "fp32")  # fp32 or int8 (quantized)
+TTS_ONNX_INTRA_OP_THREADS = int(
+    os.getenv("TTS_ONNX_INTRA_OP_THREADS") or max(1, (os.cpu_count() or 1) // max(1, TTS_WORKERS))
+)
+TTS_ONNX_INTER_OP_THREADS = int(os.getenv("TTS_ONNX_INTER_OP_THREADS", "0"))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(BASE_DIR, "tts_cache"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_MB", "512")) * 1024 * 1024
+# Single-file voice pack written by `manage.py pack_voices`, memory-mapped
+# by every worker. Voices missing from it are fetched by Kokoro as before.
+TTS_VOICE_PACK = os.getenv("TTS_VOICE_PACK", os.path.join(BASE_DIR, "voices.kvpack"))
+TTS_PRELOAD = os.getenv("TTS_PRELOAD", "False") == "True"
+TTS_PRELOAD_LANGS = os.getenv("TTS_PRELOAD_LANGS", "a").split(",")
+TTS_QUEUE_DEPTH = int(os.getenv("TTS_QUEUE_DEPTH", "8"))
+TTS_TIMEOUT = float(os.getenv("TTS_TIMEOUT", "60"))
+TTS_RETRY_AFTER = int(os.getenv("TTS_RETRY_AFTER", "5"))
+TTS_BATCH_WINDOW_MS = int(os.getenv("TTS_BATCH_WINDOW_MS", "20"))
+TTS_BATCH_MAX = int(os.getenv("TTS_BATCH_MAX", "8"))
+# Total text per batched job, so a full group still renders within TTS_TIMEOUT. 0 = no limit
+TTS_BATCH_MAX_CHARS = int(os.getenv("TTS_BATCH_MAX_CHARS", "2000"))
+TTS_NARRATION_FORMAT = os.getenv("TTS_NARRATION_FORMAT", "ogg")  # ogg (Opus) or mp3
+TTS_NARRATION_AUTORENDER = os.getenv("TTS_NARRATION_AUTORENDER", "True") == "True"
+TTS_NARRATION_BITRATE = int(os.getenv("TTS_NARRATION_BITRATE", "32"))  # kbps
+TTS_SEGMENT_CACHE_MAX_BYTES = int(os.getenv("TTS_SEGMENT_CACHE_MB", "64")) * 1024 * 1024
+TTS_PHONEME_CACHE_SIZE = int(os.getenv("TTS_PHONEME_CACHE_SIZE", "4096"))  # segments, 0 = off
+TTS_PHONEME_CACHE_DIR = os.getenv("TTS_PHONEME_CACHE_DIR", "")  # "" = memory only
+TTS_FALLBACK_BACKEND = os.getenv("TTS_FALLBACK_BACKEND", "voicerss")  # "" disables failover
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "False") == "True"  # async TTS/catalog views; needs an ASGI server
+# Async catalog reads run on the shared thread pool, each thread with its
+# own connection. True keeps them on the one thread-sensitive thread, for
+# setups where that connection must be shared (SQLite in memory, tests).
+ASYNC_CATALOG_THREAD_SENSITIVE = os.getenv("ASYNC_CATALOG_THREAD_SENSITIVE", "False") == "True"
+VOICE_RSS_URL = os.getenv("VOICE_RSS_URL", "https://api.voicerss.org/")
+VOICE_RSS_TIMEOUT = float(os.getenv("VOICE_RSS_TIMEOUT", "10"))
+VOICE_RSS_RETRIES = int(os.getenv("VOICE_RSS_RETRIES", "2"))
+
+# Topic catalog response cache. Without CATALOG_CACHE_DIR it lives in
+# local memory, one copy per process: an edit only invalidates the worker
+# that saved it, and every other worker keeps serving the old catalog
+# (and ETag) until its entries expire. So the TTL defaults to 30 seconds
+# there, and to a day only with a shared directory that all workers read.
+# Multi-process deployments should set CATALOG_CACHE_DIR.
+CATALOG_CACHE_ALIAS = "catalog"
+CATALOG_CACHE_DIR = os.getenv("CATALOG_CACHE_DIR", "")
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", "60"))
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", "86400" if CATALOG_CACHE_DIR else "30"))  # seconds
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "catalog": (
+        {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": CATALOG_CACHE_DIR,
+        }
+        if CATALOG_CACHE_DIR
+        else {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "catalog",
+        }
+    ),
+}
+
+# Buffered progress writes (POST /api/gamification/bulk-progress/)
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "2"))  # seconds, 0 = write immediately
+PROGRESS_FLUSH_SIZE = int(os.getenv("PROGRESS_FLUSH_SIZE", "500"))
+LEADERBOARD_REFRESH = float(os.getenv("LEADERBOARD_REFRESH", "30"))  # seconds
+# GET /api/gamification/sync/ watermarks trail the clock by this much.
+PROGRESS_SYNC_LAG = float(os.getenv("PROGRESS_SYNC_LAG", "10"))  # seconds
+
+# Request timing: Server-Timing headers and Prometheus text at /metrics.
+# Off by default; when off the middleware and spans are no-ops.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "False") == "True"
@@ -1,6 +1,8 @@
 from django.contrib import admin
-from .models import Topic, Media, GamificationProgress
+from .models import Topic, Media, GamificationProgress, LearnerSummary, TopicStats
 
 admin.site.register(Topic)
 admin.site.register(Media)
 admin.site.register(GamificationProgress)
+admin.site.register(LearnerSummary)
+admin.site.register(TopicStats)
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class LessonsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'lessons'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .db import tune_sqlite
+
+        connection_created.connect(tune_sqlite, dispatch_uid="lessons.tune_sqlite")
@@ -0,0 +1,193 @@
+# lessons/async_views.py
+# Async counterparts of the TTS and read-only catalog views, routed in
+# place of the sync ones when ASYNC_VIEWS is on (run under an ASGI server).
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+
+from .catalog_cache import aserve_cached
+from .tts_backends import asynthesize_with_failover
+from .tts_kokoro import STREAM_FORMATS, make_encoding
+from .tts_pool import TTSQueueFull, TTSTimeout
+from .views import (
+    MediaViewSet,
+    TopicViewSet,
+    _negotiate_format,
+    _pooled_stream,
+    kokoro_voices,
+)
+
+
+# =======================
+#  CATALOG (READ-ONLY)
+# =======================
+def _closing_connections(view):
+    def render(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            # request_finished only closes the main thread's connections.
+            close_old_connections()
+    return render
+
+
+def async_catalog_view(view):
+    """
+    Wrap a sync catalog view. Cache hits and 304s are answered on the
+    event loop; a miss (or a write) runs the DRF view on a thread, which
+    renders, paginates and stores the response as before.
+
+    Reads only query and render, so they run on the shared thread pool
+    rather than queueing behind every other request on the single
+    thread-sensitive one (see ASYNC_CATALOG_THREAD_SENSITIVE). Writes
+    keep that thread for their transaction and on_commit hooks.
+    """
+    read = _closing_connections(view)
+    write = sync_to_async(view)
+
+    async def wrapper(request, *args, **kwargs):
+        if request.method in ("GET", "HEAD"):
+            render = sync_to_async(read, thread_sensitive=settings.ASYNC_CATALOG_THREAD_SENSITIVE)
+        else:
+            render = write
+        return await aserve_cached(request, lambda: render(request, *args, **kwargs))
+
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+topic_list = async_catalog_view(TopicViewSet.as_view({"get": "list", "post": "create"}))
+topic_detail = async_catalog_view(TopicViewSet.as_view({
+    "get": "retrieve",
+    "put": "update",
+    "patch": "partial_update",
+    "delete": "destroy",
+}))
+media_list = async_catalog_view(MediaViewSet.as_view({"get": "list", "post": "create"}))
+media_detail = async_catalog_view(MediaViewSet.as_view({
+    "get": "retrieve",
+    "put": "update",
+    "patch": "partial_update",
+    "delete": "destroy",
+}))
+voices = async_catalog_view(kokoro_voices)
+
+
+# =======================
+#  TEXT-TO-SPEECH (Kokoro)
+# =======================
+def _error(message, status):
+    return JsonResponse({"error": message}, status=status)
+
+
+def _queue_full(exc):
+    response = _error(str(exc), 503)
+    response["Retry-After"] = str(exc.retry_after)
+    return response
+
+
+def _request_data(request):
+    if request.content_type == "application/json":
+        data = json.loads(request.body or b"{}")
+        if not isinstance(data, dict):
+            raise ValueError("Request body must be a JSON object")
+        return data
+    return request.POST
+
+
+async def _in_thread(chunks):
+    # Each chunk is produced on a worker thread; no thread is held while
+    # the client reads it.
+    done = object()
+    try:
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, done)
+            if chunk is done:
+                return
+            yield chunk
+    finally:
+        try:
+            chunks.close()
+        except ValueError:
+            # Cancelled mid-chunk: the thread still owns the generator,
+            # which is closed when it is collected instead.
+            pass
+
+
+async def tts_kokoro(request):
+    if request.method != "POST":
+        return _error(f'Method "{request.method}" not allowed.', 405)
+
+    try:
+        data = _request_data(request)
+    except json.JSONDecodeError:
+        return _error("Malformed JSON", 400)
+    except ValueError as e:
+        return _error(str(e), 400)
+
+    text = data.get("text")
+    voice = data.get("voice", "af_heart")
+    speed = data.get("speed", 1.0)
+    stream = data.get("stream", False)
+    fmt = data.get("format")
+
+    if not text:
+        return _error("Text is required", 400)
+
+    try:
+        speed = float(speed)
+    except Exception:
+        speed = 1.0
+
+    if stream in (True, "true", "1", 1):
+        fmt = fmt or "wav"
+        if fmt not in STREAM_FORMATS:
+            return _error(f"Unsupported stream format: {fmt}", 400)
+
+        chunks = _in_thread(_pooled_stream(text, voice, speed, fmt))
+        try:
+            first = await anext(chunks)
+        except TTSQueueFull as e:
+            return _queue_full(e)
+        except TTSTimeout as e:
+            return _error(str(e), 504)
+        except Exception as e:
+            return _error(str(e), 500)
+
+        async def body():
+            yield first
+            async for chunk in chunks:
+                yield chunk
+
+        response = StreamingHttpResponse(body(), content_type=STREAM_FORMATS[fmt])
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    try:
+        encoding = make_encoding(
+            fmt or _negotiate_format(request.headers.get("Accept")),
+            bitrate=data.get("bitrate"),
+            sample_rate=data.get("sample_rate"),
+        )
+    except (TypeError, ValueError) as e:
+        return _error(str(e), 400)
+
+    try:
+        audio_bytes, backend = await asynthesize_with_failover(text, voice, speed, encoding)
+        response = HttpResponse(audio_bytes, content_type=encoding.content_type)
+        response["Vary"] = "Accept"
+        response["X-TTS-Backend"] = backend
+        return response
+    except TTSQueueFull as e:
+        return _queue_full(e)
+    except TTSTimeout as e:
+        return _error(str(e), 504)
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+tts_kokoro.csrf_exempt = True
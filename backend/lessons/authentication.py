@@ -0,0 +1,122 @@
+# lessons/authentication.py
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .metrics import span
+
+
+class UserCache:
+    """
+    Process-local LRU of resolved users keyed by (user id, token jti),
+    each entry kept for ``ttl`` seconds or until the token expires,
+    whichever is sooner. invalidate() drops every entry for a user; it
+    only reaches this process, so other workers see a change within
+    ``ttl`` at most.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._by_user = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, user_id, jti):
+        key = (str(user_id), jti)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # A copy, so one request changing its user can't leak into another.
+        return copy.copy(entry[0])
+
+    def put(self, user_id, jti, user, token_exp=None) -> None:
+        expires = time.monotonic() + self.ttl
+        if token_exp is not None:
+            expires = min(expires, time.monotonic() + (token_exp - time.time()))
+
+        key = (str(user_id), jti)
+        with self._lock:
+            self._entries[key] = (copy.copy(user), expires)
+            self._entries.move_to_end(key)
+            self._by_user.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, user_id) -> None:
+        with self._lock:
+            for key in list(self._by_user.get(str(user_id), ())):
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _drop(self, key) -> None:
+        # Called with the lock held.
+        self._entries.pop(key, None)
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+USER_CACHE = UserCache(settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TTL)
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """
+    simplejwt authentication, timed as the "auth" span. The signature
+    and expiry are still checked on every request; only the user lookup
+    is served from USER_CACHE.
+    """
+
+    def authenticate(self, request):
+        with span("auth"):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if not USER_CACHE.enabled:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+
+        user = USER_CACHE.get(user_id, jti)
+        if user is None:
+            # Inactive users and revoked tokens raise here and are never cached.
+            user = super().get_user(validated_token)
+            USER_CACHE.put(user_id, jti, user, validated_token.get("exp"))
+        return user
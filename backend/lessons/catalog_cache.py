@@ -0,0 +1,137 @@
+# lessons/catalog_cache.py
+import hashlib
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+VERSION_KEY = "catalog:version"
+
+
+def _cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+# The version expires along with the bodies, so a worker whose local
+# cache missed another worker's bump still picks up the change (and
+# stops answering 304) within CATALOG_CACHE_TTL.
+def catalog_version() -> str:
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=settings.CATALOG_CACHE_TTL)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def acatalog_version() -> str:
+    cache = _cache()
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, uuid.uuid4().hex, timeout=settings.CATALOG_CACHE_TTL)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version() -> None:
+    # A fresh random token rather than a counter: if the key is ever
+    # evicted we can't accidentally land on an old version again.
+    _cache().set(VERSION_KEY, uuid.uuid4().hex, timeout=settings.CATALOG_CACHE_TTL)
+
+
+def _etag(request, version=None) -> str:
+    # Everything the rendered body depends on: data version, URL (incl.
+    # host for absolute media URLs) and the negotiated renderer.
+    raw = "\x1f".join([
+        version or catalog_version(),
+        request.get_host(),
+        request.get_full_path(),
+        request.META.get("HTTP_ACCEPT", ""),
+    ])
+    return '"%s"' % hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def _matches(request, etag) -> bool:
+    header = request.META.get("HTTP_IF_NONE_MATCH", "")
+    return header.strip() == "*" or etag in [t.strip() for t in header.split(",")]
+
+
+def _finish(response, etag):
+    response["ETag"] = etag
+    patch_cache_control(response, public=True, max_age=settings.CATALOG_MAX_AGE, must_revalidate=True)
+    patch_vary_headers(response, ["Accept"])
+    return response
+
+
+def serve_cached(request, render):
+    """
+    Answer a catalog GET from cache. ``If-None-Match`` hits get a 304
+    and a stored body is replayed as-is; neither touches the database.
+    Otherwise ``render()`` builds the response and a 200 is stored
+    until the next catalog change.
+    """
+    if request.method != "GET":
+        return render()
+
+    etag = _etag(request)
+    if _matches(request, etag):
+        return _finish(HttpResponseNotModified(), etag)
+
+    cache = _cache()
+    key = f"catalog:body:{etag}"
+    cached = cache.get(key)
+    if cached is not None:
+        content, content_type = cached
+        return _finish(HttpResponse(content, content_type=content_type), etag)
+
+    response = render()
+    if response.status_code != 200:
+        return response
+
+    if hasattr(response, "render"):
+        response.render()
+    cache.set(key, (response.content, response["Content-Type"]), timeout=settings.CATALOG_CACHE_TTL)
+    return _finish(response, etag)
+
+
+async def aserve_cached(request, render):
+    """
+    serve_cached() for async views. Only the cache-hit paths run here;
+    ``render`` is awaited on a miss and is expected to store its own
+    response (see async_catalog_view).
+    """
+    if request.method != "GET":
+        return await render()
+
+    etag = _etag(request, await acatalog_version())
+    if _matches(request, etag):
+        return _finish(HttpResponseNotModified(), etag)
+
+    cached = await _cache().aget(f"catalog:body:{etag}")
+    if cached is not None:
+        content, content_type = cached
+        return _finish(HttpResponse(content, content_type=content_type), etag)
+
+    return await render()
+
+
+class CatalogCacheMixin:
+    """ViewSet mixin: cache list/retrieve responses per catalog version."""
+
+    cached_actions = ("list", "retrieve")
+
+    def dispatch(self, request, *args, **kwargs):
+        # self.action is only set inside dispatch(), so look it up here.
+        if self.action_map.get(request.method.lower()) not in self.cached_actions:
+            return super().dispatch(request, *args, **kwargs)
+        return serve_cached(request, lambda: super(CatalogCacheMixin, self).dispatch(request, *args, **kwargs))
+
+
+def catalog_cached(view_func):
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        return serve_cached(request, lambda: view_func(request, *args, **kwargs))
+    return wrapper
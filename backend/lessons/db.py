@@ -0,0 +1,15 @@
+# lessons/db.py
+from django.conf import settings
+
+
+def tune_sqlite(sender, connection, **kwargs):
+    """
+    connection_created hook: apply SQLITE_PRAGMAS to every new SQLite
+    connection (WAL, relaxed fsync, busy timeout, mmap).
+    """
+    if connection.vendor != "sqlite" or not settings.SQLITE_PRAGMAS:
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,360 @@
+# lessons/leaderboard.py
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import GamificationProgress, LearnerSummary, TopicStats
+
+logger = logging.getLogger(__name__)
+
+
+# =======================
+#  IN-MEMORY RANKING
+# =======================
+class _Fenwick:
+    """Counts per score; prefix sums and k-th lookups in O(log S)."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.tree = [0] * (size + 1)
+
+    def add(self, index: int, delta: int) -> None:
+        index += 1
+        while index <= self.size:
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix(self, index: int) -> int:
+        # Number of entries with score <= index.
+        index = min(index + 1, self.size)
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+    def find(self, k: int) -> int:
+        # Smallest score whose prefix count reaches k (1-based).
+        pos = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] < k:
+                pos = nxt
+                k -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+
+class Leaderboard:
+    """
+    Learners ranked by total stars.
+
+    Scores are counted in a Fenwick tree indexed by star total, so
+    rank_of() is O(log S) and top(k) is O(k log S), S being the highest
+    score. Learners with no stars are not stored; they all share the
+    rank after the last scoring learner. Ties are broken by user id.
+    """
+
+    def __init__(self):
+        self._scores = {}
+        self._buckets = defaultdict(set)
+        self._tree = _Fenwick(64)
+        self._count = 0
+
+    def _grow(self, score: int) -> None:
+        if score < self._tree.size:
+            return
+        size = self._tree.size
+        while size <= score:
+            size *= 2
+        tree = _Fenwick(size)
+        for bucket_score, users in self._buckets.items():
+            tree.add(bucket_score, len(users))
+        self._tree = tree
+
+    def set(self, user_id: int, score: int) -> None:
+        old = self._scores.pop(user_id, 0)
+        if old > 0:
+            self._buckets[old].discard(user_id)
+            if not self._buckets[old]:
+                del self._buckets[old]
+            self._tree.add(old, -1)
+            self._count -= 1
+
+        if score > 0:
+            self._grow(score)
+            self._scores[user_id] = score
+            self._buckets[score].add(user_id)
+            self._tree.add(score, 1)
+            self._count += 1
+
+    def score_of(self, user_id: int) -> int:
+        return self._scores.get(user_id, 0)
+
+    def rank_of(self, user_id: int) -> int:
+        score = self._scores.get(user_id, 0)
+        if score <= 0:
+            return self._count + 1
+        return self._count - self._tree.prefix(score) + 1
+
+    def top(self, k: int) -> list:
+        rows = []
+        position = 1
+        while position <= min(k, self._count):
+            # The position-th highest score is the (count - position + 1)-th lowest.
+            score = self._tree.find(self._count - position + 1)
+            rank = self._count - self._tree.prefix(score) + 1
+            for user_id in sorted(self._buckets[score]):
+                if len(rows) >= k:
+                    break
+                rows.append({"rank": rank, "user_id": user_id, "total_stars": score})
+            position = rank + len(self._buckets[score])
+        return rows
+
+    def __len__(self):
+        return self._count
+
+
+_board = None
+_loaded_at = 0.0
+_refreshing = False
+# While a board is loading: (committed_at, deltas) for every write that
+# lands meanwhile, replayed onto it if the rows it read may miss them.
+_recent = None
+_lock = threading.Lock()
+_load_lock = threading.Lock()
+
+
+def _load() -> Leaderboard:
+    """
+    Build a board from LearnerSummary without holding _lock, so readers
+    keep using the old one meanwhile, then swap it in. The board is
+    tagged with the time its rows were read, so writes committed before
+    that are not applied to it a second time. Call with _load_lock held.
+    """
+    global _board, _loaded_at, _recent
+    with _lock:
+        _recent = []
+    loaded_at = time.monotonic()
+    board = Leaderboard()
+    rows = LearnerSummary.objects.filter(total_stars__gt=0).values_list(
+        "user_id", "total_stars"
+    )
+    try:
+        for user_id, total in rows.iterator():
+            board.set(user_id, total)
+    except BaseException:
+        with _lock:
+            _recent = None
+        raise
+
+    with _lock:
+        for committed_at, user_deltas in _recent:
+            _apply(board, loaded_at, committed_at, user_deltas)
+        _board, _loaded_at, _recent = board, loaded_at, None
+    return board
+
+
+def _refresh() -> None:
+    global _refreshing
+    try:
+        with _load_lock:
+            _load()
+    except Exception:
+        logger.exception("Leaderboard refresh failed")
+    finally:
+        with _lock:
+            _refreshing = False
+        connection.close()
+
+
+def _current() -> Leaderboard:
+    """
+    Process-local leaderboard, loaded from LearnerSummary on first use.
+    Once it is older than LEADERBOARD_REFRESH seconds a background
+    thread reloads it, to pick up writes made by other worker
+    processes; readers get the current board until the new one is in.
+    """
+    global _refreshing
+    with _lock:
+        board = _board
+        if board is not None and not _refreshing and (
+            time.monotonic() - _loaded_at > settings.LEADERBOARD_REFRESH
+        ):
+            _refreshing = True
+            threading.Thread(target=_refresh, daemon=True).start()
+
+    if board is None:
+        with _load_lock:
+            board = _board if _board is not None else _load()
+    return board
+
+
+def top_learners(k: int) -> list:
+    board = _current()
+    with _lock:
+        return board.top(k)
+
+
+def learner_rank(user_id: int) -> tuple:
+    """(rank, total stars, number of ranked learners) for one user."""
+    board = _current()
+    with _lock:
+        return board.rank_of(user_id), board.score_of(user_id), len(board)
+
+
+def reset_leaderboard() -> None:
+    global _board
+    with _lock:
+        _board = None
+
+
+# =======================
+#  SUMMARY MAINTENANCE
+# =======================
+def _delta(old, new):
+    old_stars, old_done = old if old is not None else (0, False)
+    new_stars, new_done = new if new is not None else (0, False)
+    return (
+        new_stars - old_stars,
+        int(bool(new_done)) - int(bool(old_done)),
+        int(new is not None) - int(old is not None),
+    )
+
+
+def lock_learners(user_ids, create=True) -> None:
+    """
+    Lock the LearnerSummary rows of ``user_ids`` (creating missing ones
+    unless ``create`` is false) until the surrounding transaction ends.
+    Progress writers take this lock before reading the rows they are
+    about to change, so two of them can't both compute their deltas from
+    the same old state, even when both insert the same new row. Locks
+    are taken in id order to avoid deadlocks.
+    """
+    user_ids = sorted(set(user_ids))
+    if create:
+        LearnerSummary.objects.bulk_create(
+            [LearnerSummary(user_id=user_id) for user_id in user_ids], ignore_conflicts=True
+        )
+    list(
+        LearnerSummary.objects.select_for_update()
+        .filter(user_id__in=user_ids)
+        .order_by("user_id")
+        .values_list("user_id", flat=True)
+    )
+
+
+def remove_progress(**filters) -> None:
+    """
+    Subtract the progress rows matching ``filters`` from the summaries
+    before a cascade deletes them (see the pre_delete hooks in signals).
+    Must run inside the deleting transaction. No summary rows are
+    created: the delete has already collected what it cascades to, so a
+    new row pointing at the deleted topic or user would fail at commit.
+    """
+    rows = GamificationProgress.objects.filter(**filters)
+    lock_learners(rows.values_list("user_id", flat=True), create=False)
+    record_progress_changes(
+        [
+            (user_id, topic_id, (stars, completed), None)
+            for user_id, topic_id, stars, completed in rows.values_list(
+                "user_id", "topic_id", "stars_earned", "completed"
+            )
+        ],
+        create=False,
+    )
+
+
+def record_progress_changes(changes, create=True) -> None:
+    """
+    Apply ``[(user_id, topic_id, old, new), ...]`` to the summary tables,
+    where old/new are ``(stars, completed)`` or None for a missing row.
+    Must run inside the transaction that wrote the progress rows.
+    Missing summary rows are created unless ``create`` is false.
+    """
+    per_user = defaultdict(lambda: [0, 0])
+    per_topic = defaultdict(lambda: [0, 0])
+
+    for user_id, topic_id, old, new in changes:
+        stars, done, rows = _delta(old, new)
+        per_user[user_id][0] += stars
+        per_user[user_id][1] += done
+        per_topic[topic_id][0] += rows
+        per_topic[topic_id][1] += done
+
+    for user_id, (stars, done) in per_user.items():
+        if stars or done:
+            if create:
+                LearnerSummary.objects.get_or_create(user_id=user_id)
+            LearnerSummary.objects.filter(user_id=user_id).update(
+                total_stars=F("total_stars") + stars,
+                completed_topics=F("completed_topics") + done,
+            )
+
+    for topic_id, (rows, done) in per_topic.items():
+        if rows or done:
+            if create:
+                TopicStats.objects.get_or_create(topic_id=topic_id)
+            TopicStats.objects.filter(topic_id=topic_id).update(
+                learners=F("learners") + rows,
+                completions=F("completions") + done,
+            )
+
+    user_deltas = {user_id: stars for user_id, (stars, _) in per_user.items() if stars}
+    if user_deltas:
+        transaction.on_commit(lambda: _apply_to_board(user_deltas))
+
+
+def _apply_to_board(user_deltas) -> None:
+    # Runs right after the commit; stamped before waiting for the lock.
+    committed_at = time.monotonic()
+    with _lock:
+        if _recent is not None:
+            _recent.append((committed_at, user_deltas))
+        if _board is not None:
+            _apply(_board, _loaded_at, committed_at, user_deltas)
+
+
+def _apply(board, loaded_at, committed_at, user_deltas) -> None:
+    # Called with _lock held.
+    if committed_at < loaded_at:
+        return  # already in the rows the board was loaded from
+    for user_id, stars in user_deltas.items():
+        board.set(user_id, max(board.score_of(user_id) + stars, 0))
+
+
+def rebuild_summaries() -> tuple:
+    """Recompute both summary tables from GamificationProgress."""
+    completed = Count("id", filter=Q(completed=True))
+
+    with transaction.atomic():
+        LearnerSummary.objects.all().delete()
+        LearnerSummary.objects.bulk_create(
+            [
+                LearnerSummary(user_id=row["user_id"], total_stars=row["stars"] or 0, completed_topics=row["done"])
+                for row in GamificationProgress.objects.values("user_id").annotate(
+                    stars=Sum("stars_earned"), done=completed
+                )
+            ],
+            batch_size=1000,
+        )
+
+        TopicStats.objects.all().delete()
+        TopicStats.objects.bulk_create(
+            [
+                TopicStats(topic_id=row["topic_id"], learners=row["rows"], completions=row["done"])
+                for row in GamificationProgress.objects.values("topic_id").annotate(
+                    rows=Count("id"), done=completed
+                )
+            ],
+            batch_size=1000,
+        )
+
+    reset_leaderboard()
+    return LearnerSummary.objects.count(), TopicStats.objects.count()
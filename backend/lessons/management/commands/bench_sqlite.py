@@ -0,0 +1,142 @@
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+DEFAULT_PRAGMAS = {"journal_mode": "DELETE", "synchronous": "FULL"}
+
+
+def _connect(path, pragmas):
+    conn = sqlite3.connect(path, timeout=20, check_same_thread=False)
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def _seed(path, pragmas, users, topics):
+    conn = _connect(path, pragmas)
+    conn.executescript("""
+        CREATE TABLE progress (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            topic_id INTEGER NOT NULL,
+            stars INTEGER NOT NULL DEFAULT 0,
+            last_watched REAL NOT NULL,
+            UNIQUE (user_id, topic_id)
+        );
+        CREATE INDEX progress_user_watched ON progress (user_id, last_watched);
+    """)
+    now = time.time()
+    conn.executemany(
+        "INSERT INTO progress (user_id, topic_id, stars, last_watched) VALUES (?, ?, 0, ?)",
+        [(u, t, now) for u in range(users) for t in range(topics)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _run(path, pragmas, readers, writers, seconds, users, topics):
+    counts = {"reads": 0, "writes": 0, "busy": 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def reader():
+        conn = _connect(path, pragmas)
+        n = 0
+        while time.monotonic() < stop:
+            conn.execute(
+                "SELECT topic_id, stars FROM progress WHERE user_id = ? ORDER BY last_watched DESC",
+                (random.randrange(users),),
+            ).fetchall()
+            n += 1
+        conn.close()
+        with lock:
+            counts["reads"] += n
+
+    def writer():
+        conn = _connect(path, pragmas)
+        n = busy = 0
+        while time.monotonic() < stop:
+            try:
+                conn.execute(
+                    "UPDATE progress SET stars = stars + 1, last_watched = ? "
+                    "WHERE user_id = ? AND topic_id = ?",
+                    (time.time(), random.randrange(users), random.randrange(topics)),
+                )
+                conn.commit()
+                n += 1
+            except sqlite3.OperationalError:
+                busy += 1
+        conn.close()
+        with lock:
+            counts["writes"] += n
+            counts["busy"] += busy
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return {
+        "reads_per_sec": round(counts["reads"] / seconds, 1),
+        "writes_per_sec": round(counts["writes"] / seconds, 1),
+        "busy_errors": counts["busy"],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent read/write throughput on a scratch SQLite file "
+        "with default settings vs. the production SQLITE_PRAGMAS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument("--seconds", type=float, default=5)
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--topics", type=int, default=40)
+        parser.add_argument("--json", action="store_true", help="Print machine-readable results.")
+
+    def handle(self, *args, **options):
+        tuned = settings.SQLITE_PRAGMAS or {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 20000,
+            "mmap_size": 256 * 1024 * 1024,
+        }
+        profiles = {"default": DEFAULT_PRAGMAS, "tuned": tuned}
+
+        results = {}
+        for name, pragmas in profiles.items():
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "bench.sqlite3")
+                _seed(path, pragmas, options["users"], options["topics"])
+                results[name] = _run(
+                    path,
+                    pragmas,
+                    options["readers"],
+                    options["writers"],
+                    options["seconds"],
+                    options["users"],
+                    options["topics"],
+                )
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:>8}: {row['reads_per_sec']:>10} reads/s "
+                f"{row['writes_per_sec']:>8} writes/s "
+                f"{row['busy_errors']:>5} busy"
+            )
@@ -0,0 +1,476 @@
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from lessons.leaderboard import rebuild_summaries, reset_leaderboard
+from lessons.models import GamificationProgress, Media, Topic
+
+# (name, url, served from the catalog cache)
+ENDPOINTS = [
+    ("topics-list", "/api/topics/", True),
+    ("topics-list-expand", "/api/topics/?expand=media", True),
+    ("topics-detail", "/api/topics/{topic}/", True),
+    ("media-list", "/api/media/", True),
+    ("media-detail", "/api/media/{media}/", True),
+    ("gamification-list", "/api/gamification/", False),
+    ("gamification-list-expand", "/api/gamification/?expand=topic", False),
+    ("gamification-detail", "/api/gamification/{progress}/", False),
+    ("leaderboard", "/api/leaderboard/", False),
+]
+
+TEXT_LENGTHS = {"short": 40, "medium": 200, "long": 1000}
+WORDS = (
+    "the quick brown fox jumps over a lazy dog while little bears count "
+    "red apples under seven tall trees near the quiet river"
+).split()
+
+
+def summarize(latencies, elapsed, errors=0) -> dict:
+    ordered = sorted(latencies)
+
+    def pct(q):
+        if not ordered:
+            return None
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 3)
+
+    return {
+        "n": len(ordered),
+        "errors": errors,
+        "p50_ms": pct(0.50),
+        "p90_ms": pct(0.90),
+        "p99_ms": pct(0.99),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else None,
+        "rps": round(len(ordered) / elapsed, 1) if elapsed else None,
+    }
+
+
+def sample_text(rng, chars) -> str:
+    words = []
+    while sum(len(w) + 1 for w in words) < chars:
+        words.append(rng.choice(WORDS))
+    return " ".join(words).capitalize() + "."
+
+
+def _client(user) -> APIClient:
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+    return client
+
+
+def _rss_mb():
+    # Resident set size right now (Linux only).
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024, 1)
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere.
+    return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database and measure API latency/throughput, "
+        "concurrent update_progress writes and TTS real-time factor and memory. "
+        "Use --json/--output to save results and --compare to diff two runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", default="api,progress,tts", help="Comma-separated sections to run.")
+        parser.add_argument("--topics", type=int, default=200)
+        parser.add_argument("--media-per-topic", type=int, default=3)
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--progress-per-user", type=int, default=20)
+        parser.add_argument("--requests", type=int, default=50, help="Timed requests per endpoint.")
+        parser.add_argument("--writers", type=int, default=4)
+        parser.add_argument("--writes", type=int, default=50, help="update_progress calls per writer.")
+        parser.add_argument("--voices", default="af_heart,bm_george")
+        parser.add_argument("--tts-reps", type=int, default=3)
+        parser.add_argument(
+            "--tts-engine",
+            default=settings.TTS_ENGINE,
+            help=(
+                "kokoro, onnx, onnx:fp32, onnx:int8 or fake (deterministic, offline). "
+                "Several comma-separated engines are each run in their own process "
+                "so their memory use can be compared."
+            ),
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--json", action="store_true", help="Print machine-readable results.")
+        parser.add_argument("--output", help="Also write the JSON results to this file.")
+        parser.add_argument("--compare", help="Earlier --output file to diff against.")
+
+    def handle(self, *args, **options):
+        sections = set(options["only"].split(","))
+        results = {"meta": self.meta(options)}
+
+        if sections & {"api", "progress"}:
+            with tempfile.TemporaryDirectory() as tmp:
+                results.update(self.run_db_sections(sections, options, tmp))
+        if "tts" in sections:
+            results["tts"], results["tts_memory"] = self.bench_tts(options)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.report(results)
+
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                self.compare(json.load(f), results)
+
+    def meta(self, options):
+        keys = (
+            "topics", "media_per_topic", "users", "progress_per_user",
+            "requests", "writers", "writes", "tts_engine", "seed",
+        )
+        return {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "db_profile": settings.DB_PROFILE,
+            **{key: options[key] for key in keys},
+        }
+
+    # =======================
+    #  DATABASE-BACKED SECTIONS
+    # =======================
+    def run_db_sections(self, sections, options, tmp):
+        # A scratch test database, on disk so writer threads share it.
+        if connection.vendor == "sqlite":
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(tmp, "bench.sqlite3")
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+        try:
+            ids = self.seed(options)
+            results = {}
+            if "api" in sections:
+                results["api"] = self.bench_api(options, ids)
+            if "progress" in sections:
+                results["progress"] = self.bench_progress(options)
+            return results
+        finally:
+            reset_leaderboard()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def seed(self, options):
+        rng = random.Random(options["seed"])
+
+        # bulk_create skips the save signals, so no narration/upload jobs.
+        topics = Topic.objects.bulk_create(
+            [
+                Topic(title=f"Topic {i}", letter=chr(65 + i % 26), description=sample_text(rng, 200))
+                for i in range(options["topics"])
+            ],
+            batch_size=500,
+        )
+        Media.objects.bulk_create(
+            [
+                Media(topic=topic, media_type="youtube", media_url=f"https://youtu.be/{topic.pk:011d}")
+                for topic in topics
+                for _ in range(options["media_per_topic"])
+            ],
+            batch_size=500,
+        )
+        password = make_password("bench")
+        users = User.objects.bulk_create(
+            [User(username=f"bench{i}", password=password) for i in range(options["users"])],
+            batch_size=500,
+        )
+        per_user = min(options["progress_per_user"], len(topics))
+        GamificationProgress.objects.bulk_create(
+            [
+                GamificationProgress(
+                    user=user,
+                    topic=topic,
+                    stars_earned=rng.randint(0, 3),
+                    completed=rng.random() < 0.5,
+                )
+                for user in users
+                for topic in rng.sample(topics, per_user)
+            ],
+            batch_size=1000,
+        )
+        rebuild_summaries()
+
+        progress = GamificationProgress.objects.filter(user=users[0]).first() if users else None
+        return {
+            "topic": topics[0].pk if topics else 0,
+            "media": Media.objects.values_list("pk", flat=True).first() or 0,
+            "progress": progress.pk if progress else 0,
+        }
+
+    def bench_api(self, options, ids):
+        user = User.objects.order_by("pk").first()
+        if user is None:
+            raise CommandError("--users must be at least 1 for the api section")
+        client = _client(user)
+        catalog = caches[settings.CATALOG_CACHE_ALIAS]
+        results = {}
+
+        def measure(url, clear_cache):
+            latencies, errors = [], 0
+            for i in range(options["requests"] + 3):
+                if clear_cache:
+                    catalog.clear()
+                start = time.perf_counter()
+                response = client.get(url)
+                elapsed = time.perf_counter() - start
+                if i < 3:
+                    continue  # warm-up
+                if response.status_code != 200:
+                    errors += 1
+                latencies.append(elapsed)
+            return summarize(latencies, sum(latencies), errors)
+
+        for name, template, cached in ENDPOINTS:
+            url = template.format(**ids)
+            results[name] = measure(url, clear_cache=True)
+            if cached:
+                results[f"{name}:cached"] = measure(url, clear_cache=False)
+        return results
+
+    def bench_progress(self, options):
+        users = list(User.objects.order_by("pk")[: options["writers"]])
+        topic_ids = list(Topic.objects.values_list("pk", flat=True))
+        if not users or not topic_ids:
+            raise CommandError("--users and --topics must be at least 1 for the progress section")
+
+        latencies, errors = [], [0]
+        lock = threading.Lock()
+
+        def writer(index, user):
+            rng = random.Random(options["seed"] + index)
+            client = _client(user)
+            # Count "database is locked" and friends as errors, don't abort.
+            client.raise_request_exception = False
+            mine = []
+            failed = 0
+            for _ in range(options["writes"]):
+                body = {
+                    "topic_id": rng.choice(topic_ids),
+                    "stars_earned": rng.randint(0, 3),
+                    "completed": rng.random() < 0.3,
+                }
+                start = time.perf_counter()
+                response = client.post("/api/gamification/update-progress/", body, format="json")
+                mine.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    failed += 1
+            connection.close()
+            with lock:
+                latencies.extend(mine)
+                errors[0] += failed
+
+        threads = [threading.Thread(target=writer, args=(i, u)) for i, u in enumerate(users)]
+        request_logger = logging.getLogger("django.request")
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)  # failed writes are counted, not logged
+        start = time.perf_counter()
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            request_logger.setLevel(level)
+        elapsed = time.perf_counter() - start
+
+        return {"update_progress": {"writers": len(users), **summarize(latencies, elapsed, errors[0])}}
+
+    # =======================
+    #  TTS
+    # =======================
+    def bench_tts(self, options):
+        engines = options["tts_engine"].split(",")
+        if len(engines) > 1:
+            return self.bench_tts_engines(engines, options)
+        rows, memory = self.bench_tts_engine(engines[0], options)
+        return rows, {engines[0]: memory}
+
+    def bench_tts_engines(self, engines, options):
+        # One child per engine: peak RSS is per process, and torch and
+        # onnxruntime shouldn't share an address space while measured.
+        rows, memory = {}, {}
+        for engine in engines:
+            child = subprocess.run(
+                [
+                    sys.executable, os.path.join(settings.BASE_DIR, "manage.py"), "benchmark",
+                    "--only", "tts", "--json", "--tts-engine", engine,
+                    "--voices", options["voices"],
+                    "--tts-reps", str(options["tts_reps"]),
+                    "--seed", str(options["seed"]),
+                ],
+                capture_output=True, text=True,
+            )
+            if child.returncode != 0:
+                raise CommandError(f"{engine}: {child.stderr.strip()[-2000:]}")
+            result = json.loads(child.stdout)
+            rows.update({f"{engine}:{key}": row for key, row in result["tts"].items()})
+            memory.update(result["tts_memory"])
+        return rows, memory
+
+    def bench_tts_engine(self, engine, options):
+        from lessons import tts_kokoro
+        from lessons.tts_cache import AUDIO_CACHE, PHONEME_CACHE, SEGMENT_CACHE
+
+        kind, _, precision = engine.partition(":")
+        if kind not in tts_kokoro.ENGINES or (precision and kind != "onnx"):
+            raise CommandError(f"Unknown TTS engine: {engine}")
+        overrides = {"TTS_ENGINE": kind}
+        if precision:
+            overrides["TTS_ONNX_PRECISION"] = precision
+
+        rng = random.Random(options["seed"])
+        texts = {name: sample_text(rng, chars) for name, chars in TEXT_LENGTHS.items()}
+        voices = options["voices"].split(",")
+        results = {}
+
+        with override_settings(**overrides):
+            tts_kokoro._PIPELINES.clear()
+            # Disk caches off so every call renders and cold runs redo G2P.
+            max_bytes, AUDIO_CACHE.max_bytes = AUDIO_CACHE.max_bytes, 0
+            phoneme_root, PHONEME_CACHE.root = PHONEME_CACHE.root, None
+            try:
+                rss_before = _rss_mb()
+                start = time.perf_counter()
+                tts_kokoro.warm(sorted({tts_kokoro.lang_for_voice(v) for v in voices}), voices)
+                load_s = time.perf_counter() - start
+                rss_loaded = _rss_mb()
+
+                for voice in voices:
+                    for name, text in texts.items():
+                        results[f"{voice}:{name}"] = self.time_tts(
+                            tts_kokoro, SEGMENT_CACHE, PHONEME_CACHE, text, voice, options["tts_reps"]
+                        )
+            finally:
+                AUDIO_CACHE.max_bytes = max_bytes
+                PHONEME_CACHE.root = phoneme_root
+                tts_kokoro._PIPELINES.clear()
+
+        memory = {
+            "load_s": round(load_s, 3),
+            "rss_mb": rss_loaded,
+            "load_rss_mb": round(rss_loaded - rss_before, 1) if rss_loaded is not None else None,
+            "peak_rss_mb": _peak_rss_mb(),
+        }
+        return results, memory
+
+    def time_tts(self, tts_kokoro, segment_cache, phoneme_cache, text, voice, reps):
+        """
+        Each repetition renders twice: cold, with G2P redone, then warm,
+        with the phonemes from the cold run cached, as for a line already
+        heard in another voice. p50/mean/rtf are the cold run.
+        """
+        cold, warm = [], []
+        audio_seconds = 0.0
+        for _ in range(reps):
+            segment_cache.clear()
+            phoneme_cache.clear()
+            start = time.perf_counter()
+            wav = tts_kokoro.synthesize_wav_bytes(text, voice, 1.0)
+            cold.append(time.perf_counter() - start)
+            audio_seconds = (len(wav) - 44) / 2 / tts_kokoro.SAMPLE_RATE
+
+            segment_cache.clear()
+            start = time.perf_counter()
+            tts_kokoro.synthesize_wav_bytes(text, voice, 1.0)
+            warm.append(time.perf_counter() - start)
+
+        summary = summarize(cold, sum(cold))
+        warm_summary = summarize(warm, sum(warm))
+        return {
+            "chars": len(text),
+            "audio_s": round(audio_seconds, 3),
+            "p50_ms": summary["p50_ms"],
+            "mean_ms": summary["mean_ms"],
+            "warm_g2p_p50_ms": warm_summary["p50_ms"],
+            "warm_g2p_mean_ms": warm_summary["mean_ms"],
+            # < 1 means faster than real time.
+            "rtf": round(summary["mean_ms"] / 1000 / audio_seconds, 4) if audio_seconds else None,
+        }
+
+    # =======================
+    #  OUTPUT
+    # =======================
+    def rows(self, results):
+        for section in ("api", "progress", "tts"):
+            for name, row in results.get(section, {}).items():
+                yield f"{section}/{name}", row
+
+    def report(self, results):
+        meta = results["meta"]
+        self.stdout.write(
+            f"commit {meta['commit']}  {meta['database']} ({meta['db_profile']})  "
+            f"tts={meta['tts_engine']}"
+        )
+        for key, row in self.rows(results):
+            if "rtf" in row:
+                detail = (
+                    f"audio {row['audio_s']!s:>7} s  rtf {row['rtf']}  "
+                    f"warm g2p p50 {row['warm_g2p_p50_ms']} ms"
+                )
+            else:
+                detail = f"p99 {row['p99_ms']!s:>9} ms  {row['rps']!s:>8} req/s {row['errors']:>3} err"
+            self.stdout.write(f"{key:<40} p50 {row['p50_ms']!s:>9} ms  {detail}")
+        for engine, row in results.get("tts_memory", {}).items():
+            self.stdout.write(
+                f"{'tts-memory/' + engine:<40} load {row['load_s']!s:>7} s  "
+                f"rss {row['rss_mb']!s:>7} MB (+{row['load_rss_mb']!s} for the model)  "
+                f"peak {row['peak_rss_mb']!s} MB"
+            )
+
+    def compare(self, before, after):
+        old = dict(self.rows(before))
+        self.stdout.write(f"\nvs. {before['meta'].get('commit')} (p50, negative is faster)")
+        for key, row in self.rows(after):
+            prev = old.get(key)
+            if not prev or not prev.get("p50_ms") or row.get("p50_ms") is None:
+                continue
+            change = (row["p50_ms"] - prev["p50_ms"]) / prev["p50_ms"] * 100
+            self.stdout.write(f"{key:<40} {prev['p50_ms']:>9} -> {row['p50_ms']:>9} ms  {change:+6.1f}%")
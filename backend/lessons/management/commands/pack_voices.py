@@ -0,0 +1,54 @@
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from lessons.tts_kokoro import VALID_VOICES, get_pipeline, lang_for_voice
+from lessons.voice_pack import write_voice_pack
+
+
+class Command(BaseCommand):
+    help = (
+        "Pack Kokoro voice tensors into one memory-mapped file (TTS_VOICE_PACK) "
+        "so workers load every voice locally. Run wherever the voices can be fetched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--voices",
+            nargs="*",
+            default=["all"],
+            help="Voices to pack, or 'all' (default).",
+        )
+        parser.add_argument(
+            "--output",
+            default=settings.TTS_VOICE_PACK,
+            help="Pack file to write (default: TTS_VOICE_PACK).",
+        )
+
+    def handle(self, *args, **options):
+        voices = options["voices"]
+        if voices == ["all"]:
+            voices = sorted(VALID_VOICES)
+
+        unknown = set(voices) - VALID_VOICES
+        if unknown:
+            raise CommandError(f"Unknown voices: {', '.join(sorted(unknown))}")
+
+        start = time.perf_counter()
+        packs = {}
+        for voice in voices:
+            pack = get_pipeline(lang_for_voice(voice)).load_voice(voice)
+            # torch tensors from Kokoro, plain arrays from the fake engine.
+            packs[voice] = pack.detach().cpu().numpy() if hasattr(pack, "detach") else np.asarray(pack)
+            self.stdout.write(f"✔ {voice} {tuple(packs[voice].shape)}")
+
+        size = write_voice_pack(options["output"], packs)
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Packed {len(packs)} voices ({size / 1024 / 1024:.1f} MB) "
+            f"into {os.path.abspath(options['output'])} in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from lessons.models import Media, Topic
+from lessons.uploads import (
+    process_thumbnail,
+    process_video,
+    thumbnail_is_stale,
+    video_needs_processing,
+)
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnail sizes and faststart/probe uploaded MP4s that haven't been processed."
+
+    def handle(self, *args, **options):
+        jobs = [
+            (Topic.objects.exclude(thumbnail="").order_by("id"), thumbnail_is_stale, process_thumbnail),
+            (Media.objects.exclude(uploaded_file="").order_by("id"), video_needs_processing, process_video),
+        ]
+
+        processed = skipped = failed = 0
+        for queryset, is_pending, process in jobs:
+            for obj in queryset.iterator():
+                if not is_pending(obj):
+                    skipped += 1
+                    continue
+                try:
+                    if process(obj):
+                        processed += 1
+                        self.stdout.write(f"✔ {obj}")
+                    else:
+                        skipped += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"✘ {obj}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{processed} processed, {skipped} up to date, {failed} failed"
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from lessons.leaderboard import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute learner summaries and topic stats from all progress rows."
+
+    def handle(self, *args, **options):
+        learners, topics = rebuild_summaries()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt summaries for {learners} learners and {topics} topics"
+        ))
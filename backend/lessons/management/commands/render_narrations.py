@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from lessons.models import Topic
+from lessons.narration import is_stale, render_narration
+
+
+class Command(BaseCommand):
+    help = "Pre-render narration audio for topics whose text or voice changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("topic_ids", nargs="*", type=int)
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Re-render even if the stored narration is current.",
+        )
+
+    def handle(self, *args, **options):
+        topics = Topic.objects.all().order_by("id")
+        if options["topic_ids"]:
+            topics = topics.filter(id__in=options["topic_ids"])
+
+        rendered = skipped = failed = 0
+        for topic in topics.iterator():
+            if not options["force"] and not is_stale(topic):
+                skipped += 1
+                continue
+            try:
+                if render_narration(topic, force=options["force"]):
+                    rendered += 1
+                    self.stdout.write(f"✔ {topic.title}")
+                else:
+                    skipped += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"✘ {topic.title}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{rendered} rendered, {skipped} up to date, {failed} failed"
+        ))
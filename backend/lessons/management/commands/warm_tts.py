@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lessons.tts_kokoro import VALID_VOICES, warm
+
+
+class Command(BaseCommand):
+    help = "Download and load the Kokoro pipelines and voice packs, failing fast if anything is missing."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lang",
+            nargs="+",
+            default=["a", "b"],
+            help="Language codes to load (a = American, b = British).",
+        )
+        parser.add_argument(
+            "--voices",
+            nargs="*",
+            default=[],
+            help="Voice packs to preload, or 'all'.",
+        )
+
+    def handle(self, *args, **options):
+        voices = options["voices"]
+        if voices == ["all"]:
+            voices = sorted(VALID_VOICES)
+
+        unknown = set(voices) - VALID_VOICES
+        if unknown:
+            raise CommandError(f"Unknown voices: {', '.join(sorted(unknown))}")
+
+        start = time.perf_counter()
+        warm(options["lang"], voices)
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {', '.join(options['lang'])} "
+            f"({len(voices)} voices) in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,147 @@
+# lessons/media_serving.py
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class _FileRange:
+    """
+    Window onto an open file for FileResponse. read() stops at the end of
+    the range; fileno() is kept so a WSGI server's file_wrapper can still
+    sendfile() from the current offset, bounded by Content-Length.
+    """
+
+    def __init__(self, file, start: int, length: int):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def _parse_range(header, size):
+    """
+    (start, end) inclusive for a single ``bytes=`` range, None to serve
+    the whole file (no header, or a multi-range request), or "invalid"
+    when the range can't be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+
+    first, last = match.groups()
+    if not first:
+        if not last or int(last) == 0:
+            return "invalid"
+        return max(size - int(last), 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return "invalid"
+    return start, end
+
+
+def _validators(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"', http_date(stat.st_mtime)
+
+
+def _not_modified(request, etag, mtime) -> bool:
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match is not None:
+        return if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]
+
+    since = parse_http_date_safe(request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+    return since is not None and int(mtime) <= since
+
+
+def _range_applies(request, etag, last_modified) -> bool:
+    # If-Range: only honour Range when the client's copy is still current.
+    if_range = request.META.get("HTTP_IF_RANGE")
+    return if_range is None or if_range.strip() in (etag, last_modified)
+
+
+def _finish(response, etag, last_modified):
+    response["ETag"] = etag
+    response["Last-Modified"] = last_modified
+    response["Accept-Ranges"] = "bytes"
+    # Stored names never get overwritten (narrations are keyed by content,
+    # uploads get a fresh suffix on collision), so any URL is immutable.
+    patch_cache_control(response, public=True, max_age=settings.MEDIA_MAX_AGE, immutable=True)
+    return response
+
+
+def serve_media(request, path):
+    """
+    Serve a file from MEDIA_ROOT with Range/206 support and validators.
+
+    With MEDIA_ACCEL set the body is left to the fronting server:
+    "x-accel-redirect" (nginx, internal location MEDIA_ACCEL_PREFIX) or
+    "x-sendfile" (Apache/lighttpd); it handles Range itself.
+    """
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(fullpath)
+    except (OSError, SuspiciousFileOperation):
+        raise Http404("File not found")
+    if not os.path.isfile(fullpath):
+        raise Http404("File not found")
+
+    etag, last_modified = _validators(stat)
+    if _not_modified(request, etag, stat.st_mtime):
+        return _finish(HttpResponseNotModified(), etag, last_modified)
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or "application/octet-stream"
+
+    if settings.MEDIA_ACCEL:
+        response = HttpResponse(content_type=content_type)
+        if settings.MEDIA_ACCEL == "x-accel-redirect":
+            response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX.rstrip("/") + "/" + path
+        else:
+            response["X-Sendfile"] = fullpath
+        return _finish(response, etag, last_modified)
+
+    size = stat.st_size
+    byte_range = None
+    if _range_applies(request, etag, last_modified):
+        byte_range = _parse_range(request.META.get("HTTP_RANGE"), size)
+
+    if byte_range == "invalid":
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return _finish(response, etag, last_modified)
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    response = FileResponse(
+        _FileRange(open(fullpath, "rb"), start, length),
+        status=206 if byte_range else 200,
+        content_type=content_type,
+    )
+    response["Content-Length"] = str(length)
+    if byte_range:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    if encoding:
+        response["Content-Encoding"] = encoding
+    return _finish(response, etag, last_modified)
@@ -0,0 +1,242 @@
+# lessons/metrics.py
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse
+
+# Upper bounds in seconds, Prometheus-style; +Inf is implied.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# {span name: [seconds, count]} for the request being handled, if any.
+_timings = ContextVar("request_timings", default=None)
+# [(span name, seconds)] recorded by a TTS pool job, see capture_spans().
+_captured = ContextVar("captured_spans", default=None)
+_NULL = nullcontext()
+
+
+# =======================
+#  HISTOGRAMS
+# =======================
+class Histograms:
+    """Labelled latency histograms with fixed BUCKETS, kept per process."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: tuple, seconds: float) -> None:
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def exposition(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+
+        for label_values, (counts, total, count) in series:
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUESTS = Histograms(
+    "http_request_duration_seconds",
+    "Time spent in Django per request.",
+    ("method", "route", "status"),
+)
+SPANS = Histograms(
+    "span_duration_seconds",
+    "Time spent in instrumented phases (db, auth, serialize, tts_*).",
+    ("span",),
+)
+
+
+# =======================
+#  SPANS
+# =======================
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+
+
+def span(name: str):
+    """Time a block as ``name``. A shared no-op when metrics are off."""
+    if not settings.METRICS_ENABLED:
+        return _NULL
+    return _Span(name)
+
+
+def record(name: str, seconds: float) -> None:
+    captured = _captured.get()
+    if captured is not None:
+        captured.append((name, seconds))
+        return
+
+    timings = _timings.get()
+    if timings is not None:
+        entry = timings.get(name)
+        if entry is None:
+            timings[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+    SPANS.observe((name,), seconds)
+
+
+def capture_spans(fn, *args):
+    """
+    Run ``fn(*args)`` and return ``(result, spans)``, the spans being
+    the ``(name, seconds)`` pairs recorded meanwhile. Pool workers use
+    this to ship their timings back; the parent replays them with
+    record() so they reach its Server-Timing header and /metrics.
+    """
+    spans = []
+    token = _captured.set(spans)
+    try:
+        return fn(*args), spans
+    finally:
+        _captured.reset(token)
+
+
+def _time_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record("db", time.perf_counter() - start)
+
+
+# =======================
+#  MIDDLEWARE
+# =======================
+class TimingMiddleware:
+    """
+    With METRICS_ENABLED, times each request, adds a Server-Timing
+    header with the spans recorded while handling it, and feeds the
+    histograms behind /metrics. Otherwise it only passes the request on.
+
+    DB time is only captured on the thread running the middleware, so
+    async views report it only for queries made in sync_to_async calls
+    that share that thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        token = _timings.set({})
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(_time_query):
+                response = self.get_response(request)
+            return self._finish(request, response, time.perf_counter() - start)
+        finally:
+            _timings.reset(token)
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+
+        token = _timings.set({})
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            return self._finish(request, response, time.perf_counter() - start)
+        finally:
+            _timings.reset(token)
+
+    def _finish(self, request, response, total):
+        match = request.resolver_match
+        route = match.route if match else "unmatched"
+        REQUESTS.observe((request.method, route, response.status_code), total)
+
+        parts = [
+            f'{name};dur={seconds * 1000:.2f};desc="{count}x"'
+            for name, (seconds, count) in _timings.get().items()
+        ]
+        parts.append(f"total;dur={total * 1000:.2f}")
+        response["Server-Timing"] = ", ".join(parts)
+        return response
+
+
+# =======================
+#  /metrics
+# =======================
+def _cache_gauges() -> list:
+    from .authentication import USER_CACHE
+    from .tts_cache import AUDIO_CACHE, PHONEME_CACHE, SEGMENT_CACHE
+    from .tts_pool import TTS_POOL
+
+    # The segment and phoneme caches also live in every pool worker;
+    # report the sum, as of each worker's last job.
+    workers = TTS_POOL.worker_cache_stats()
+    lines = []
+    for name, stats in (
+        ("tts_audio_cache", AUDIO_CACHE.stats()),
+        ("tts_segment_cache", SEGMENT_CACHE.stats()),
+        ("tts_phoneme_cache", PHONEME_CACHE.stats()),
+        ("auth_user_cache", USER_CACHE.stats()),
+    ):
+        for key, value in workers.get(name, {}).items():
+            stats[key] = stats.get(key, 0) + value
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                kind = "counter" if key in ("hits", "misses") else "gauge"
+                suffix = "_total" if kind == "counter" else ""
+                lines.append(f"# TYPE {name}_{key}{suffix} {kind}")
+                lines.append(f"{name}_{key}{suffix} {value}")
+    return lines
+
+
+def metrics_view(request):
+    """Prometheus text exposition for this process."""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    lines = REQUESTS.exposition() + SPANS.exposition() + _cache_gauges()
+    return HttpResponse("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4")
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.27 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0004_remove_topic_views'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topic',
+            name='narration',
+            field=models.FileField(blank=True, null=True, upload_to='narrations/'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='narration_key',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='narration_voice',
+            field=models.CharField(default='af_heart', max_length=20),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.27 on 2026-10-18 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0006_learnersummary_topicstats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gamificationprogress',
+            index=models.Index(fields=['user', 'last_watched'], name='progress_user_watched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='media',
+            index=models.Index(fields=['created_at', 'id'], name='media_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='media',
+            index=models.Index(fields=['topic', 'id'], name='media_topic_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['created_at', 'id'], name='topic_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['is_active', 'created_at'], name='topic_active_created_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.27 on 2026-10-18 14:11
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0008_topic_thumbnail_variants'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='topic',
+            name='topic_active_created_idx',
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.27 on 2026-10-18 14:16
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_processed(apps, schema_editor):
+    # Uploads that already have a duration went through process_video.
+    Media = apps.get_model("lessons", "Media")
+    Media.objects.exclude(uploaded_file="").filter(duration__isnull=False).update(
+        processed_file=F("uploaded_file")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0009_remove_topic_topic_active_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='media',
+            name='processed_file',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(mark_processed, migrations.RunPython.noop),
+    ]
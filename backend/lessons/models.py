@@ -7,10 +7,20 @@ class Topic(models.Model):
     theme = models.CharField(max_length=50, blank=True, null=True)
     description = models.TextField(blank=True)
     thumbnail = models.ImageField(upload_to='thumbnails/', blank=True, null=True)
+    # {"source": thumbnail name, "webp": {"160": name, ...}, "jpeg": {...}}
+    thumbnail_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
+    narration = models.FileField(upload_to="narrations/", blank=True, null=True)
+    narration_voice = models.CharField(max_length=20, default="af_heart")
+    narration_key = models.CharField(max_length=64, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="topic_created_idx"),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -28,8 +38,17 @@ class Media(models.Model):
     autoplay = models.BooleanField(default=True)
     allow_controls = models.BooleanField(default=True)
     duration = models.PositiveIntegerField(blank=True, null=True)
+    # Name of the upload process_video last ran on, whether or not it
+    # could read it, so files it can't handle aren't retried forever.
+    processed_file = models.CharField(max_length=255, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="media_created_idx"),
+            models.Index(fields=["topic", "id"], name="media_topic_idx"),
+        ]
+
     def __str__(self):
         return f"{self.topic.title} ({self.media_type})"
 
@@ -43,6 +62,30 @@ class GamificationProgress(models.Model):
 
     class Meta:
         unique_together = ("user", "topic")
+        indexes = [
+            models.Index(fields=["user", "last_watched"], name="progress_user_watched_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.topic.title} ({'Done' if self.completed else 'In Progress'})"
+
+
+class LearnerSummary(models.Model):
+    """Per-learner totals, kept up to date as progress is written."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="summary")
+    total_stars = models.PositiveIntegerField(default=0)
+    completed_topics = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username} ({self.total_stars} stars)"
+
+
+class TopicStats(models.Model):
+    """Per-topic learner and completion counts."""
+    topic = models.OneToOneField(Topic, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    learners = models.PositiveIntegerField(default=0)
+    completions = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.topic.title} ({self.completions}/{self.learners} completed)"
@@ -0,0 +1,157 @@
+# lessons/mp4.py
+# Just enough ISO-BMFF (MP4) parsing to probe duration and move the
+# moov atom ahead of mdat ("faststart"), without shelling out to ffmpeg.
+import struct
+
+COPY_CHUNK = 1024 * 1024
+
+
+class MP4Error(ValueError):
+    pass
+
+
+def _boxes(f, start, end):
+    """Yield (type, offset, size, header size) for each box in [start, end)."""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, box_type = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            raise MP4Error(f"Corrupt {box_type!r} box at {offset}")
+        yield box_type, offset, size, header
+        offset += size
+
+
+def _top_level(f):
+    f.seek(0, 2)
+    boxes = list(_boxes(f, 0, f.tell()))
+    types = [b[0] for b in boxes]
+    if b"moov" not in types or b"mdat" not in types:
+        raise MP4Error("Not an MP4 file (missing moov or mdat)")
+    return boxes
+
+
+def _mem_boxes(data, start, end):
+    # _boxes() over an in-memory buffer.
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            raise MP4Error(f"Corrupt {box_type!r} box at {offset}")
+        yield box_type, offset, size, header
+        offset += size
+
+
+def _find(data, path, start=0, end=None):
+    """Every box matching ``path`` (a list of types) below [start, end)."""
+    end = len(data) if end is None else end
+    for box_type, offset, size, header in _mem_boxes(data, start, end):
+        if box_type != path[0]:
+            continue
+        if len(path) == 1:
+            yield offset, size, header
+        else:
+            yield from _find(data, path[1:], offset + header, offset + size)
+
+
+def _read_moov(f):
+    for box_type, offset, size, header in _top_level(f):
+        if box_type == b"moov":
+            f.seek(offset)
+            return f.read(size)
+
+
+def duration_seconds(path):
+    """Presentation duration from the mvhd box, or None if unknown."""
+    with open(path, "rb") as f:
+        moov = _read_moov(f)
+
+    for offset, size, header in _find(moov, [b"moov", b"mvhd"]):
+        body = offset + header
+        version = moov[body]
+        if version == 1:
+            timescale, duration = struct.unpack_from(">IQ", moov, body + 20)
+        else:
+            timescale, duration = struct.unpack_from(">II", moov, body + 12)
+        if not timescale or duration in (0xFFFFFFFF, 0xFFFFFFFFFFFFFFFF):
+            return None
+        return duration / timescale
+    return None
+
+
+def _shift_chunk_offsets(moov, delta, start, end):
+    """
+    Add ``delta`` to every stco/co64 entry pointing into [start, end),
+    the bytes that move when moov is inserted at ``start``.
+    """
+    if next(_find(moov, [b"moov", b"cmov"]), None):
+        raise MP4Error("Compressed moov atoms are not supported")
+
+    moov = bytearray(moov)
+    stbl = [b"moov", b"trak", b"mdia", b"minf", b"stbl"]
+    for table, fmt in ((b"stco", ">I"), (b"co64", ">Q")):
+        limit = 0xFFFFFFFF if table == b"stco" else 0xFFFFFFFFFFFFFFFF
+        width = struct.calcsize(fmt)
+        for offset, size, header in _find(moov, stbl + [table]):
+            count = struct.unpack_from(">I", moov, offset + header + 4)[0]
+            pos = offset + header + 8
+            for _ in range(count):
+                value = struct.unpack_from(fmt, moov, pos)[0]
+                if start <= value < end:
+                    value += delta
+                if value > limit:
+                    raise MP4Error("Chunk offsets overflow stco; file too large")
+                struct.pack_into(fmt, moov, pos, value)
+                pos += width
+    return bytes(moov)
+
+
+def _copy_range(src, dst, start, length):
+    src.seek(start)
+    while length > 0:
+        chunk = src.read(min(COPY_CHUNK, length))
+        if not chunk:
+            break
+        dst.write(chunk)
+        length -= len(chunk)
+
+
+def faststart(src_path, dst_path) -> bool:
+    """
+    Write ``src_path`` to ``dst_path`` with moov placed before the first
+    mdat, rewriting chunk offsets to match. Media data is streamed in
+    COPY_CHUNK pieces; only moov is held in memory. Returns False (and
+    writes nothing) when the file is already laid out that way.
+    """
+    with open(src_path, "rb") as src:
+        boxes = _top_level(src)
+        mdat = next(b for b in boxes if b[0] == b"mdat")
+        moov = next(b for b in boxes if b[0] == b"moov")
+        if moov[1] < mdat[1]:
+            return False
+
+        _, moov_offset, moov_size, _ = moov
+        src.seek(moov_offset)
+        patched = _shift_chunk_offsets(src.read(moov_size), moov_size, mdat[1], moov_offset)
+
+        src.seek(0, 2)
+        total = src.tell()
+        with open(dst_path, "wb") as dst:
+            _copy_range(src, dst, 0, mdat[1])
+            dst.write(patched)
+            _copy_range(src, dst, mdat[1], moov_offset - mdat[1])
+            _copy_range(src, dst, moov_offset + moov_size, total - moov_offset - moov_size)
+    return True
+
@@ -0,0 +1,117 @@
+# lessons/narration.py
+import logging
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+
+from .catalog_cache import bump_catalog_version
+from .models import Topic
+from .tts_cache import cache_key
+from .tts_kokoro import _resolve_voice, make_encoding, render_audio_bytes
+from .tts_pool import TTS_POOL
+
+logger = logging.getLogger(__name__)
+
+NARRATION_SPEED = 1.0
+
+
+def narration_encoding():
+    return make_encoding(
+        settings.TTS_NARRATION_FORMAT,
+        bitrate=settings.TTS_NARRATION_BITRATE,
+    )
+
+
+def narration_key(topic: Topic) -> str:
+    return cache_key(
+        topic.description,
+        _resolve_voice(topic.narration_voice),
+        NARRATION_SPEED,
+        narration_encoding().tag,
+    )
+
+
+def is_stale(topic: Topic) -> bool:
+    if not topic.description.strip():
+        return bool(topic.narration)
+    return not topic.narration or topic.narration_key != narration_key(topic)
+
+
+def clear_narration(topic: Topic) -> None:
+    if topic.narration:
+        topic.narration.delete(save=False)
+    # .update() so the post_save hook doesn't fire again.
+    Topic.objects.filter(pk=topic.pk).update(narration=None, narration_key="")
+    topic.narration_key = ""
+    bump_catalog_version()
+
+
+def render_narration(topic: Topic, render=render_audio_bytes, force=False) -> bool:
+    """
+    Synthesize the topic description once and store it under
+    MEDIA_ROOT/narrations/. Returns False when the stored file is
+    already current, or when the description or voice changed while
+    rendering (the newer render stores its own file).
+    """
+    if not topic.description.strip():
+        if topic.narration:
+            clear_narration(topic)
+        return False
+
+    key = narration_key(topic)
+    if not force and topic.narration and topic.narration_key == key:
+        return False
+
+    encoding = narration_encoding()
+    voice = _resolve_voice(topic.narration_voice)
+    audio = render(topic.description, voice, NARRATION_SPEED, encoding)
+
+    old_name = topic.narration.name if topic.narration else None
+    storage = topic.narration.storage
+    name = storage.save(
+        f"narrations/topic_{topic.pk}_{key[:12]}.{encoding.extension}",
+        ContentFile(audio),
+    )
+    current = Topic.objects.filter(
+        pk=topic.pk,
+        description=topic.description,
+        narration_voice=topic.narration_voice,
+    )
+    if not current.update(narration=name, narration_key=key):
+        storage.delete(name)
+        return False
+    topic.narration.name = name
+    topic.narration_key = key
+    bump_catalog_version()
+
+    if old_name and old_name != name:
+        storage.delete(old_name)
+    return True
+
+
+def _render_pooled(text, voice, speed, encoding):
+    return TTS_POOL.run(render_audio_bytes, text, voice, speed, encoding)
+
+
+def schedule_narration(topic_id) -> None:
+    """
+    Render in a background thread once the surrounding transaction
+    commits, so saving a topic never waits on inference. Failures are
+    only logged; ``manage.py render_narrations`` picks them up later.
+    """
+    def run():
+        try:
+            topic = Topic.objects.get(pk=topic_id)
+            render_narration(topic, render=_render_pooled)
+        except Topic.DoesNotExist:
+            pass
+        except Exception:
+            logger.exception("Narration for topic %s failed", topic_id)
+        finally:
+            connection.close()
+
+    transaction.on_commit(
+        lambda: threading.Thread(target=run, daemon=True).start()
+    )
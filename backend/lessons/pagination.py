@@ -0,0 +1,17 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (created_at, id), newest first. Cursors stay
+    stable while rows are being added, unlike page numbers.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+
+class IdCursorPagination(CreatedAtCursorPagination):
+    ordering = ("-id",)
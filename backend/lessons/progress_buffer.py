@@ -0,0 +1,175 @@
+# lessons/progress_buffer.py
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .leaderboard import lock_learners, record_progress_changes
+from .models import GamificationProgress
+
+logger = logging.getLogger(__name__)
+
+
+def _merge(current, stars, completed):
+    # Progress only moves forward: keep the best score, and once a topic
+    # is completed it stays completed.
+    if current is None:
+        return stars, completed
+    return max(current[0], stars), current[1] or completed
+
+
+def write_progress(events) -> None:
+    """
+    Upsert ``{(user_id, topic_id): (stars, completed)}`` in one
+    transaction, merged with what is already stored so late or
+    out-of-order events can't lower a score. The learners are locked
+    first, so concurrent flushes from other workers are serialized.
+    """
+    user_ids = {user_id for user_id, _ in events}
+    topic_ids = {topic_id for _, topic_id in events}
+
+    with transaction.atomic():
+        lock_learners(user_ids)
+        stored = {
+            (row.user_id, row.topic_id): (row.stars_earned, row.completed)
+            for row in GamificationProgress.objects.filter(
+                user_id__in=user_ids, topic_id__in=topic_ids
+            ).only("user_id", "topic_id", "stars_earned", "completed")
+        }
+
+        rows = []
+        changes = []
+        for (user_id, topic_id), (stars, completed) in events.items():
+            old = stored.get((user_id, topic_id))
+            stars, completed = _merge(old, stars, completed)
+            if old == (stars, completed):
+                continue
+            rows.append(GamificationProgress(
+                user_id=user_id,
+                topic_id=topic_id,
+                stars_earned=stars,
+                completed=completed,
+            ))
+            changes.append((user_id, topic_id, old, (stars, completed)))
+
+        if not rows:
+            return
+
+        GamificationProgress.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["user", "topic"],
+            update_fields=["stars_earned", "completed", "last_watched"],
+        )
+        record_progress_changes(changes)
+
+
+class ProgressBuffer:
+    """
+    Write-behind buffer for progress events.
+
+    Events are coalesced per (user, topic) in memory and written with a
+    single upsert every ``interval`` seconds, or as soon as ``max_size``
+    distinct pairs are pending. Either way the write runs on the timer
+    thread, never in the request that added the events. An interval of
+    0 writes immediately, in the caller.
+    A failed write keeps its events and is retried by the timer, backing
+    off up to ``max_retry_delay`` while the database stays unavailable;
+    add() never raises because of it.
+    Pending events live in this process only and are flushed at exit.
+    """
+
+    def __init__(self, interval: float, max_size: int, max_retry_delay: float = 60):
+        self.interval = interval
+        self.max_size = max_size
+        self.max_retry_delay = max_retry_delay
+        self._pending = {}
+        self._failures = 0
+        self._timer = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def add(self, user_id: int, topic_id: int, stars: int, completed: bool) -> None:
+        key = (user_id, topic_id)
+        with self._lock:
+            self._pending[key] = _merge(self._pending.get(key), stars, completed)
+            if self.interval > 0:
+                if len(self._pending) >= self.max_size:
+                    self._flush_soon()
+                else:
+                    self._schedule(self.interval)
+
+        if self.interval <= 0:
+            try:
+                self.flush()
+            except Exception:
+                # The events stay pending and go out with the next flush.
+                logger.exception("Progress flush failed; will retry")
+
+    def _flush_soon(self) -> None:
+        # Called with the lock held. While backing off, the retry timer
+        # stays as it is.
+        if self._timer is not None:
+            if self._failures:
+                return
+            self._timer.cancel()
+            self._timer = None
+        self._schedule(0)
+
+    def _schedule(self, delay: float) -> None:
+        # Called with the lock held; a timer that is already armed wins.
+        if self._timer is None:
+            self._timer = threading.Timer(delay, self._timed_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+
+            if not batch:
+                return 0
+
+            try:
+                write_progress(batch)
+            except Exception:
+                # Put the events back and retry them, later each time.
+                with self._lock:
+                    for key, (stars, completed) in batch.items():
+                        self._pending[key] = _merge(self._pending.get(key), stars, completed)
+                    self._failures += 1
+                    if self.interval > 0:
+                        self._schedule(min(
+                            self.interval * 2 ** self._failures, self.max_retry_delay
+                        ))
+                raise
+
+            with self._lock:
+                self._failures = 0
+            return len(batch)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _timed_flush(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Progress flush failed; will retry")
+        finally:
+            connection.close()
+
+
+PROGRESS_BUFFER = ProgressBuffer(
+    interval=settings.PROGRESS_FLUSH_INTERVAL,
+    max_size=settings.PROGRESS_FLUSH_SIZE,
+)
+atexit.register(PROGRESS_BUFFER.flush)
@@ -1,21 +1,137 @@
 from rest_framework import serializers
+from .metrics import span
 from .models import Topic, Media, GamificationProgress
+from .tts_kokoro import VALID_VOICES
 
-class MediaSerializer(serializers.ModelSerializer):
+
+def query_list(request, name):
+    if request is None:
+        return set()
+    return {item for item in request.query_params.get(name, "").split(",") if item}
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with span("serialize"):
+            return super().data
+
+
+class TimedDataMixin:
+    """
+    Time the top-level ``.data`` call as the "serialize" span. Nested
+    serializers go through to_representation(), so they're counted once,
+    inside their parent. Pair with ``list_serializer_class =
+    TimedListSerializer`` in Meta to cover ``many=True``.
+    """
+
+    @property
+    def data(self):
+        with span("serialize"):
+            return super().data
+
+
+class SparseFieldsMixin:
+    """
+    ``?fields=a,b`` limits the output to those fields and ``?expand=x``
+    adds the nested serializers listed in ``expandable_fields``.
+    Without ``fields``, anything in ``default_exclude`` is left out.
+    Only reads are shaped; writes always see every field, so a stray
+    ``?fields=`` can't drop required input.
+    """
+
+    expandable_fields = {}
+    default_exclude = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is not None and request.method not in ("GET", "HEAD"):
+            return
+
+        expand = query_list(request, "expand")
+        for name, (serializer_class, options) in self.expandable_fields.items():
+            if name in expand:
+                self.fields[name] = serializer_class(read_only=True, **options)
+
+        fields = query_list(request, "fields")
+        keep = fields | expand if fields else set(self.fields) - set(self.default_exclude)
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
+
+
+class ThumbnailsField(serializers.ReadOnlyField):
+    """Generated thumbnail URLs as ``{format: {width: url}}``."""
+
+    def __init__(self, **kwargs):
+        super().__init__(source="thumbnail_variants", **kwargs)
+
+    def to_representation(self, variants):
+        storage = Topic._meta.get_field("thumbnail").storage
+        request = self.context.get("request")
+        urls = {}
+        for fmt, sizes in variants.items():
+            if fmt == "source":
+                continue
+            urls[fmt] = {}
+            for width, name in sizes.items():
+                url = storage.url(name)
+                urls[fmt][width] = request.build_absolute_uri(url) if request else url
+        return urls
+
+
+class MediaSerializer(TimedDataMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Media
         fields = "__all__"
+        list_serializer_class = TimedListSerializer
 
-class TopicSerializer(serializers.ModelSerializer):
+class TopicSerializer(TimedDataMixin, serializers.ModelSerializer):
     media = MediaSerializer(many=True, read_only=True)
+    thumbnails = ThumbnailsField()
 
     class Meta:
         model = Topic
-        fields = "__all__"
+        exclude = ["thumbnail_variants"]
+        read_only_fields = ["narration"]
+        list_serializer_class = TimedListSerializer
+
+    def validate_narration_voice(self, value):
+        if value not in VALID_VOICES:
+            raise serializers.ValidationError(f"Unknown voice {value!r}.")
+        return value
 
-class GamificationProgressSerializer(serializers.ModelSerializer):
+class GamificationProgressSerializer(TimedDataMixin, serializers.ModelSerializer):
     topic = TopicSerializer(read_only=True)
 
     class Meta:
         model = GamificationProgress
         fields = "__all__"
+        list_serializer_class = TimedListSerializer
+
+
+# Lightweight list serializers: flat by default, nested data on request.
+class TopicListSerializer(TimedDataMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {"media": (MediaSerializer, {"many": True})}
+    default_exclude = ("description", "narration_key")
+    thumbnails = ThumbnailsField()
+
+    class Meta:
+        model = Topic
+        exclude = ["thumbnail_variants"]
+        list_serializer_class = TimedListSerializer
+
+class GamificationProgressListSerializer(TimedDataMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {"topic": (TopicSerializer, {})}
+
+    class Meta:
+        model = GamificationProgress
+        fields = "__all__"
+        list_serializer_class = TimedListSerializer
+
+
+class ProgressEventSerializer(serializers.Serializer):
+    topic_id = serializers.IntegerField(min_value=1)
+    stars_earned = serializers.IntegerField(min_value=0, default=0)
+    completed = serializers.BooleanField(default=False)
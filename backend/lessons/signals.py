@@ -0,0 +1,90 @@
+# lessons/signals.py
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .authentication import USER_CACHE
+from .catalog_cache import bump_catalog_version
+from .leaderboard import remove_progress
+from .models import Media, Topic
+from .narration import clear_narration, is_stale, schedule_narration
+from .uploads import (
+    delete_thumbnail_variants,
+    schedule_upload_processing,
+    thumbnail_is_stale,
+    video_needs_processing,
+)
+
+
+@receiver(post_save, sender=Topic)
+def refresh_topic_narration(sender, instance, **kwargs):
+    if not is_stale(instance):
+        return
+
+    # Drop the outdated file right away; clients fall back to live TTS
+    # until the new one is ready.
+    if instance.narration:
+        clear_narration(instance)
+
+    if settings.TTS_NARRATION_AUTORENDER and instance.description.strip():
+        schedule_narration(instance.pk)
+
+
+@receiver(post_save, sender=Media)
+def narrate_story_media(sender, instance, created, **kwargs):
+    if instance.media_type != "story" or not settings.TTS_NARRATION_AUTORENDER:
+        return
+    if is_stale(instance.topic) and instance.topic.description.strip():
+        schedule_narration(instance.topic_id)
+
+
+@receiver(post_delete, sender=Topic)
+def delete_topic_narration(sender, instance, **kwargs):
+    if instance.narration:
+        instance.narration.delete(save=False)
+
+
+@receiver(pre_delete, sender=Topic)
+def remove_topic_progress(sender, instance, **kwargs):
+    # The cascade deletes progress rows without going through the
+    # summaries; TopicStats goes with the topic.
+    remove_progress(topic_id=instance.pk)
+
+
+@receiver(pre_delete, sender=get_user_model())
+def remove_user_progress(sender, instance, **kwargs):
+    # Same for learners; their LearnerSummary goes with the user.
+    remove_progress(user_id=instance.pk)
+
+
+@receiver(post_save, sender=Topic)
+def process_topic_thumbnail(sender, instance, **kwargs):
+    if settings.UPLOAD_AUTOPROCESS and thumbnail_is_stale(instance):
+        schedule_upload_processing(Topic, instance.pk)
+
+
+@receiver(post_save, sender=Media)
+def process_media_upload(sender, instance, **kwargs):
+    if settings.UPLOAD_AUTOPROCESS and video_needs_processing(instance):
+        schedule_upload_processing(Media, instance.pk)
+
+
+@receiver(post_delete, sender=Topic)
+def delete_topic_thumbnails(sender, instance, **kwargs):
+    delete_thumbnail_variants(instance.thumbnail_variants, instance.thumbnail.storage)
+
+
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+@receiver(post_save, sender=Media)
+@receiver(post_delete, sender=Media)
+def invalidate_catalog(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Covers deactivation and password changes; tokens re-resolve next request.
+    USER_CACHE.invalidate(instance.pk)
@@ -1,3 +1,1574 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import (
+    AsyncRequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import async_views, leaderboard, mp4, tts_kokoro, views
+from .authentication import USER_CACHE, UserCache
+from .catalog_cache import bump_catalog_version
+from .metrics import REQUESTS, SPANS
+from .leaderboard import (
+    Leaderboard,
+    learner_rank,
+    rebuild_summaries,
+    reset_leaderboard,
+    top_learners,
+)
+from .narration import is_stale, narration_key, render_narration
+from .models import GamificationProgress, LearnerSummary, Media, Topic, TopicStats
+from .progress_buffer import PROGRESS_BUFFER, ProgressBuffer, write_progress
+from .tts_batch import TTS_BATCHER, TTSBatcher
+from .tts_fake import FakePipeline
+from .tts_cache import (
+    PHONEME_CACHE,
+    SEGMENT_CACHE,
+    AudioCache,
+    PhonemeCache,
+    SegmentCache,
+    cache_key,
+)
+from .tts_kokoro import MAX_PHONEMES, WAV, render_audio_bytes, stream_audio, wav_header
+from .tts_onnx import OnnxPipeline, english_g2p
+from .tts_pool import TTS_POOL, TTSQueueFull, TTSTimeout, TTSWorkerPool
+from .uploads import process_thumbnail, process_video, thumbnail_is_stale, video_needs_processing
+from .voice_pack import VoicePack, write_voice_pack
+from .voicerss_tts import VoiceRSSClient, VoiceRSSError
+
+
+class AudioCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        self.cache = AudioCache(self.root, max_bytes=100)
+
+    def age(self, key, mtime):
+        os.utime(self.cache.path_for(key), (mtime, mtime))
+
+    def test_round_trip_and_counters(self):
+        self.assertIsNone(self.cache.get("ab12"))
+        self.cache.put("ab12", b"RIFF")
+
+        self.assertEqual(self.cache.get("ab12"), b"RIFF")
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.put("aa01", b"x" * 40)
+        self.cache.put("bb02", b"x" * 40)
+        self.age("aa01", 1000)
+        self.age("bb02", 2000)
+        self.cache.get("aa01")  # bumps aa01 past bb02
+
+        self.cache.put("cc03", b"x" * 40)
+
+        self.assertIsNotNone(self.cache.get("aa01"))
+        self.assertIsNone(self.cache.get("bb02"))
+        self.assertLessEqual(self.cache.stats()["bytes"], 100)
+
+    def test_oversized_entries_are_not_stored(self):
+        self.cache.put("aa01", b"x" * 101)
+
+        self.assertIsNone(self.cache.get("aa01"))
+
+    def test_writes_are_atomic(self):
+        entry = self.cache.begin("aa01")
+        entry.write(b"RIFF")
+        # Nothing is visible until commit, and no temp files are left behind.
+        self.assertIsNone(self.cache.get("aa01"))
+        entry.commit()
+        self.assertEqual(self.cache.get("aa01"), b"RIFF")
+
+        self.cache.begin("bb02").discard()
+        self.assertIsNone(self.cache.get("bb02"))
+        leftovers = [f for _, _, files in os.walk(self.root) for f in files if f.endswith(".tmp")]
+        self.assertEqual(leftovers, [])
+
+    def test_key_ignores_whitespace_but_not_voice(self):
+        self.assertEqual(cache_key("Hello  world", "af_heart", 1.0), cache_key("Hello world", "af_heart", 1.0))
+        self.assertNotEqual(cache_key("Hello", "af_heart", 1.0), cache_key("Hello", "bm_george", 1.0))
+
+
+class FakeTTSMixin:
+    """Runs TTS on the fake engine with a private audio cache and empty segment caches."""
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.audio_cache = AudioCache(tmp.name, 10 * 1024 * 1024)
+        self.enterContext(override_settings(TTS_ENGINE="fake"))
+        self.enterContext(mock.patch.dict("lessons.tts_kokoro._PIPELINES", clear=True))
+        self.enterContext(mock.patch("lessons.tts_kokoro.AUDIO_CACHE", self.audio_cache))
+        # Synthesize in the test process; TTSPoolTests covers real workers.
+        self.enterContext(mock.patch.object(TTS_POOL, "workers", 0))
+        for cache in (SEGMENT_CACHE, PHONEME_CACHE):
+            cache.clear()
+            self.addCleanup(cache.clear)
+
+
+class StreamingTTSTests(FakeTTSMixin, TestCase):
+    def test_stream_is_written_to_the_cache(self):
+        chunks = list(stream_audio("Hello\nWorld", "af_heart", 1.0))
+
+        self.assertEqual(len(chunks), 2)  # one per line, the header in front of the first
+        self.assertTrue(chunks[0].startswith(wav_header()))
+        pcm = b"".join(chunks)[44:]
+        cached = self.audio_cache.get(cache_key("Hello\nWorld", "af_heart", 1.0, WAV.tag))
+        # The cached copy carries the real length instead of the streaming placeholder.
+        self.assertEqual(cached, wav_header(len(pcm)) + pcm)
+
+        self.assertEqual(list(stream_audio("Hello\nWorld", "af_heart", 1.0)), [cached])
+
+    def test_abandoned_stream_is_not_cached(self):
+        chunks = stream_audio("Hello\nWorld", "af_heart", 1.0)
+        next(chunks)
+        chunks.close()
+
+        self.assertIsNone(self.audio_cache.get(cache_key("Hello\nWorld", "af_heart", 1.0, WAV.tag)))
+
+    def test_pcm_stream_has_no_header(self):
+        chunks = list(stream_audio("Hello", "af_heart", 1.0, fmt="pcm"))
+
+        self.assertEqual(len(chunks), 1)
+        self.assertNotEqual(chunks[0][:4], b"RIFF")
+
+    def test_view_streams(self):
+        request = APIRequestFactory().post(
+            "/api/tts/kokoro/", {"text": "Hello\nWorld", "stream": True}, format="json"
+        )
+        response = views.tts_kokoro(request)
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "audio/wav")
+        self.assertEqual(response["X-Accel-Buffering"], "no")
+        self.assertEqual(b"".join(response.streaming_content)[:4], b"RIFF")
+
+
+class AudioEncodingTests(FakeTTSMixin, TestCase):
+    def tts(self, accept=None, **data):
+        headers = {"HTTP_ACCEPT": accept} if accept else {}
+        return self.client.post(
+            "/api/tts/kokoro/", {"text": "Hello", **data}, content_type="application/json", **headers
+        )
+
+    def test_accept_header_picks_the_format(self):
+        for accept, content_type, magic in (
+            ("audio/ogg", "audio/ogg", b"OggS"),
+            ("audio/mpeg", "audio/mpeg", None),
+            ("audio/flac;q=0.5, audio/opus", "audio/ogg", b"OggS"),
+            ("audio/*", "audio/wav", b"RIFF"),
+            ("audio/x-flac", "audio/flac", b"fLaC"),
+        ):
+            with self.subTest(accept=accept):
+                response = self.tts(accept)
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response["Content-Type"], content_type)
+                self.assertIn("Accept", response["Vary"])
+                if magic:
+                    self.assertEqual(response.content[:4], magic)
+
+    def test_non_object_json_is_rejected(self):
+        response = self.client.post("/api/tts/kokoro/", ["Hello"], content_type="application/json")
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_format_field_wins_over_accept(self):
+        response = self.tts("audio/ogg", format="wav")
+
+        self.assertEqual(response["Content-Type"], "audio/wav")
+
+    def test_errors_are_json_under_an_audio_accept(self):
+        response = self.tts("audio/ogg", format="ogg", sample_rate=44100)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("sample_rate for ogg", response.json()["error"])
+
+    def test_encodings_are_cached_separately(self):
+        wav = tts_kokoro.synthesize_audio_bytes("Hello", encoding=WAV)
+        low = tts_kokoro.make_encoding("wav", sample_rate=16000)
+        downsampled = tts_kokoro.synthesize_audio_bytes("Hello", encoding=low)
+
+        self.assertLess(len(downsampled), len(wav))
+        self.assertEqual(struct.unpack("<I", downsampled[24:28])[0], 16000)
+        self.assertEqual(tts_kokoro.make_encoding("mp3", bitrate=999).bitrate, 160)
+        self.assertEqual(self.audio_cache.get(cache_key("Hello", "af_heart", 1.0, low.tag)), downsampled)
+
+
+class SegmentCacheTests(FakeTTSMixin, SimpleTestCase):
+    def test_edited_story_renders_only_the_changed_line(self):
+        render = mock.Mock(wraps=tts_kokoro.render_segment)
+        first = list(tts_kokoro.iter_audio("One\nTwo\nThree", "af_heart", 1.0, render=render))
+        self.assertEqual(render.call_count, 3)
+
+        render.reset_mock()
+        second = list(tts_kokoro.iter_audio("One\nTwo, edited\n\nThree", "af_heart", 1.0, render=render))
+
+        render.assert_called_once_with("Two, edited", "af_heart", 1.0)
+        self.assertIs(second[0], first[0])
+        self.assertIs(second[2], first[2])
+
+    def test_key_ignores_whitespace_but_not_voice_or_speed(self):
+        key = SEGMENT_CACHE.key
+        self.assertEqual(key("  Two   lines ", "af_heart", 1), key("Two lines", "af_heart", 1.0))
+        self.assertNotEqual(key("Two", "af_heart", 1.0), key("Two", "bf_emma", 1.0))
+        self.assertNotEqual(key("Two", "af_heart", 1.0), key("Two", "af_heart", 1.25))
+
+    def test_lru_is_bounded_by_bytes(self):
+        cache = SegmentCache(max_bytes=2 * 400)
+        for name in "abc":
+            cache.put(name, np.zeros(100, dtype=np.float32))  # 400 bytes each
+        cache.put("huge", np.zeros(1000, dtype=np.float32))
+
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNone(cache.get("huge"))
+        self.assertFalse(cache.get("c").flags.writeable)
+        self.assertEqual(cache.stats()["bytes"], 800)
+
+
+class PipelineLoadingTests(FakeTTSMixin, SimpleTestCase):
+    def test_one_pipeline_per_language_built_on_first_use(self):
+        self.assertEqual(tts_kokoro._PIPELINES, {})
+
+        pipelines = []
+        threads = [
+            threading.Thread(target=lambda: pipelines.append(tts_kokoro.get_pipeline("a")))
+            for _ in range(4)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len({id(p) for p in pipelines}), 1)
+        self.assertIsNot(tts_kokoro.get_pipeline("b"), pipelines[0])
+        self.assertEqual(set(tts_kokoro._PIPELINES), {"a", "b"})
+
+    def test_warm_tts_loads_voices(self):
+        call_command("warm_tts", "--lang", "a", "--voices", "af_heart", "bf_emma", stdout=io.StringIO())
+
+        self.assertIn("af_heart", tts_kokoro._PIPELINES["a"].voices)
+        self.assertIn("bf_emma", tts_kokoro._PIPELINES["b"].voices)
+
+    def test_warm_tts_rejects_unknown_voices(self):
+        with self.assertRaisesMessage(CommandError, "Unknown voices: af_nobody"):
+            call_command("warm_tts", "--voices", "af_nobody", stdout=io.StringIO())
+
+
+class TTSPoolTests(FakeTTSMixin, SimpleTestCase):
+    def test_worker_timeout_and_backpressure(self):
+        pool = TTSWorkerPool(workers=1, queue_depth=0, timeout=30, retry_after=3)
+        self.addCleanup(lambda: pool._executor and pool._executor.shutdown(wait=True, cancel_futures=True))
+
+        with mock.patch.dict(os.environ, {"TTS_ENGINE": "fake"}):
+            self.assertEqual(pool.run(abs, -2), 2)  # starts the worker
+
+            pool.timeout = 0.2
+            with self.assertRaises(TTSTimeout):
+                pool.run(time.sleep, 1)
+            # The timed-out job still holds the only slot until it finishes.
+            with self.assertRaises(TTSQueueFull) as full:
+                pool.run(abs, -1)
+            self.assertEqual(full.exception.retry_after, 3)
+
+            time.sleep(1.2)
+            self.assertEqual(pool.run(abs, -1), 1)
+
+    @override_settings(METRICS_ENABLED=True)
+    def test_worker_spans_and_caches_reach_the_parent(self):
+        pool = TTSWorkerPool(workers=1, queue_depth=0, timeout=30, retry_after=3)
+        self.addCleanup(lambda: pool._executor and pool._executor.shutdown(wait=True))
+        SPANS.reset()
+        self.addCleanup(SPANS.reset)
+
+        env = {"TTS_ENGINE": "fake", "METRICS_ENABLED": "True"}
+        with mock.patch.dict(os.environ, env), mock.patch("lessons.tts_pool.TTS_POOL", pool), \
+                mock.patch.multiple(TTS_BATCHER, runner=pool.run, arunner=pool.arun, idle=pool.idle):
+            response = self.client.post(
+                "/api/tts/kokoro/", {"text": "Hello"}, content_type="application/json"
+            )
+            body = self.client.get("/metrics").content.decode()
+
+        self.assertEqual(response.status_code, 200)
+        for name in ("tts_g2p;", "tts_generate;", "tts_concat;", "tts_encode;"):
+            self.assertIn(name, response["Server-Timing"])
+        self.assertIn('span_duration_seconds_count{span="tts_generate"} 1', body)
+        # Phonemes are only ever cached in the worker.
+        self.assertIn("tts_phoneme_cache_entries 1", body)
+
+    def test_cached_stream_needs_no_slot(self):
+        pool = TTSWorkerPool(workers=0, queue_depth=0, timeout=30, retry_after=3)
+        render = partial(pool.run, tts_kokoro.render_segment)
+        pcm = b"".join(stream_audio("Hello", "af_heart", 1.0, render=render))[44:]
+
+        self.assertTrue(pool.idle())
+        with pool.slot():  # the pool is saturated
+            self.assertFalse(pool.idle())
+            cached = b"".join(stream_audio("Hello", "af_heart", 1.0, render=render))
+            self.assertEqual(cached[44:], pcm)
+            with self.assertRaises(TTSQueueFull):
+                next(stream_audio("Goodbye", "af_heart", 1.0, render=render))
+
+    def test_view_maps_overload_to_503_and_504(self):
+        for error, status in ((TTSQueueFull(7), 503), (TTSTimeout("slow"), 504)):
+            with mock.patch.object(views, "synthesize_with_failover", side_effect=error):
+                response = views.tts_kokoro(
+                    APIRequestFactory().post("/api/tts/kokoro/", {"text": "Hi"}, format="json")
+                )
+            self.assertEqual(response.status_code, status)
+        self.assertEqual(
+            views._queue_full(TTSQueueFull(7))["Retry-After"], "7"
+        )
+
+
+class NarrationTests(FakeTTSMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.media_root = tmp.name
+        self.enterContext(override_settings(MEDIA_ROOT=tmp.name))
+        self.schedule = self.enterContext(mock.patch("lessons.signals.schedule_narration"))
+        self.topic = Topic.objects.create(title="Apple", description="An apple a day.")
+
+    def stored(self, topic):
+        topic.refresh_from_db()
+        return topic.narration.name
+
+    def test_render_stores_ogg_once(self):
+        self.schedule.assert_called_once_with(self.topic.pk)
+
+        self.assertTrue(render_narration(self.topic))
+        name = self.stored(self.topic)
+        with open(os.path.join(self.media_root, name), "rb") as f:
+            self.assertEqual(f.read(4), b"OggS")
+        self.assertEqual(self.topic.narration_key, narration_key(self.topic))
+
+        self.assertFalse(render_narration(self.topic))
+        self.assertFalse(is_stale(self.topic))
+
+    def test_edit_clears_the_stale_file_and_schedules_a_render(self):
+        render_narration(self.topic)
+        old = os.path.join(self.media_root, self.stored(self.topic))
+        self.schedule.reset_mock()
+
+        self.topic.description = "A pear a day."
+        self.topic.save()
+
+        self.assertFalse(os.path.exists(old))
+        self.assertFalse(self.stored(self.topic))
+        self.assertEqual(self.topic.narration_key, "")
+        self.schedule.assert_called_once_with(self.topic.pk)
+
+    def test_voice_change_replaces_the_file(self):
+        render_narration(self.topic)
+        old = self.stored(self.topic)
+
+        Topic.objects.filter(pk=self.topic.pk).update(narration_voice="bf_emma")
+        self.topic.refresh_from_db()
+        self.assertTrue(is_stale(self.topic))
+        self.assertTrue(render_narration(self.topic))
+
+        self.assertNotEqual(self.stored(self.topic), old)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, old)))
+
+    def test_unknown_voice_is_rejected_and_never_rendered(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("editor", password="pw"))
+        url = f"/api/topics/{self.topic.pk}/"
+        response = client.patch(url, {"narration_voice": ""}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("narration_voice", response.json())
+
+        # Rows written some other way fall back to the default voice.
+        Topic.objects.filter(pk=self.topic.pk).update(narration_voice="")
+        self.topic.refresh_from_db()
+        self.assertTrue(render_narration(self.topic))
+
+    def test_render_of_an_old_description_is_discarded(self):
+        def render(text, voice, speed, encoding):
+            # The topic is edited while this render is in flight.
+            Topic.objects.filter(pk=self.topic.pk).update(description="A pear a day.")
+            return render_audio_bytes(text, voice, speed, encoding)
+
+        self.assertFalse(render_narration(self.topic, render=render))
+
+        self.assertFalse(self.stored(self.topic))
+        self.assertEqual(os.listdir(os.path.join(self.media_root, "narrations")), [])
+
+    def test_command_renders_stale_topics(self):
+        Topic.objects.create(title="Empty", description="")
+        out = io.StringIO()
+        call_command("render_narrations", stdout=out, stderr=io.StringIO())
+
+        self.assertIn("1 rendered, 1 up to date, 0 failed", out.getvalue())
+        self.assertTrue(self.stored(self.topic))
+
+
+class _StubVoiceRSS(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # (status, body) pairs served in order; the last one repeats.
+    replies = [(200, b"RIFFfake")]
+    requests = []
+    connections = set()
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        params = parse_qs(self.rfile.read(length).decode())
+        type(self).requests.append(params)
+        type(self).connections.add(self.client_address)
+
+        replies = type(self).replies
+        status, body = replies.pop(0) if len(replies) > 1 else replies[0]
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class VoiceRSSClientTests(SimpleTestCase):
+    def setUp(self):
+        _StubVoiceRSS.replies = [(200, b"RIFFfake")]
+        _StubVoiceRSS.requests = []
+        _StubVoiceRSS.connections = set()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubVoiceRSS)
+        threading.Thread(
+            target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        ).start()
+        self.client = VoiceRSSClient(
+            key="test",
+            base_url=f"http://127.0.0.1:{self.server.server_port}/",
+            timeout=2,
+            retries=2,
+            backoff=0,
+        )
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_reuses_connection(self):
+        for _ in range(3):
+            self.assertEqual(self.client.speech("Hello"), b"RIFFfake")
+
+        self.assertEqual(len(_StubVoiceRSS.requests), 3)
+        self.assertEqual(len(_StubVoiceRSS.connections), 1)
+        self.assertEqual(_StubVoiceRSS.requests[0]["src"], ["Hello"])
+
+    def test_retries_server_errors(self):
+        _StubVoiceRSS.replies = [(503, b""), (502, b""), (200, b"RIFFok")]
+
+        self.assertEqual(self.client.speech("Hello"), b"RIFFok")
+        self.assertEqual(len(_StubVoiceRSS.requests), 3)
+
+    def test_gives_up_after_retries(self):
+        _StubVoiceRSS.replies = [(503, b"")]
+
+        with self.assertRaises(VoiceRSSError):
+            self.client.speech("Hello")
+        self.assertEqual(len(_StubVoiceRSS.requests), 3)
+
+    def test_api_error_is_not_retried(self):
+        _StubVoiceRSS.replies = [(200, b"ERROR: The API key is not available!")]
+
+        with self.assertRaisesMessage(VoiceRSSError, "API key"):
+            self.client.speech("Hello")
+        self.assertEqual(len(_StubVoiceRSS.requests), 1)
+
+
+class QueryCountTests(TestCase):
+    """
+    List endpoints must issue the same number of queries no matter how
+    many rows they return.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user("learner", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def seed(self, topics, media_per_topic=3):
+        for i in range(topics):
+            topic = Topic.objects.create(title=f"Topic {i}", description="")
+            for _ in range(media_per_topic):
+                Media.objects.create(topic=topic, media_type="youtube")
+            GamificationProgress.objects.create(user=self.user, topic=topic, stars_earned=i)
+
+    def assertConstantQueries(self, url, expected):
+        for topics in (1, 10):
+            self.seed(topics)
+            with self.assertNumQueries(expected):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_topic_list(self):
+        self.assertConstantQueries("/api/topics/", 1)
+
+    def test_topic_list_with_media(self):
+        # topics + media
+        self.assertConstantQueries("/api/topics/?expand=media", 2)
+
+    def test_media_list(self):
+        self.assertConstantQueries("/api/media/", 1)
+
+    def test_progress_list(self):
+        self.assertConstantQueries("/api/gamification/", 1)
+
+    def test_progress_list_with_topic(self):
+        # progress joined with topics + media
+        self.assertConstantQueries("/api/gamification/?expand=topic", 2)
+
+
+@skipUnless(connection.vendor == "sqlite", "reads SQLite query plans")
+class IndexUsageTests(TestCase):
+    """The paginated lists and the sync feed are served by their indexes."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("learner", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for i in range(3):
+            topic = Topic.objects.create(title=f"Topic {i}", description="")
+            Media.objects.create(topic=topic, media_type="youtube")
+            GamificationProgress.objects.create(user=self.user, topic=topic)
+
+    def plans(self, url):
+        bump_catalog_version()  # make the catalog views query again
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        with connection.cursor() as cursor:
+            plans = []
+            for query in queries.captured_queries:
+                cursor.execute("EXPLAIN QUERY PLAN " + query["sql"])
+                plans.append(" / ".join(row[-1] for row in cursor.fetchall()))
+        return plans
+
+    def test_cursor_pages(self):
+        first = self.client.get("/api/topics/?page_size=2").json()
+        for url in ("/api/topics/?page_size=2", first["next"]):
+            self.assertIn("USING INDEX topic_created_idx", self.plans(url)[0])
+
+        self.assertIn("USING INDEX media_created_idx", self.plans("/api/media/?page_size=2")[0])
+
+    def test_sync_feed(self):
+        plan = self.plans("/api/gamification/sync/?since=2026-01-01T00:00:00Z")[0]
+
+        self.assertIn("USING INDEX progress_user_watched_idx (user_id=? AND last_watched>?)", plan)
+
+
+class SparseListTests(TestCase):
+    def setUp(self):
+        for i in range(3):
+            topic = Topic.objects.create(title=f"Topic {i}", description="Long text")
+            Media.objects.create(topic=topic, media_type="youtube")
+
+    def test_list_is_flat_by_default(self):
+        row = self.client.get("/api/topics/").json()["results"][0]
+
+        self.assertNotIn("media", row)
+        self.assertNotIn("description", row)
+        self.assertIn("title", row)
+
+    def test_fields_and_expand(self):
+        data = self.client.get("/api/topics/?fields=id,description&expand=media").json()
+
+        self.assertEqual(set(data["results"][0]), {"id", "description", "media"})
+
+    def test_writes_ignore_fields(self):
+        user = User.objects.create_user("editor", password="x")
+        client = APIClient()
+        client.force_authenticate(user)
+        topic = Topic.objects.first()
+
+        response = client.post(
+            "/api/media/?fields=id", {"topic": topic.pk, "media_type": "youtube"}, format="multipart"
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["topic"], topic.pk)
+        self.assertEqual(Media.objects.filter(topic=topic).count(), 2)
+
+    def test_cursor_pages(self):
+        first = self.client.get("/api/topics/?page_size=2").json()
+        second = self.client.get(first["next"]).json()
+
+        titles = [t["title"] for t in first["results"] + second["results"]]
+        self.assertEqual(titles, ["Topic 2", "Topic 1", "Topic 0"])
+        self.assertIsNone(second["next"])
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        Topic.objects.create(title="Apples", description="")
+
+    def test_conditional_get_skips_database(self):
+        first = self.client.get("/api/topics/")
+        etag = first["ETag"]
+
+        with self.assertNumQueries(0):
+            again = self.client.get("/api/topics/", HTTP_IF_NONE_MATCH=etag)
+            cached = self.client.get("/api/topics/")
+
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(cached.content, first.content)
+        self.assertIn("max-age", first["Cache-Control"])
+
+    def test_save_invalidates(self):
+        etag = self.client.get("/api/topics/")["ETag"]
+
+        Topic.objects.create(title="Bananas", description="")
+        response = self.client.get("/api/topics/", HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.json()["results"]), 2)
+
+    def test_unshared_cache_expires_with_the_ttl(self):
+        # Another worker's edit never reaches this process's local cache.
+        first = self.client.get("/api/topics/")
+        Topic.objects.filter(title="Apples").update(title="Pears")
+
+        later = time.time() + settings.CATALOG_CACHE_TTL + 1
+        with mock.patch("django.core.cache.backends.locmem.time.time", return_value=later):
+            response = self.client.get("/api/topics/", HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertLessEqual(settings.CATALOG_CACHE_TTL, 60)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["title"], "Pears")
+
+    def test_voice_list(self):
+        first = self.client.get("/api/tts/kokoro/voices/")
+        again = self.client.get("/api/tts/kokoro/voices/", HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(again.status_code, 304)
+
+
+class BulkProgressTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("learner", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.apples = Topic.objects.create(title="Apples", description="")
+        self.bananas = Topic.objects.create(title="Bananas", description="")
+
+        patcher = mock.patch.object(PROGRESS_BUFFER, "interval", 60)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(PROGRESS_BUFFER.flush)
+
+    def post(self, events):
+        return self.client.post("/api/gamification/bulk-progress/", {"events": events}, format="json")
+
+    def test_events_are_coalesced_and_never_regress(self):
+        response = self.post([
+            {"topic_id": self.apples.id, "stars_earned": 2},
+            {"topic_id": self.apples.id, "stars_earned": 3, "completed": True},
+            {"topic_id": self.apples.id, "stars_earned": 1},
+            {"topic_id": self.bananas.id, "stars_earned": 1},
+            {"topic_id": 9999, "stars_earned": 1},
+        ])
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {"accepted": 4, "unknown_topics": [9999]})
+        self.assertEqual(PROGRESS_BUFFER.pending(), 2)
+        self.assertFalse(GamificationProgress.objects.exists())
+
+        self.assertEqual(PROGRESS_BUFFER.flush(), 2)
+
+        self.post([{"topic_id": self.apples.id, "stars_earned": 1, "completed": False}])
+        PROGRESS_BUFFER.flush()
+
+        apples = GamificationProgress.objects.get(user=self.user, topic=self.apples)
+        self.assertEqual((apples.stars_earned, apples.completed), (3, True))
+
+    def test_failed_write_still_accepts_every_event(self):
+        events = [
+            {"topic_id": self.apples.id, "stars_earned": 2},
+            {"topic_id": self.bananas.id, "stars_earned": 1},
+        ]
+        with mock.patch.object(PROGRESS_BUFFER, "interval", 0), \
+                mock.patch("lessons.progress_buffer.write_progress", side_effect=RuntimeError), \
+                self.assertLogs("lessons.progress_buffer", "ERROR"):
+            response = self.post(events)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["accepted"], 2)
+        self.assertEqual(PROGRESS_BUFFER.pending(), 2)
+
+    def test_invalid_event(self):
+        response = self.post([{"stars_earned": 1}])
+
+        self.assertEqual(response.status_code, 400)
+
+
+class ProgressBufferTests(SimpleTestCase):
+    def test_failed_timed_flush_is_retried(self):
+        buffer = ProgressBuffer(interval=0.05, max_size=100)
+        written = threading.Event()
+
+        def write_progress(batch):
+            if write.call_count == 1:
+                raise RuntimeError("database is locked")
+            written.set()
+
+        write = mock.Mock(side_effect=write_progress)
+
+        with mock.patch("lessons.progress_buffer.write_progress", write), \
+                self.assertLogs("lessons.progress_buffer", "ERROR"):
+            buffer.add(1, 2, 3, False)
+            buffer.add(1, 2, 1, True)
+            self.assertTrue(written.wait(5))
+
+        self.assertEqual(write.call_count, 2)
+        self.assertEqual(write.call_args.args[0], {(1, 2): (3, True)})
+        self.assertEqual(buffer.pending(), 0)
+        self.assertEqual(buffer._failures, 0)
+
+    def test_retries_back_off(self):
+        buffer = ProgressBuffer(interval=1, max_size=100, max_retry_delay=3)
+        self.addCleanup(lambda: buffer._timer and buffer._timer.cancel())
+        buffer.add(1, 2, 3, False)
+
+        with mock.patch("lessons.progress_buffer.write_progress", side_effect=RuntimeError):
+            for delay in (2, 3, 3):
+                with self.assertRaises(RuntimeError):
+                    buffer.flush()
+                self.assertEqual(buffer._timer.interval, delay)
+
+        self.assertEqual(buffer.pending(), 1)
+
+    def test_full_buffer_flushes_off_the_request_thread(self):
+        buffer = ProgressBuffer(interval=60, max_size=2)
+        self.addCleanup(lambda: buffer._timer and buffer._timer.cancel())
+        threads = []
+
+        def write_progress(batch):
+            threads.append(threading.get_ident())
+            raise RuntimeError("database is locked")
+
+        with mock.patch("lessons.progress_buffer.write_progress", write_progress), \
+                self.assertLogs("lessons.progress_buffer", "ERROR"):
+            buffer.add(1, 2, 3, False)
+            buffer.add(1, 3, 1, True)  # reaches max_size, doesn't raise
+            flush = buffer._timer
+            flush.join(5)
+
+        self.assertEqual(flush.interval, 0)
+
+        self.assertNotEqual(threads[0], threading.get_ident())
+        self.assertEqual(buffer.pending(), 2)
+        self.assertEqual(buffer._failures, 1)
+
+
+@override_settings(PROGRESS_SYNC_LAG=0)
+class ProgressSyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("learner", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.topics = [Topic.objects.create(title=f"Topic {i}", description="") for i in range(3)]
+        for topic in self.topics:
+            GamificationProgress.objects.create(user=self.user, topic=topic, stars_earned=1)
+        other = User.objects.create_user("other", password="pw")
+        GamificationProgress.objects.create(user=other, topic=self.topics[0], stars_earned=3)
+
+    def sync(self, since=None):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/gamification/sync/", {"since": since} if since else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_only_changes_after_watermark(self):
+        full = self.sync()
+        self.assertEqual(full["rows"], [[topic.id, 1, False] for topic in self.topics])
+
+        self.assertEqual(self.sync(full["watermark"])["rows"], [])
+
+        progress = GamificationProgress.objects.get(user=self.user, topic=self.topics[1])
+        progress.stars_earned, progress.completed = 3, True
+        progress.save()
+
+        delta = self.sync(full["watermark"])
+        self.assertEqual(delta["rows"], [[self.topics[1].id, 3, True]])
+        self.assertGreater(delta["watermark"], full["watermark"])
+
+    def test_invalid_watermark(self):
+        for since in ("yesterday", "2026-01-01T00:00:00"):
+            response = self.client.get("/api/gamification/sync/", {"since": since})
+            self.assertEqual(response.status_code, 400)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        reset_leaderboard()
+        self.addCleanup(reset_leaderboard)
+        self.topics = [Topic.objects.create(title=f"T{i}", description="") for i in range(3)]
+        self.users = [User.objects.create_user(f"kid{i}", password="pw") for i in range(3)]
+        self.client = APIClient()
+
+    def update(self, user, topic, stars, completed=False):
+        self.client.force_authenticate(user)
+        return self.client.post(
+            "/api/gamification/update-progress/",
+            {"topic_id": topic.id, "stars_earned": stars, "completed": completed},
+            format="json",
+        )
+
+    def test_ranking_structure(self):
+        board = Leaderboard()
+        for user_id, score in [(1, 5), (2, 9), (3, 5), (4, 0), (5, 200)]:
+            board.set(user_id, score)
+        board.set(2, 1)
+
+        self.assertEqual(
+            [(r["rank"], r["user_id"]) for r in board.top(3)],
+            [(1, 5), (2, 1), (2, 3)],
+        )
+        self.assertEqual(board.rank_of(2), 4)
+        self.assertEqual(board.rank_of(4), 5)
+
+    def test_summaries_follow_update_progress(self):
+        a, b, c = self.users
+        self.update(a, self.topics[0], 3, True)
+        self.update(a, self.topics[1], 2)
+        self.update(b, self.topics[0], 4, True)
+        self.update(a, self.topics[1], 1)
+
+        summary = LearnerSummary.objects.get(user=a)
+        self.assertEqual((summary.total_stars, summary.completed_topics), (4, 1))
+        stats = TopicStats.objects.get(topic=self.topics[0])
+        self.assertEqual((stats.learners, stats.completions), (2, 2))
+
+        self.client.force_authenticate(c)
+        top = self.client.get("/api/leaderboard/").json()["results"]
+        self.assertEqual([(r["username"], r["total_stars"]) for r in top], [("kid0", 4), ("kid1", 4)])
+        me = self.client.get("/api/leaderboard/me/").json()
+        self.assertEqual((me["rank"], me["total_stars"]), (3, 0))
+
+    def summaries(self):
+        # Rows that dropped to zero are equivalent to missing ones.
+        return (
+            list(LearnerSummary.objects.filter(total_stars__gt=0).values_list(
+                "user_id", "total_stars", "completed_topics").order_by("user_id")),
+            list(TopicStats.objects.filter(learners__gt=0).values_list(
+                "topic_id", "learners", "completions").order_by("topic_id")),
+        )
+
+    def test_deleting_a_topic_or_user_updates_summaries(self):
+        a, b, _ = self.users
+        self.update(a, self.topics[0], 3, True)
+        self.update(a, self.topics[1], 2)
+        self.update(b, self.topics[0], 4, True)
+        self.update(b, self.topics[2], 1)
+        self.assertEqual(learner_rank(a.id)[:2], (1, 5))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.topics[0].delete()
+        self.assertEqual(learner_rank(a.id)[:2], (1, 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            b.delete()
+        self.assertEqual(learner_rank(a.id)[:2], (1, 2))
+        self.assertEqual(top_learners(5), [{"rank": 1, "user_id": a.id, "total_stars": 2}])
+
+        incremental = self.summaries()
+        rebuild_summaries()
+        self.assertEqual(incremental, self.summaries())
+
+    def test_writers_lock_the_learner_first(self):
+        a = self.users[0]
+        with CaptureQueriesContext(connection) as queries:
+            write_progress({(a.id, self.topics[0].id): (3, False)})
+
+        sql = [q["sql"] for q in queries.captured_queries]
+        lock = next(i for i, q in enumerate(sql) if '"lessons_learnersummary"' in q and "SELECT" in q)
+        read = next(i for i, q in enumerate(sql) if q.startswith('SELECT') and '"lessons_gamificationprogress"' in q)
+        self.assertLess(lock, read)
+        self.assertEqual(LearnerSummary.objects.get(user=a).total_stars, 3)
+
+    def test_writes_already_loaded_are_not_counted_twice(self):
+        a = self.users[0]
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.update(a, self.topics[0], 3)
+        # The board is loaded after the commit but before the callback runs.
+        self.assertEqual(learner_rank(a.id)[:2], (1, 3))
+
+        clock = SimpleNamespace(monotonic=lambda: leaderboard._loaded_at - 1)
+        with mock.patch.object(leaderboard, "time", clock):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(learner_rank(a.id)[:2], (1, 3))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.update(a, self.topics[1], 2)
+        self.assertEqual(learner_rank(a.id)[:2], (1, 5))
+
+    def test_stale_board_is_reloaded_in_the_background(self):
+        self.update(self.users[0], self.topics[0], 3)
+        board = leaderboard._current()
+        leaderboard._loaded_at -= settings.LEADERBOARD_REFRESH + 1
+        loaded = threading.Event()
+        threads = []
+
+        def load():
+            threads.append(threading.get_ident())
+            loaded.set()
+
+        with mock.patch("lessons.leaderboard._load", load):
+            self.assertEqual(top_learners(1)[0]["total_stars"], 3)  # served from the old board
+            self.assertTrue(loaded.wait(5))
+
+        self.assertNotEqual(threads, [threading.get_ident()])
+        self.assertIs(leaderboard._board, board)
+
+    def test_rebuild_matches_incremental(self):
+        self.update(self.users[0], self.topics[0], 3, True)
+        self.update(self.users[1], self.topics[2], 5)
+        before = list(LearnerSummary.objects.values_list("user_id", "total_stars", "completed_topics").order_by("user_id"))
+
+        rebuild_summaries()
+
+        after = list(LearnerSummary.objects.values_list("user_id", "total_stars", "completed_topics").order_by("user_id"))
+        self.assertEqual(before, after)
+
+
+class TTSBatcherTests(SimpleTestCase):
+    def render_all(self, batcher, texts):
+        results = [None] * len(texts)
+
+        def render(i, text):
+            try:
+                results[i] = batcher.render(text, "af_heart", 1.0, WAV)
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=render, args=(i, t)) for i, t in enumerate(texts)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_busy_pool_groups_requests_into_one_job(self):
+        calls = []
+
+        def runner(fn, texts, voice, speed, encoding):
+            calls.append(sorted(texts))
+            return [t.encode() for t in texts]
+
+        batcher = TTSBatcher(runner, window=5, max_batch=3)
+        results = self.render_all(batcher, ["a", "b", "a", "c"])
+
+        self.assertEqual(results, [b"a", b"b", b"a", b"c"])
+        self.assertEqual(calls, [["a", "b", "c"]])  # "a" rendered once
+        self.assertEqual(batcher._inflight, {})
+
+    def test_idle_pool_skips_the_window(self):
+        batcher = TTSBatcher(
+            lambda fn, texts, *args: [t.encode() for t in texts],
+            window=5, max_batch=8, idle=lambda: True,
+        )
+        started = time.monotonic()
+        self.assertEqual(batcher.render("a", "af_heart", 1.0, WAV), b"a")
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_errors_reach_every_request_in_the_group(self):
+        for error in (TTSTimeout("slow"), ValueError("boom")):
+            batcher = TTSBatcher(mock.Mock(side_effect=error), window=5, max_batch=2)
+            results = self.render_all(batcher, ["a", "b"])
+
+            self.assertEqual(results, [error, error])
+            self.assertEqual(batcher.runner.call_count, 1)
+            self.assertEqual(batcher._inflight, {})  # the next request renders again
+
+    def test_one_failing_text_fails_only_its_request(self):
+        def runner(fn, texts, voice, speed, encoding):
+            return [RuntimeError("Kokoro returned no audio") if t == "bad" else t.encode() for t in texts]
+
+        batcher = TTSBatcher(runner, window=5, max_batch=2)
+        results = self.render_all(batcher, ["good", "bad"])
+
+        self.assertEqual(results[0], b"good")
+        self.assertIsInstance(results[1], RuntimeError)
+        self.assertEqual(batcher._inflight, {})
+
+    def test_render_audio_batch_returns_errors_per_text(self):
+        def render(text, voice, speed, encoding):
+            if not text.strip("."):
+                raise RuntimeError("Kokoro returned no audio")
+            return text.encode()
+
+        with mock.patch.object(tts_kokoro, "render_audio_bytes", render), \
+                mock.patch.object(tts_kokoro, "get_pipeline"):
+            results = tts_kokoro.render_audio_batch(["Hi", "...", "Bye"], "af_heart", 1.0)
+
+        self.assertEqual(results[0], b"Hi")
+        self.assertIsInstance(results[1], RuntimeError)
+        self.assertEqual(results[2], b"Bye")
+
+    def test_long_texts_start_a_new_job(self):
+        calls = []
+
+        def runner(fn, texts, voice, speed, encoding):
+            calls.append(sorted(texts))
+            return [t.encode() for t in texts]
+
+        batcher = TTSBatcher(runner, window=0.5, max_batch=8, max_chars=10)
+        results = self.render_all(batcher, ["aaaaaa", "bbbbbb"])
+
+        self.assertEqual(results, [b"aaaaaa", b"bbbbbb"])
+        self.assertEqual(sorted(calls), [["aaaaaa"], ["bbbbbb"]])
+
+
+@override_settings(ASYNC_CATALOG_THREAD_SENSITIVE=False)
+class AsyncCatalogTests(TransactionTestCase):
+    # Committed data, so catalog reads can run on pool threads as in production.
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        Topic.objects.create(title="Apples", description="")
+        bump_catalog_version()
+
+    async def test_catalog_revalidation(self):
+        sensitive = await sync_to_async(threading.get_ident)()
+        threads = []
+        view = async_views.TopicViewSet.list
+
+        def list_topics(viewset, request, *args, **kwargs):
+            threads.append(threading.get_ident())
+            return view(viewset, request, *args, **kwargs)
+
+        with mock.patch.object(async_views.TopicViewSet, "list", list_topics):
+            first = await async_views.topic_list(self.factory.get("/api/topics/"))
+            again = await async_views.topic_list(
+                self.factory.get("/api/topics/", headers={"If-None-Match": first["ETag"]})
+            )
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(json.loads(first.content)["results"][0]["title"], "Apples")
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], sensitive)
+
+    async def test_non_object_json_is_rejected(self):
+        request = self.factory.post("/api/tts/kokoro/", ["Hi"], content_type="application/json")
+        response = await async_views.tts_kokoro(request)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("JSON object", json.loads(response.content)["error"])
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+
+    async def test_tts(self):
+        async def fake(text, voice, speed, encoding):
+            return b"RIFF" + text.encode(), "kokoro"
+
+        request = self.factory.post(
+            "/api/tts/kokoro/", {"text": "Hi", "format": "mp3"}, content_type="application/json"
+        )
+        with mock.patch.object(async_views, "asynthesize_with_failover", fake):
+            response = await async_views.tts_kokoro(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"RIFFHi")
+        self.assertEqual(response["Content-Type"], "audio/mpeg")
+
+    async def test_batcher_groups_and_dedupes(self):
+        calls = []
+
+        async def arunner(fn, texts, voice, speed, encoding):
+            calls.append(texts)
+            return [t.encode() for t in texts]
+
+        batcher = TTSBatcher(None, window=0.05, max_batch=8, arunner=arunner)
+        results = await asyncio.gather(
+            batcher.arender("a", "af_heart", 1.0, WAV),
+            batcher.arender("b", "af_heart", 1.0, WAV),
+            batcher.arender("a", "af_heart", 1.0, WAV),
+        )
+
+        self.assertEqual(results, [b"a", b"b", b"a"])
+        self.assertEqual(calls, [["a", "b"]])
+
+    async def test_full_batch_wakes_the_leader(self):
+        async def arunner(fn, texts, voice, speed, encoding):
+            return [t.encode() for t in texts]
+
+        batcher = TTSBatcher(None, window=5, max_batch=2, arunner=arunner)
+        results = await asyncio.wait_for(asyncio.gather(
+            batcher.arender("a", "af_heart", 1.0, WAV),
+            batcher.arender("b", "af_heart", 1.0, WAV),
+        ), timeout=1)
+
+        self.assertEqual(results, [b"a", b"b"])
+
+
+class MediaServingTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        os.makedirs(os.path.join(tmp.name, "videos"))
+        with open(os.path.join(tmp.name, "videos", "clip.mp4"), "wb") as f:
+            f.write(bytes(range(100)))
+
+        override = override_settings(MEDIA_ROOT=tmp.name, MEDIA_ACCEL="")
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def get(self, **headers):
+        return self.client.get("/media/videos/clip.mp4", **headers)
+
+    def test_full_file(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), bytes(range(100)))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Content-Type"], "video/mp4")
+        self.assertIn("immutable", response["Cache-Control"])
+
+    def test_ranges(self):
+        for header, expected, content_range in [
+            ("bytes=10-19", bytes(range(10, 20)), "bytes 10-19/100"),
+            ("bytes=95-", bytes(range(95, 100)), "bytes 95-99/100"),
+            ("bytes=-3", bytes(range(97, 100)), "bytes 97-99/100"),
+        ]:
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(b"".join(response.streaming_content), expected)
+            self.assertEqual(response["Content-Range"], content_range)
+            self.assertEqual(response["Content-Length"], str(len(expected)))
+
+        self.assertEqual(self.get(HTTP_RANGE="bytes=200-").status_code, 416)
+
+    def test_validators(self):
+        etag = self.get()["ETag"]
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get(HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE='"stale"').status_code, 200)
+        self.assertEqual(self.client.get("/media/../settings.py").status_code, 404)
+
+    def test_accel_redirect(self):
+        with self.settings(MEDIA_ACCEL="x-accel-redirect"):
+            response = self.get()
+
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/videos/clip.mp4")
+        self.assertEqual(response.content, b"")
+
+
+def _box(box_type, payload):
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def _mp4():
+    """ftyp + mdat + moov, with one stco entry pointing at b"FRAME"."""
+    ftyp = _box(b"ftyp", b"isom\0\0\0\0isom")
+    mdat = _box(b"mdat", b"xxFRAMExx")
+    mvhd = _box(b"mvhd", bytes(12) + struct.pack(">II", 1000, 2500) + bytes(80))
+    stco = _box(b"stco", bytes(4) + struct.pack(">II", 1, len(ftyp) + 10))
+    stbl = _box(b"stbl", stco)
+    moov = _box(b"moov", mvhd + _box(b"trak", _box(b"mdia", _box(b"minf", stbl))))
+    return ftyp + mdat + moov
+
+
+@override_settings(THUMBNAIL_WIDTHS=[160, 320, 1200], THUMBNAIL_FORMATS=["webp", "jpeg"])
+class UploadProcessingTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        override = override_settings(MEDIA_ROOT=tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def frame_at_stco(self, path):
+        data = open(path, "rb").read()
+        offset = struct.unpack(">I", data[data.index(b"stco") + 12:][:4])[0]
+        return data[offset:offset + 5]
+
+    def test_faststart(self):
+        src = os.path.join(self.root, "in.mp4")
+        dst = os.path.join(self.root, "out.mp4")
+        with open(src, "wb") as f:
+            f.write(_mp4())
+
+        self.assertTrue(mp4.faststart(src, dst))
+        data = open(dst, "rb").read()
+        self.assertLess(data.index(b"moov"), data.index(b"mdat"))
+        self.assertEqual(self.frame_at_stco(dst), b"FRAME")
+        self.assertEqual(mp4.duration_seconds(dst), 2.5)
+        self.assertFalse(mp4.faststart(dst, src))
+
+    def test_video_processing(self):
+        topic = Topic.objects.create(title="Apples", description="")
+        media = Media.objects.create(
+            topic=topic,
+            media_type="mp4",
+            uploaded_file=SimpleUploadedFile("clip.mp4", _mp4(), content_type="video/mp4"),
+        )
+        old_path = media.uploaded_file.path
+
+        self.assertTrue(process_video(media))
+
+        media.refresh_from_db()
+        self.assertEqual(media.duration, 2)
+        self.assertFalse(os.path.exists(old_path))
+        self.assertEqual(self.frame_at_stco(media.uploaded_file.path), b"FRAME")
+        self.assertFalse(process_video(media))
+
+    def test_unreadable_videos_are_not_retried(self):
+        topic = Topic.objects.create(title="Apples", description="")
+        not_mp4, media = [
+            Media.objects.create(
+                topic=topic,
+                media_type="mp4",
+                uploaded_file=SimpleUploadedFile(name, content, content_type="video/mp4"),
+            )
+            for name, content in (
+                ("notes.mp4", b"not a video"),
+                ("clip.mp4", _mp4().replace(b"mvhd", b"free")),
+            )
+        ]
+
+        with self.assertLogs("lessons.uploads", "WARNING"):
+            self.assertFalse(process_video(not_mp4))
+        process_video(media)
+
+        for video in (not_mp4, media):
+            video.refresh_from_db()
+            self.assertIsNone(video.duration)
+            self.assertFalse(video_needs_processing(video))
+
+        out = io.StringIO()
+        call_command("process_uploads", stdout=out, stderr=io.StringIO())
+        self.assertIn("0 processed, 2 up to date, 0 failed", out.getvalue())
+
+        media.uploaded_file = SimpleUploadedFile("clip.mp4", _mp4(), content_type="video/mp4")
+        media.save()  # a new upload is processed again
+        media.refresh_from_db()
+        self.assertTrue(process_video(media))
+        self.assertEqual(media.duration, 2)
+
+    def test_replaced_upload_is_not_overwritten(self):
+        topic = Topic.objects.create(title="Apples", description="")
+        media = Media.objects.create(
+            topic=topic,
+            media_type="mp4",
+            uploaded_file=SimpleUploadedFile("clip.mp4", _mp4(), content_type="video/mp4"),
+        )
+        stale = Media.objects.get(pk=media.pk)
+        media.uploaded_file = SimpleUploadedFile("new.mp4", _mp4(), content_type="video/mp4")
+        media.save()
+
+        self.assertFalse(process_video(stale))
+
+        media.refresh_from_db()
+        self.assertTrue(media.uploaded_file.name.startswith("videos/new"))
+        self.assertEqual(media.processed_file, "")
+        # Only the two uploads are left; the rewritten copy was deleted.
+        self.assertEqual(len(os.listdir(os.path.dirname(media.uploaded_file.path))), 2)
+
+    def test_replaced_thumbnail_keeps_its_variants(self):
+        from PIL import Image
+
+        def png():
+            buffer = io.BytesIO()
+            Image.new("RGB", (400, 200)).save(buffer, "PNG")
+            return SimpleUploadedFile("apple.png", buffer.getvalue(), content_type="image/png")
+
+        topic = Topic.objects.create(title="Apples", description="", thumbnail=png())
+        stale = Topic.objects.get(pk=topic.pk)
+        topic.thumbnail = png()
+        topic.save()
+
+        self.assertFalse(process_thumbnail(stale))
+
+        topic.refresh_from_db()
+        self.assertTrue(thumbnail_is_stale(topic))
+        # Only the two uploads are left; the stale variants were deleted.
+        self.assertEqual(len(os.listdir(os.path.dirname(topic.thumbnail.path))), 2)
+
+    def test_thumbnails(self):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new("RGBA", (800, 400), (255, 0, 0, 128)).save(buffer, "PNG")
+        topic = Topic.objects.create(
+            title="Apples",
+            description="",
+            thumbnail=SimpleUploadedFile("apple.png", buffer.getvalue(), content_type="image/png"),
+        )
+
+        self.assertTrue(process_thumbnail(topic))
+
+        self.assertEqual(set(topic.thumbnail_variants["webp"]), {"160", "320"})
+        with Image.open(os.path.join(self.root, topic.thumbnail_variants["jpeg"]["320"])) as image:
+            self.assertEqual((image.format, image.size), ("JPEG", (320, 160)))
+
+        row = self.client.get(f"/api/topics/{topic.pk}/").json()
+        self.assertTrue(row["thumbnails"]["webp"]["160"].endswith(".webp"))
+        self.assertNotIn("thumbnail_variants", row)
+
+
+class BenchmarkTests(SimpleTestCase):
+    def test_fake_pipeline_is_deterministic(self):
+        pipeline = FakePipeline()
+        first = next(pipeline("Hello there", voice="af_heart"))[2]
+        again = next(pipeline("Hello there", voice="af_heart"))[2]
+        other = next(pipeline("Hello there", voice="bm_george"))[2]
+
+        self.assertTrue((first == again).all())
+        self.assertFalse((first == other).all())
+        self.assertEqual(len(first), int(11 * 0.06 * 24000))
+
+    def test_tts_section_runs_offline(self):
+        out = io.StringIO()
+        call_command(
+            "benchmark", "--only", "tts", "--tts-engine", "fake",
+            "--voices", "af_heart", "--tts-reps", "1", "--json", stdout=out,
+        )
+        results = json.loads(out.getvalue())
+
+        self.assertEqual(set(results["tts"]), {"af_heart:short", "af_heart:medium", "af_heart:long"})
+        self.assertGreater(results["tts"]["af_heart:long"]["audio_s"], results["tts"]["af_heart:short"]["audio_s"])
+        self.assertEqual(set(results["tts_memory"]), {"fake"})
+        self.assertGreater(results["tts_memory"]["fake"]["peak_rss_mb"], 0)
+
+    def test_tts_cold_runs_redo_g2p(self):
+        from lessons.tts_cache import PHONEME_CACHE
+
+        misses = PHONEME_CACHE.misses
+        out = io.StringIO()
+        call_command(
+            "benchmark", "--only", "tts", "--tts-engine", "fake",
+            "--voices", "af_heart", "--tts-reps", "2", "--json", stdout=out,
+        )
+        row = json.loads(out.getvalue())["tts"]["af_heart:short"]
+
+        self.assertIn("warm_g2p_p50_ms", row)
+        # One G2P miss per text per repetition, none on the warm runs.
+        self.assertEqual(PHONEME_CACHE.misses - misses, 3 * 2)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        REQUESTS.reset()
+        SPANS.reset()
+        self.addCleanup(REQUESTS.reset)
+        self.addCleanup(SPANS.reset)
+        Topic.objects.create(title="Apples", description="")
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        self.assertNotIn("Server-Timing", self.client.get("/api/topics/"))
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    @override_settings(METRICS_ENABLED=True)
+    def test_server_timing_and_exposition(self):
+        response = self.client.get("/api/topics/")
+
+        timing = response["Server-Timing"]
+        for name in ("db;", "serialize;", "auth;", "total;"):
+            self.assertIn(name, timing)
+
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn('span_duration_seconds_count{span="serialize"} 1', body)
+        # The async route (ASYNC_VIEWS) is a path(), the DRF router's a regex.
+        self.assertRegex(body, r'method="GET",route="api/topics/\$?",status="200",le="\+Inf"\} 1')
+        self.assertIn("tts_audio_cache_hits_total", body)
+
+
+class UserCacheTests(TestCase):
+    def setUp(self):
+        USER_CACHE.clear()
+        self.addCleanup(USER_CACHE.clear)
+        patcher = mock.patch.multiple(USER_CACHE, ttl=60, max_entries=100)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user("learner", password="pw")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def get_progress(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/gamification/")
+        return response, len(queries)
+
+    def test_second_request_skips_user_lookup(self):
+        first, cold = self.get_progress()
+        second, warm = self.get_progress()
+
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(warm, cold - 1)
+
+    def test_deactivation_invalidates(self):
+        self.get_progress()
+        self.user.is_active = False
+        self.user.save()
+
+        response, _ = self.get_progress()
+        self.assertEqual(response.status_code, 401)
+
+    def test_bounded_and_expiring(self):
+        cache = UserCache(max_entries=2, ttl=60)
+        for jti in ("a", "b", "c"):
+            cache.put(1, jti, self.user)
+        self.assertIsNone(cache.get(1, "a"))
+        self.assertEqual(cache.get(1, "c").pk, self.user.pk)
+
+        cache.put(2, "d", self.user, token_exp=0)  # token already expired
+        self.assertIsNone(cache.get(2, "d"))
+
+        cache.invalidate(1)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+
+@override_settings(TTS_ENGINE="fake")
+class VoicePackTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "voices.kvpack")
+
+    def test_round_trip_is_memory_mapped(self):
+        voices = {
+            "af_heart": np.arange(12, dtype=np.float32).reshape(3, 1, 4),
+            "bm_lewis": np.ones((5, 1, 4), dtype=np.float32),
+        }
+        write_voice_pack(self.path, voices)
+
+        pack = VoicePack(self.path)
+        self.assertEqual(pack.names(), ["af_heart", "bm_lewis"])
+        for name, array in voices.items():
+            np.testing.assert_array_equal(pack.get(name), array)
+            self.assertIsInstance(pack.get(name).base, np.memmap)
+
+    def test_command_packs_voices_for_the_pipeline(self):
+        with mock.patch.dict("lessons.tts_kokoro._PIPELINES", clear=True):
+            call_command("pack_voices", "--voices", "af_heart", "bf_emma", "--output", self.path, stdout=io.StringIO())
+
+        pipeline = FakePipeline("b")
+        self.assertEqual(VoicePack(self.path).attach(pipeline, "b"), 1)
+        self.assertEqual(list(pipeline.voices), ["bf_emma"])
+        np.testing.assert_array_equal(pipeline.load_voice("bf_emma"), FakePipeline("b").load_voice("bf_emma"))
+
+    def test_unreadable_pack_is_ignored(self):
+        with open(self.path, "wb") as f:
+            f.write(b"not a voice pack")
+
+        with self.assertLogs("lessons.voice_pack", "WARNING"):
+            self.assertEqual(VoicePack(self.path).attach(FakePipeline(), "a"), 0)
+
+
+@override_settings(TTS_ENGINE="fake")
+class PhonemeCacheTests(SimpleTestCase):
+    def setUp(self):
+        for cache in (PHONEME_CACHE, SEGMENT_CACHE):
+            cache.clear()
+            self.addCleanup(cache.clear)
+        patcher = mock.patch.multiple(PHONEME_CACHE, max_entries=100, root=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_voice_and_speed_changes_skip_g2p(self):
+        text = "The cat sat.\nThe dog ran."
+        with mock.patch.dict("lessons.tts_kokoro._PIPELINES", clear=True), \
+                mock.patch.object(FakePipeline, "g2p", autospec=True, side_effect=FakePipeline.g2p) as g2p:
+            render_audio_bytes(text, "af_heart", 1.0)
+            render_audio_bytes(text, "af_bella", 1.0)
+            render_audio_bytes(text, "af_heart", 1.2)
+
+        self.assertEqual(g2p.call_count, 2)  # one per line
+
+    def test_persists_to_disk(self):
+        with tempfile.TemporaryDirectory() as root:
+            key = PhonemeCache.key("Héllo  world", "a")
+            PhonemeCache(10, root).put(key, ["həlˈO", "wˈɜɹld"])
+
+            fresh = PhonemeCache(10, root)
+            self.assertEqual(fresh.get(key), ("həlˈO", "wˈɜɹld"))
+            self.assertEqual(fresh.get(PhonemeCache.key("Héllo world", "b")), None)
+
+
+class _StubSession:
+    def __init__(self):
+        self.feeds = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name=name) for name in ("input_ids", "style", "speed")]
+
+    def run(self, outputs, feeds):
+        self.feeds.append(feeds)
+        return [np.zeros((1, 100 * feeds["input_ids"].shape[1]), dtype=np.float32)]
+
+
+class OnnxPipelineTests(SimpleTestCase):
+    def setUp(self):
+        self.session = _StubSession()
+        self.pipeline = OnnxPipeline("a", self.session, {"h": 1, "ɛ": 2, " ": 3}, g2p=None)
+
+    def test_infer_feeds_ids_style_and_speed(self):
+        pack = np.arange(510 * 256, dtype=np.float32).reshape(510, 1, 256)
+        audio = self.pipeline.infer(None, "hɛ?", pack, 1.5).audio
+
+        feeds = self.session.feeds[0]
+        self.assertEqual(feeds["input_ids"].tolist(), [[0, 1, 2, 0]])  # unknown "?" dropped
+        np.testing.assert_array_equal(feeds["style"], pack[2].reshape(1, 256))
+        self.assertEqual(feeds["speed"].tolist(), [1.5])
+        self.assertEqual(audio.shape, (400,))
+
+    def test_en_tokenize_respects_model_limit(self):
+        word = SimpleNamespace(text="hello", phonemes="h" * 100, whitespace=" ")
+        chunks = list(self.pipeline.en_tokenize([word] * 12))
+
+        self.assertEqual(len(chunks), 3)
+        self.assertTrue(all(len(ps) <= MAX_PHONEMES for _, ps, _ in chunks))
+        self.assertEqual(sum(ps.count("h") for _, ps, _ in chunks), 1200)
+
+    def test_missing_espeak_is_logged(self):
+        espeak = SimpleNamespace(EspeakFallback=mock.Mock(side_effect=RuntimeError("no espeak-ng")))
+        en = SimpleNamespace(G2P=mock.Mock())
+        misaki = SimpleNamespace(en=en, espeak=espeak)
+
+        with mock.patch.dict(sys.modules, {"misaki": misaki}):
+            with self.assertLogs("lessons.tts_onnx", "WARNING") as logs:
+                english_g2p("b")
+
+        self.assertIn("no espeak-ng", logs.output[0])
+        self.assertIsNone(en.G2P.call_args.kwargs["fallback"])
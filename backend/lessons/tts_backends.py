@@ -0,0 +1,150 @@
+# lessons/tts_backends.py
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+
+from .tts_batch import TTS_BATCHER
+from .tts_kokoro import WAV, AudioEncoding, asynthesize_audio_bytes, synthesize_audio_bytes
+from .tts_pool import TTSQueueFull, TTSTimeout
+from .voicerss_tts import AsyncVoiceRSSClient, VoiceRSSClient
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean "Kokoro is overloaded", as opposed to a bad request.
+FAILOVER_ERRORS = (TTSQueueFull, TTSTimeout)
+
+
+class TTSBackend(ABC):
+    name = ""
+
+    def available(self) -> bool:
+        return True
+
+    def supports(self, encoding: AudioEncoding) -> bool:
+        return True
+
+    @abstractmethod
+    def synthesize(self, text: str, voice: str, speed: float, encoding: AudioEncoding = WAV) -> bytes:
+        ...
+
+    async def asynthesize(self, text: str, voice: str, speed: float, encoding: AudioEncoding = WAV) -> bytes:
+        return await asyncio.to_thread(self.synthesize, text, voice, speed, encoding)
+
+
+class KokoroBackend(TTSBackend):
+    name = "kokoro"
+
+    def synthesize(self, text, voice, speed, encoding=WAV):
+        return synthesize_audio_bytes(text, voice, speed, encoding, render=TTS_BATCHER.render)
+
+    async def asynthesize(self, text, voice, speed, encoding=WAV):
+        return await asynthesize_audio_bytes(text, voice, speed, encoding, render=TTS_BATCHER.arender)
+
+
+class VoiceRSSBackend(TTSBackend):
+    """
+    Maps Kokoro voice ids onto the closest Voice RSS voice by accent and
+    gender, and speed onto its -10..10 rate scale.
+    """
+
+    name = "voicerss"
+
+    VOICES = {
+        "af": ("en-us", "Linda"),
+        "am": ("en-us", "John"),
+        "bf": ("en-gb", "Alice"),
+        "bm": ("en-gb", "Harry"),
+    }
+    CODECS = {"wav": "WAV", "mp3": "MP3", "ogg": "OGG"}
+
+    def __init__(self, client: VoiceRSSClient):
+        self.client = client
+        self.aclient = AsyncVoiceRSSClient(client)
+
+    def available(self):
+        return bool(self.client.key)
+
+    def supports(self, encoding):
+        return encoding.fmt in self.CODECS
+
+    def _params(self, voice, speed, encoding):
+        hl, v = self.VOICES.get(voice[:2], self.VOICES["af"])
+        rate = max(-10, min(10, round((float(speed) - 1.0) * 10)))
+        khz = encoding.sample_rate // 1000
+        return {
+            "hl": hl,
+            "v": v,
+            "r": rate,
+            "c": self.CODECS[encoding.fmt],
+            "f": f"{khz}khz_16bit_mono",
+        }
+
+    def synthesize(self, text, voice, speed, encoding=WAV):
+        return self.client.speech(text, **self._params(voice, speed, encoding))
+
+    async def asynthesize(self, text, voice, speed, encoding=WAV):
+        return await self.aclient.speech(text, **self._params(voice, speed, encoding))
+
+
+_BACKENDS = {}
+
+
+def get_backend(name: str):
+    if name not in _BACKENDS:
+        if name == "kokoro":
+            _BACKENDS[name] = KokoroBackend()
+        elif name == "voicerss":
+            _BACKENDS[name] = VoiceRSSBackend(VoiceRSSClient(
+                key=settings.VOICE_RSS_API_KEY,
+                base_url=settings.VOICE_RSS_URL,
+                timeout=settings.VOICE_RSS_TIMEOUT,
+                retries=settings.VOICE_RSS_RETRIES,
+            ))
+        else:
+            raise ValueError(f"Unknown TTS backend: {name}")
+    return _BACKENDS[name]
+
+
+def synthesize_with_failover(text, voice, speed, encoding=WAV):
+    """
+    Synthesize with Kokoro, switching to TTS_FALLBACK_BACKEND when the
+    Kokoro pool is saturated. Returns (audio bytes, backend name). If the
+    fallback can't serve the request, the original overload error is
+    raised so the caller still answers 503/504.
+    """
+    primary = get_backend("kokoro")
+    try:
+        return primary.synthesize(text, voice, speed, encoding), primary.name
+    except FAILOVER_ERRORS as overload:
+        if not settings.TTS_FALLBACK_BACKEND:
+            raise
+        fallback = get_backend(settings.TTS_FALLBACK_BACKEND)
+        if not fallback.available() or not fallback.supports(encoding):
+            raise
+
+        try:
+            return fallback.synthesize(text, voice, speed, encoding), fallback.name
+        except Exception:
+            logger.exception("Fallback TTS backend %s failed", fallback.name)
+            raise overload
+
+
+async def asynthesize_with_failover(text, voice, speed, encoding=WAV):
+    """synthesize_with_failover() for async views."""
+    primary = get_backend("kokoro")
+    try:
+        return await primary.asynthesize(text, voice, speed, encoding), primary.name
+    except FAILOVER_ERRORS as overload:
+        if not settings.TTS_FALLBACK_BACKEND:
+            raise
+        fallback = get_backend(settings.TTS_FALLBACK_BACKEND)
+        if not fallback.available() or not fallback.supports(encoding):
+            raise
+
+        try:
+            return await fallback.asynthesize(text, voice, speed, encoding), fallback.name
+        except Exception:
+            logger.exception("Fallback TTS backend %s failed", fallback.name)
+            raise overload
@@ -0,0 +1,206 @@
+# lessons/tts_batch.py
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from .tts_cache import cache_key
+from .tts_kokoro import WAV, AudioEncoding, render_audio_batch
+from .tts_pool import TTS_POOL
+
+
+class _Batch:
+    def __init__(self):
+        self.items = []
+        self.chars = 0
+        self.full = threading.Event()
+        self._callbacks = []
+
+    def close(self) -> None:
+        # Called with the batcher lock held.
+        self.full.set()
+        for callback in self._callbacks:
+            callback()
+
+    def on_full(self, callback) -> None:
+        # Called with the batcher lock held.
+        if self.full.is_set():
+            callback()
+        else:
+            self._callbacks.append(callback)
+
+
+class TTSBatcher:
+    """
+    Sits between synthesize_audio_bytes and the worker pool.
+
+    Identical requests that are already in flight wait on the same
+    future instead of rendering again (single-flight). Different texts
+    with the same voice, speed and encoding that arrive within
+    ``window`` seconds of each other are sent to the pool as one job, up
+    to ``max_batch`` texts and ``max_chars`` characters so a group
+    renders well within the pool's timeout.
+
+    The first request of a group is its leader: it waits out the window
+    (or until the group reaches ``max_batch``), submits the job and
+    hands each request its own result or error. Kokoro has no batched forward
+    pass, so a group is rendered back to back in one worker; what it
+    saves is pool slots. Waiting only pays off when the pool is busy,
+    so a leader that finds ``idle()`` true submits straight away.
+
+    arender() is the same for async callers. ``arunner`` is awaited in
+    place of ``runner``, and an async leader hands its batch to a
+    separate task so a client disconnecting doesn't cancel the job for
+    the others.
+    """
+
+    def __init__(self, runner, window: float, max_batch: int, arunner=None, idle=None, max_chars=0):
+        self.runner = runner
+        self.arunner = arunner
+        self.idle = idle or (lambda: False)
+        self.window = window
+        self.max_batch = max(max_batch, 1)
+        self.max_chars = max_chars  # 0 = no limit
+        self._inflight = {}
+        self._open = {}
+        self._lock = threading.Lock()
+        self._tasks = set()
+
+    def render(
+        self,
+        text: str,
+        voice: str,
+        speed: float,
+        encoding: AudioEncoding = WAV,
+    ) -> bytes:
+        future, batch, group = self._enter(text, voice, speed, encoding)
+
+        if batch is not None:
+            if not self.idle():
+                batch.full.wait(self.window)
+            self._close(group, batch)
+            self._run(batch.items, voice, speed, encoding)
+
+        return future.result()
+
+    async def arender(
+        self,
+        text: str,
+        voice: str,
+        speed: float,
+        encoding: AudioEncoding = WAV,
+    ) -> bytes:
+        future, batch, group = self._enter(text, voice, speed, encoding)
+
+        if batch is not None:
+            task = asyncio.ensure_future(self._alead(batch, group, voice, speed, encoding))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        # shield: cancelling this request must not cancel the shared future.
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def _enter(self, text, voice, speed, encoding):
+        # Returns (future, batch if we lead it else None, group).
+        key = cache_key(text, voice, speed, encoding.tag)
+        group = (voice, round(float(speed), 2), encoding)
+
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, None, group
+            future = Future()
+            self._inflight[key] = future
+            batch, leader = self._join(group, key, text, future)
+
+        return future, batch if leader else None, group
+
+    def _close(self, group, batch):
+        with self._lock:
+            if self._open.get(group) is batch:
+                del self._open[group]
+
+    def _join(self, group, key, text, future):
+        # Called with the lock held.
+        batch = self._open.get(group)
+        if batch is not None and self.max_chars and batch.chars + len(text) > self.max_chars:
+            # Too long to join: send the open group now and start another.
+            del self._open[group]
+            batch.close()
+            batch = None
+
+        leader = batch is None
+        if leader:
+            batch = self._open[group] = _Batch()
+        batch.items.append((key, text, future))
+        batch.chars += len(text)
+
+        if len(batch.items) >= self.max_batch:
+            del self._open[group]
+            batch.close()
+
+        return batch, leader
+
+    def _run(self, items, voice, speed, encoding):
+        texts = [text for _, text, _ in items]
+        try:
+            results = self.runner(render_audio_batch, texts, voice, speed, encoding)
+        except BaseException as e:
+            self._settle(items, error=e)
+        else:
+            self._settle(items, results)
+
+    async def _alead(self, batch, group, voice, speed, encoding):
+        if not self.idle():
+            # Woken by whichever thread or task fills the batch.
+            loop = asyncio.get_running_loop()
+            full = loop.create_future()
+            with self._lock:
+                batch.on_full(lambda: loop.call_soon_threadsafe(_resolve, full))
+            await asyncio.wait({full}, timeout=self.window)
+        self._close(group, batch)
+
+        texts = [text for _, text, _ in batch.items]
+        try:
+            if self.arunner is not None:
+                results = await self.arunner(render_audio_batch, texts, voice, speed, encoding)
+            else:
+                results = await asyncio.to_thread(
+                    self.runner, render_audio_batch, texts, voice, speed, encoding
+                )
+        except BaseException as e:
+            self._settle(batch.items, error=e)
+        else:
+            self._settle(batch.items, results)
+
+    def _settle(self, items, results=(), error=None):
+        try:
+            if error is not None:
+                for _, _, future in items:
+                    future.set_exception(error)
+            else:
+                for (_, _, future), result in zip(items, results):
+                    if isinstance(result, BaseException):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+        finally:
+            with self._lock:
+                for key, _, _ in items:
+                    self._inflight.pop(key, None)
+
+
+def _resolve(future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+TTS_BATCHER = TTSBatcher(
+    TTS_POOL.run,
+    window=settings.TTS_BATCH_WINDOW_MS / 1000,
+    max_batch=settings.TTS_BATCH_MAX,
+    max_chars=settings.TTS_BATCH_MAX_CHARS,
+    arunner=TTS_POOL.arun,
+    idle=TTS_POOL.idle,
+)
@@ -0,0 +1,387 @@
+# lessons/tts_cache.py
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from importlib import metadata
+from pathlib import Path
+
+from django.conf import settings
+
+
+def model_version() -> str:
+    override = getattr(settings, "TTS_MODEL_VERSION", None)
+    if override:
+        return override
+    engine = getattr(settings, "TTS_ENGINE", "kokoro")
+    if engine == "fake":
+        return "fake"
+    if engine == "onnx":
+        # int8 output differs from fp32, so they can't share cache entries.
+        return f"kokoro-onnx-{settings.TTS_ONNX_PRECISION}"
+    try:
+        return f"kokoro-{metadata.version('kokoro')}"
+    except metadata.PackageNotFoundError:
+        return "kokoro-unknown"
+
+
+def normalize_text(text: str) -> str:
+    """
+    Collapse whitespace the pipeline ignores anyway, so "Hello  world"
+    and "Hello world" share one cache entry. Line breaks are kept
+    because the pipeline splits segments on them.
+    """
+    text = unicodedata.normalize("NFC", text)
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def cache_key(text: str, voice: str, speed: float, fmt: str = "wav") -> str:
+    raw = "\x1f".join([
+        model_version(),
+        voice,
+        f"{float(speed):.2f}",
+        fmt,
+        normalize_text(text),
+    ])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+class AudioCache:
+    """
+    Content-addressed audio store on disk.
+
+    Files live at <root>/<key[:2]>/<key>.<ext>. Recency is tracked through
+    the file mtime (bumped on every hit), and the oldest files are removed
+    once the total size goes over ``max_bytes``.
+    """
+
+    def __init__(self, root, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def path_for(self, key: str, ext: str = "wav") -> Path:
+        return self.root / key[:2] / f"{key}.{ext}"
+
+    def get(self, key: str, ext: str = "wav"):
+        if not self.enabled:
+            return None
+
+        path = self.path_for(key, ext)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes, ext: str = "wav") -> None:
+        if not self.enabled or len(data) > self.max_bytes:
+            return
+
+        path = self.path_for(key, ext)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        replaced = _file_size(path)
+
+        # Write next to the target and rename, so readers never see
+        # a half-written file.
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+
+        self._account(len(data) - replaced)
+
+    def begin(self, key: str, ext: str = "wav"):
+        """
+        Start an incremental write for audio that is produced piece by
+        piece (e.g. while streaming). Nothing is visible under ``key``
+        until ``commit()`` is called.
+        """
+        if not self.enabled:
+            return None
+        path = self.path_for(key, ext)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return PendingEntry(self, path)
+
+    def _account(self, nbytes: int) -> None:
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += nbytes
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes": self._size if self._size is not None else self._scan_size(),
+                "max_bytes": self.max_bytes,
+            }
+
+    def _entries(self):
+        if not self.root.exists():
+            return []
+        entries = []
+        for path in self.root.glob("*/*"):
+            if path.suffix == ".tmp":
+                continue
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self) -> None:
+        # Trim to 90% of the budget so we don't rescan on every write.
+        target = int(self.max_bytes * 0.9)
+        entries = sorted(self._entries(), key=lambda e: e[0])
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+
+        self._size = total
+
+
+class PendingEntry:
+    def __init__(self, cache: AudioCache, path: Path):
+        self.cache = cache
+        self.path = path
+        fd, self.tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        self.file = os.fdopen(fd, "w+b")
+
+    def write(self, data: bytes) -> None:
+        self.file.write(data)
+
+    def commit(self) -> None:
+        self.file.seek(0, os.SEEK_END)
+        size = self.file.tell()
+        self.file.close()
+        if size > self.cache.max_bytes:
+            self.discard()
+            return
+        replaced = _file_size(self.path)
+        os.replace(self.tmp, self.path)
+        self.cache._account(size - replaced)
+
+    def discard(self) -> None:
+        if not self.file.closed:
+            self.file.close()
+        try:
+            os.unlink(self.tmp)
+        except FileNotFoundError:
+            pass
+
+
+class SegmentCache:
+    """
+    In-memory LRU of raw audio arrays for individual pipeline segments
+    (one line of a lesson), bounded by total array size. Lets a story
+    with one edited line reuse the audio for every other line.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(segment: str, voice: str, speed: float):
+        return (voice, f"{float(speed):.2f}", " ".join(segment.split()))
+
+    def get(self, key):
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return audio
+
+    def put(self, key, audio) -> None:
+        if audio.nbytes > self.max_bytes:
+            return
+        audio.setflags(write=False)  # shared between requests
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old.nbytes
+            self._entries[key] = audio
+            self._size += audio.nbytes
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class PhonemeCache:
+    """
+    LRU of G2P output (the phoneme chunks for one segment) keyed on
+    language and normalized text, so rendering the same line with
+    another voice or speed skips text processing.
+
+    With ``root`` set, entries are also written to
+    <root>/<hash[:2]>/<hash>.json and read back on a memory miss, so
+    TTS workers and restarts share them. Those files are a few hundred
+    bytes each and are never evicted.
+    """
+
+    def __init__(self, max_entries: int, root=None):
+        self.max_entries = max_entries
+        self.root = Path(root) if root else None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(segment: str, lang_code: str):
+        return (lang_code, " ".join(unicodedata.normalize("NFC", segment).split()))
+
+    def _path(self, key) -> Path:
+        raw = "\x1f".join([model_version(), *key])
+        digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+        return self.root / digest[:2] / f"{digest}.json"
+
+    def get(self, key):
+        with self._lock:
+            phonemes = self._entries.get(key)
+            if phonemes is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return phonemes
+
+        phonemes = self._read(key)
+        with self._lock:
+            if phonemes is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._remember(key, phonemes)
+        return phonemes
+
+    def put(self, key, phonemes) -> None:
+        phonemes = tuple(phonemes)
+        self._remember(key, phonemes)
+        if self.root is not None:
+            self._write(key, phonemes)
+
+    def _remember(self, key, phonemes) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = phonemes
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _read(self, key):
+        if self.root is None:
+            return None
+        try:
+            return tuple(json.loads(self._path(key).read_text("utf-8")))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, key, phonemes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(list(phonemes), f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+AUDIO_CACHE = AudioCache(
+    getattr(settings, "TTS_CACHE_DIR", Path(settings.BASE_DIR) / "tts_cache"),
+    getattr(settings, "TTS_CACHE_MAX_BYTES", 0),
+)
+
+SEGMENT_CACHE = SegmentCache(getattr(settings, "TTS_SEGMENT_CACHE_MAX_BYTES", 0))
+
+PHONEME_CACHE = PhonemeCache(
+    getattr(settings, "TTS_PHONEME_CACHE_SIZE", 0),
+    getattr(settings, "TTS_PHONEME_CACHE_DIR", None),
+)
@@ -0,0 +1,65 @@
+# lessons/tts_fake.py
+import hashlib
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from .tts_kokoro import SAMPLE_RATE
+
+
+class FakePipeline:
+    """
+    Offline stand-in for kokoro.KPipeline (TTS_ENGINE=fake).
+
+    Audio is a tone whose pitch is derived from the voice and text, about
+    ``seconds_per_char`` long per character at speed 1.0, so output is
+    deterministic and scales with input like the real model. ``rtf``
+    adds a matching sleep to imitate inference cost (0.1 = ten times
+    faster than real time).
+
+    G2P and inference are split the same way as in KPipeline (g2p,
+    en_tokenize, infer); the "phonemes" are just the lowercased text.
+    """
+
+    model = None
+
+    def __init__(self, lang_code="a", seconds_per_char=0.06, rtf=0.0):
+        self.lang_code = lang_code
+        self.seconds_per_char = seconds_per_char
+        self.rtf = rtf
+        self.voices = {}
+
+    def load_voice(self, voice):
+        pack = self.voices.get(voice)
+        if pack is None:
+            # Random, but shaped like a Kokoro voice pack.
+            seed = int.from_bytes(hashlib.sha256(voice.encode("utf-8")).digest()[:8], "little")
+            pack = np.random.default_rng(seed).standard_normal((510, 1, 256), dtype=np.float32)
+            self.voices[voice] = pack
+        return pack
+
+    def g2p(self, text):
+        return text, [text.strip().lower()]
+
+    def en_tokenize(self, tokens):
+        for ps in tokens:
+            yield ps, ps, None
+
+    def infer(self, model, ps, pack, speed=1.0):
+        seconds = max(len(ps), 1) * self.seconds_per_char / float(speed or 1.0)
+        seed = hashlib.sha256(np.asarray(pack[:1]).tobytes() + ps.encode("utf-8")).digest()
+        pitch = 120 + seed[0] % 200
+
+        t = np.arange(int(seconds * SAMPLE_RATE), dtype=np.float32) / SAMPLE_RATE
+        audio = (0.2 * np.sin(2 * np.pi * pitch * t)).astype(np.float32)
+
+        if self.rtf:
+            time.sleep(seconds * self.rtf)
+        return SimpleNamespace(audio=audio)
+
+    def __call__(self, text, voice="af_heart", speed=1.0, split_pattern=None):
+        pack = self.load_voice(voice)
+        _, tokens = self.g2p(text)
+        for gs, ps, _ in self.en_tokenize(tokens):
+            yield gs, ps, self.infer(self.model, ps, pack, speed).audio
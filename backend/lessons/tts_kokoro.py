@@ -1,10 +1,26 @@
 # lessons/tts_kokoro.py
+import asyncio
 import io
+import re
+import struct
+import threading
+from typing import NamedTuple, Optional
+
 import numpy as np
 import soundfile as sf
-from kokoro import KPipeline
+from django.conf import settings
+
+from .metrics import span
+from .tts_cache import AUDIO_CACHE, PHONEME_CACHE, SEGMENT_CACHE, cache_key
+from .voice_pack import VOICE_PACK
+
+SAMPLE_RATE = 24000
 
-PIPELINE = KPipeline(lang_code="a")  # American English
+# Pipelines are built on first use, one per language. Importing kokoro
+# pulls in torch and the model weights, so nothing here should touch it
+# at import time (migrate, shell and tests never need it).
+_PIPELINES = {}
+_PIPELINE_LOCK = threading.Lock()
 
 # ✅ ONLY REAL VOICES (must exist on HF)
 VALID_VOICES = {
@@ -45,34 +61,435 @@ VALID_VOICES = {
     "bm_lewis",
 }
 
+def lang_for_voice(voice: str) -> str:
+    # "af_heart" -> "a" (American English), "bf_emma" -> "b" (British)
+    return voice[0]
+
+
+def _kokoro_pipeline(lang_code: str):
+    import torch
+    from kokoro import KPipeline
+
+    # All languages share one set of model weights.
+    loaded = next(iter(_PIPELINES.values()), None)
+    if loaded is not None and loaded.model is not None:
+        pipeline = KPipeline(lang_code=lang_code, model=loaded.model)
+    else:
+        pipeline = KPipeline(lang_code=lang_code)
+    return pipeline, torch.from_numpy
+
+
+def _onnx_pipeline(lang_code: str):
+    from .tts_onnx import OnnxPipeline
+
+    return OnnxPipeline.from_settings(lang_code), None
+
+
+def _fake_pipeline(lang_code: str):
+    from .tts_fake import FakePipeline
+
+    return FakePipeline(lang_code, rtf=settings.TTS_FAKE_RTF), None
+
+
+# TTS_ENGINE -> factory returning (pipeline, converter for voice pack
+# arrays). Besides KPipeline's ``voices`` dict and ``model``, a pipeline
+# needs load_voice(voice), g2p(text) -> (_, tokens), en_tokenize(tokens)
+# yielding (graphemes, phonemes, _), and infer(model, phonemes, pack,
+# speed) returning something with ``.audio``.
+ENGINES = {
+    "kokoro": _kokoro_pipeline,
+    "onnx": _onnx_pipeline,
+    "fake": _fake_pipeline,
+}
+
+
+def get_pipeline(lang_code: str = "a"):
+    pipeline = _PIPELINES.get(lang_code)
+    if pipeline is not None:
+        return pipeline
+
+    with _PIPELINE_LOCK:
+        pipeline = _PIPELINES.get(lang_code)
+        if pipeline is None:
+            pipeline, convert = ENGINES[settings.TTS_ENGINE](lang_code)
+            # Voices from the local pack (manage.py pack_voices) never hit the network.
+            VOICE_PACK.attach(pipeline, lang_code, convert)
+            _PIPELINES[lang_code] = pipeline
+    return pipeline
+
+
+def warm(lang_codes=("a",), voices=()):
+    """
+    Load pipelines (and optionally voice packs) ahead of the first
+    request. Used by ``manage.py warm_tts`` and the TTS_PRELOAD hook.
+    """
+    for lang_code in lang_codes:
+        get_pipeline(lang_code)
+    for voice in voices:
+        get_pipeline(lang_for_voice(voice)).load_voice(voice)
+
+
+STREAM_FORMATS = {
+    "wav": "audio/wav",
+    "pcm": f"audio/L16; rate={SAMPLE_RATE}; channels=1",
+}
+
+
+def _resolve_voice(voice: str) -> str:
+    if voice not in VALID_VOICES:
+        return "af_heart"  # 🔒 safety fallback
+    return voice
+
+
+SPLIT_PATTERN = r"\n+"
+
+
+def split_segments(text: str) -> list:
+    # Same split KPipeline applies with split_pattern, minus blank lines.
+    return [seg for seg in re.split(SPLIT_PATTERN, text.strip()) if seg.strip()]
+
+
+# Longest phoneme string the model takes in one pass.
+MAX_PHONEMES = 510
+
+
+def phonemize(pipeline, segment: str) -> tuple:
+    """
+    G2P for one segment, chunked the way KPipeline.__call__ chunks it
+    for English (every voice in VALID_VOICES is "a" or "b").
+    """
+    _, tokens = pipeline.g2p(segment)
+    return tuple(ps[:MAX_PHONEMES] for _, ps, _ in pipeline.en_tokenize(tokens) if ps)
+
+
+def _segment_phonemes(pipeline, segment: str, lang_code: str) -> tuple:
+    key = PHONEME_CACHE.key(segment, lang_code)
+    phonemes = PHONEME_CACHE.get(key)
+    if phonemes is None:
+        with span("tts_g2p"):
+            phonemes = phonemize(pipeline, segment)
+        PHONEME_CACHE.put(key, phonemes)
+    return phonemes
+
+
+def _render_segment(pipeline, segment: str, voice: str, speed: float):
+    phonemes = _segment_phonemes(pipeline, segment, lang_for_voice(voice))
+    if not phonemes:
+        return None
+
+    # The inference half of KPipeline.__call__, fed cached phonemes.
+    pack = pipeline.load_voice(voice)
+    if pipeline.model is not None:
+        pack = pack.to(pipeline.model.device)
+    chunks = [
+        np.asarray(pipeline.infer(pipeline.model, ps, pack, speed).audio, dtype=np.float32)
+        for ps in phonemes
+    ]
+    return np.concatenate(chunks, axis=0)
+
+
+def render_segment(segment: str, voice: str, speed: float):
+    # Module-level so TTS_POOL can run it in a worker process.
+    return _render_segment(get_pipeline(lang_for_voice(voice)), segment, voice, speed)
+
+
+def iter_audio(text: str, voice: str, speed: float, render=render_segment):
+    """
+    Yield one audio array per segment (line) of ``text``. Segments are
+    looked up in SEGMENT_CACHE first, so only new or edited lines are
+    passed to ``render(segment, voice, speed)``.
+    """
+    for segment in split_segments(text):
+        key = SEGMENT_CACHE.key(segment, voice, speed)
+        audio = SEGMENT_CACHE.get(key)
+
+        if audio is None:
+            audio = render(segment, voice, speed)
+            if audio is None:
+                continue
+            SEGMENT_CACHE.put(key, audio)
+
+        yield audio
+
+
+def to_pcm16(audio) -> bytes:
+    samples = np.clip(np.asarray(audio, dtype=np.float32), -1.0, 1.0)
+    return (samples * 32767).astype("<i2").tobytes()
+
+
+def wav_header(data_size: int = 0xFFFFFFFF - 36) -> bytes:
+    """
+    44-byte PCM16 mono header. The default size is the "unknown length"
+    value browsers accept for WAV that is still being written.
+    """
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", min(data_size + 36, 0xFFFFFFFF), b"WAVE",
+        b"fmt ", 16, 1, 1, SAMPLE_RATE, SAMPLE_RATE * 2, 2, 16,
+        b"data", data_size,
+    )
+
+
+# format -> (libsndfile container, subtype, content type, file extension)
+AUDIO_FORMATS = {
+    "wav": ("WAV", "PCM_16", "audio/wav", "wav"),
+    "flac": ("FLAC", "PCM_16", "audio/flac", "flac"),
+    "ogg": ("OGG", "OPUS", "audio/ogg", "ogg"),
+    "mp3": ("MP3", "MPEG_LAYER_III", "audio/mpeg", "mp3"),
+}
+
+# Sample rates each encoder accepts (Opus is fixed-rate; MP3 at these
+# rates is MPEG-2 Layer III).
+SAMPLE_RATES = {
+    "wav": {8000, 16000, 22050, 24000},
+    "flac": {8000, 16000, 22050, 24000},
+    "ogg": {8000, 12000, 16000, 24000},
+    "mp3": {16000, 22050, 24000},
+}
+
+# libsndfile takes a 0..1 "compression level" instead of a bitrate; it
+# maps linearly onto these kbps ranges (level 0 = highest bitrate).
+BITRATE_RANGES = {
+    "ogg": (6, 256),
+    "mp3": (8, 160),
+}
+
+
+class AudioEncoding(NamedTuple):
+    fmt: str = "wav"
+    bitrate: Optional[int] = None  # kbps, lossy formats only
+    sample_rate: int = SAMPLE_RATE
+
+    @property
+    def content_type(self) -> str:
+        return AUDIO_FORMATS[self.fmt][2]
+
+    @property
+    def extension(self) -> str:
+        return AUDIO_FORMATS[self.fmt][3]
+
+    @property
+    def tag(self) -> str:
+        if self.bitrate:
+            return f"{self.fmt}-{self.bitrate}k-{self.sample_rate}"
+        return f"{self.fmt}-{self.sample_rate}"
+
+
+WAV = AudioEncoding()
+
+
+def make_encoding(fmt="wav", bitrate=None, sample_rate=None) -> AudioEncoding:
+    if fmt not in AUDIO_FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+    sample_rate = int(sample_rate) if sample_rate else SAMPLE_RATE
+    if sample_rate not in SAMPLE_RATES[fmt]:
+        allowed = ", ".join(str(r) for r in sorted(SAMPLE_RATES[fmt]))
+        raise ValueError(f"sample_rate for {fmt} must be one of {allowed}")
+
+    if bitrate:
+        if fmt not in BITRATE_RANGES:
+            raise ValueError(f"bitrate is not supported for {fmt}")
+        low, high = BITRATE_RANGES[fmt]
+        bitrate = min(max(int(bitrate), low), high)
+
+    return AudioEncoding(fmt, bitrate or None, sample_rate)
+
+
+def resample(audio, rate: int):
+    """
+    Downsample with a windowed-sinc low-pass followed by linear
+    interpolation. Plenty for speech; avoids pulling in scipy.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if rate == SAMPLE_RATE:
+        return audio
+
+    cutoff = 0.5 * min(rate, SAMPLE_RATE) / SAMPLE_RATE * 0.9
+    taps = np.arange(-32, 33)
+    kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(len(taps))
+    filtered = np.convolve(audio, kernel / kernel.sum(), mode="same")
+
+    n_out = int(round(len(audio) * rate / SAMPLE_RATE))
+    positions = np.arange(n_out) * (SAMPLE_RATE / rate)
+    return np.interp(positions, np.arange(len(audio)), filtered).astype(np.float32)
+
+
+def encode_audio(audio, encoding: AudioEncoding = WAV) -> bytes:
+    container, subtype, _, _ = AUDIO_FORMATS[encoding.fmt]
+
+    compression_level = None
+    if encoding.bitrate and encoding.fmt in BITRATE_RANGES:
+        low, high = BITRATE_RANGES[encoding.fmt]
+        compression_level = min((high - encoding.bitrate) / (high - low), 0.99)
+
+    buf = io.BytesIO()
+    sf.write(
+        buf,
+        resample(audio, encoding.sample_rate),
+        encoding.sample_rate,
+        format=container,
+        subtype=subtype,
+        compression_level=compression_level,
+    )
+    buf.seek(0)
+    return buf.read()
+
+
+def render_audio_bytes(
+    text: str,
+    voice: str,
+    speed: float,
+    encoding: AudioEncoding = WAV,
+) -> bytes:
+    with span("tts_generate"):
+        chunks = list(iter_audio(text, voice, speed))
+
+    if not chunks:
+        raise RuntimeError("Kokoro returned no audio")
+
+    with span("tts_concat"):
+        audio = np.concatenate(chunks, axis=0)
+    with span("tts_encode"):
+        return encode_audio(audio, encoding)
+
+
+def render_wav_bytes(text: str, voice: str, speed: float) -> bytes:
+    return render_audio_bytes(text, voice, speed, WAV)
+
+
+def render_audio_batch(texts, voice: str, speed: float, encoding: AudioEncoding = WAV) -> list:
+    """
+    Render several texts that share a voice and speed back to back, so
+    the pipeline and voice pack are resolved once for the whole group.
+
+    Returns one entry per text: its audio, or the exception rendering it
+    raised, so one bad text doesn't fail the rest of the group.
+    """
+    get_pipeline(lang_for_voice(voice)).load_voice(voice)
+    results = []
+    for text in texts:
+        try:
+            results.append(render_audio_bytes(text, voice, speed, encoding))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def synthesize_audio_bytes(
+    text: str,
+    voice: str = "af_heart",
+    speed: float = 1.0,
+    encoding: AudioEncoding = WAV,
+    render=render_audio_bytes,
+) -> bytes:
+    if not text or not text.strip():
+        raise ValueError("Text is required")
+
+    voice = _resolve_voice(voice)
+
+    key = cache_key(text, voice, speed, encoding.tag)
+    cached = AUDIO_CACHE.get(key, encoding.extension)
+    if cached is not None:
+        return cached
+
+    audio_bytes = render(text, voice, speed, encoding)
+    AUDIO_CACHE.put(key, audio_bytes, encoding.extension)
+    return audio_bytes
+
+
 def synthesize_wav_bytes(
     text: str,
     voice: str = "af_heart",
-    speed: float = 1.0
+    speed: float = 1.0,
+) -> bytes:
+    return synthesize_audio_bytes(text, voice, speed, WAV)
+
+
+async def asynthesize_audio_bytes(
+    text: str,
+    voice: str = "af_heart",
+    speed: float = 1.0,
+    encoding: AudioEncoding = WAV,
+    render=None,
 ) -> bytes:
+    """synthesize_audio_bytes() with an awaitable ``render``; cache I/O runs on a thread."""
     if not text or not text.strip():
         raise ValueError("Text is required")
 
-    if voice not in VALID_VOICES:
-        voice = "af_heart"  # 🔒 safety fallback
-
-    chunks = []
-    generator = PIPELINE(
-        text,
-        voice=voice,
-        speed=speed,
-        split_pattern=r"\n+"
-    )
+    voice = _resolve_voice(voice)
 
-    for _, _, audio in generator:
-        chunks.append(audio)
+    key = cache_key(text, voice, speed, encoding.tag)
+    cached = await asyncio.to_thread(AUDIO_CACHE.get, key, encoding.extension)
+    if cached is not None:
+        return cached
 
-    if not chunks:
-        raise RuntimeError("Kokoro returned no audio")
+    if render is None:
+        audio_bytes = await asyncio.to_thread(render_audio_bytes, text, voice, speed, encoding)
+    else:
+        audio_bytes = await render(text, voice, speed, encoding)
+    await asyncio.to_thread(AUDIO_CACHE.put, key, audio_bytes, encoding.extension)
+    return audio_bytes
 
-    audio = np.concatenate(chunks, axis=0)
 
-    buf = io.BytesIO()
-    sf.write(buf, audio, 24000, format="WAV")
-    buf.seek(0)
-    return buf.read()
+def stream_audio(
+    text: str,
+    voice: str = "af_heart",
+    speed: float = 1.0,
+    fmt: str = "wav",
+    render=render_segment,
+):
+    """
+    Yield the response body segment by segment as the pipeline produces
+    it, so only one segment is held in memory at a time. ``render`` is
+    passed to iter_audio() and only called for segments not yet cached.
+
+    WAV streams are written to the cache as they go out; a cached WAV
+    is replayed directly. The WAV header goes out together with the
+    first segment, so an error before any audio is rendered (a full
+    pool, say) is raised before the response has started.
+    """
+    if not text or not text.strip():
+        raise ValueError("Text is required")
+    if fmt not in STREAM_FORMATS:
+        raise ValueError(f"Unsupported stream format: {fmt}")
+
+    voice = _resolve_voice(voice)
+
+    header = b""
+    entry = None
+    if fmt == "wav":
+        key = cache_key(text, voice, speed, WAV.tag)
+        cached = AUDIO_CACHE.get(key)
+        if cached is not None:
+            yield cached
+            return
+        entry = AUDIO_CACHE.begin(key)
+        header = wav_header()
+        if entry:
+            entry.write(header)
+
+    data_size = 0
+    try:
+        for audio in iter_audio(text, voice, speed, render):
+            pcm = to_pcm16(audio)
+            if entry:
+                entry.write(pcm)
+            yield header + pcm
+            header = b""
+            data_size += len(pcm)
+    except BaseException:
+        if entry:
+            entry.discard()
+        raise
+
+    if entry:
+        if data_size:
+            entry.file.seek(0)
+            entry.write(wav_header(data_size))
+            entry.commit()
+        else:
+            entry.discard()
+
+    if not data_size:
+        raise RuntimeError("Kokoro returned no audio")
@@ -0,0 +1,145 @@
+# lessons/tts_onnx.py
+import functools
+import json
+import logging
+import os
+from types import SimpleNamespace
+
+import numpy as np
+from django.conf import settings
+
+from .tts_kokoro import MAX_PHONEMES
+
+logger = logging.getLogger(__name__)
+
+# Model file per TTS_ONNX_PRECISION, laid out as in the
+# onnx-community/Kokoro-82M-v1.0-ONNX export.
+MODEL_FILES = {
+    "fp32": os.path.join("onnx", "model.onnx"),
+    "int8": os.path.join("onnx", "model_quantized.onnx"),
+}
+
+
+def model_path(precision: str = None) -> str:
+    precision = precision or settings.TTS_ONNX_PRECISION
+    if precision not in MODEL_FILES:
+        raise ValueError(f"TTS_ONNX_PRECISION must be one of {', '.join(MODEL_FILES)}")
+    return os.path.join(settings.TTS_ONNX_DIR, MODEL_FILES[precision])
+
+
+def load_vocab(path: str) -> dict:
+    """Phoneme -> token id, from Kokoro's config.json or a tokenizer.json."""
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    vocab = config.get("vocab") or config.get("model", {}).get("vocab")
+    if not vocab:
+        raise ValueError(f"{path} has no vocab")
+    return vocab
+
+
+@functools.lru_cache(maxsize=None)
+def load_session(path: str, intra_op_threads: int = 0, inter_op_threads: int = 0):
+    """
+    One InferenceSession per model file and process, shared by every
+    language. 0 threads leaves the choice to ONNX Runtime (all cores),
+    which oversubscribes the CPU when TTS_WORKERS > 1.
+    """
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    if inter_op_threads > 1:
+        options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def english_g2p(lang_code: str):
+    # The G2P KPipeline builds for "a"/"b", without importing torch.
+    from misaki import en, espeak
+
+    try:
+        fallback = espeak.EspeakFallback(british=lang_code == "b")
+    except Exception as e:
+        # Words misaki doesn't know are then dropped instead of spelled out.
+        logger.warning("espeak fallback unavailable for lang %r: %s", lang_code, e)
+        fallback = None
+    return en.G2P(trf=False, british=lang_code == "b", fallback=fallback, unk="")
+
+
+class OnnxPipeline:
+    """
+    Kokoro on ONNX Runtime (TTS_ENGINE=onnx), with the same G2P/inference
+    split as KPipeline so the phoneme cache and voice pack work unchanged.
+
+    Voices come from the voice pack (attached by get_pipeline) or the
+    export's voices/<name>.bin; nothing is downloaded at runtime.
+    """
+
+    model = None
+
+    def __init__(self, lang_code, session, vocab, g2p, voices_dir=None):
+        self.lang_code = lang_code
+        self.session = session
+        self.vocab = vocab
+        self.g2p = g2p
+        self.voices_dir = voices_dir
+        self.voices = {}
+        # Exports name their inputs differently (input_ids/tokens, ...)
+        # but all take ids, style, speed in that order.
+        self._inputs = [i.name for i in session.get_inputs()]
+
+    @classmethod
+    def from_settings(cls, lang_code: str):
+        session = load_session(
+            model_path(),
+            settings.TTS_ONNX_INTRA_OP_THREADS,
+            settings.TTS_ONNX_INTER_OP_THREADS,
+        )
+        return cls(
+            lang_code,
+            session,
+            load_vocab(os.path.join(settings.TTS_ONNX_DIR, "config.json")),
+            english_g2p(lang_code),
+            os.path.join(settings.TTS_ONNX_DIR, "voices"),
+        )
+
+    def load_voice(self, voice):
+        pack = self.voices.get(voice)
+        if pack is None:
+            path = os.path.join(self.voices_dir or "", f"{voice}.bin")
+            if not os.path.exists(path):
+                raise FileNotFoundError(
+                    f"Voice {voice} is neither in the voice pack nor at {path}; "
+                    "run manage.py pack_voices"
+                )
+            pack = self.voices[voice] = np.fromfile(path, dtype=np.float32).reshape(-1, 1, 256)
+        return pack
+
+    def en_tokenize(self, tokens):
+        """
+        Split misaki tokens into chunks of at most MAX_PHONEMES. Unlike
+        KPipeline this breaks at the last token that fits rather than
+        looking back for punctuation.
+        """
+        graphemes, phonemes = [], ""
+        for token in tokens:
+            ps = (token.phonemes or "") + (" " if token.whitespace else "")
+            if phonemes.strip() and len(phonemes) + len(ps.rstrip()) > MAX_PHONEMES:
+                yield "".join(graphemes), phonemes.strip(), None
+                graphemes, phonemes = [], ""
+            graphemes.append(token.text + token.whitespace)
+            phonemes += ps
+        if phonemes.strip():
+            yield "".join(graphemes), phonemes.strip(), None
+
+    def infer(self, model, ps, pack, speed=1.0):
+        ids = [0] + [self.vocab[p] for p in ps if p in self.vocab] + [0]
+        feeds = dict(zip(self._inputs, (
+            np.asarray([ids], dtype=np.int64),
+            np.asarray(pack[len(ps) - 1], dtype=np.float32).reshape(1, -1),
+            np.asarray([speed], dtype=np.float32),
+        )))
+        audio = self.session.run(None, feeds)[0]
+        return SimpleNamespace(audio=np.asarray(audio, dtype=np.float32).reshape(-1))
@@ -0,0 +1,185 @@
+# lessons/tts_pool.py
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .metrics import capture_spans, record
+
+
+class TTSQueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("TTS queue is full, try again shortly")
+        self.retry_after = retry_after
+
+
+class TTSTimeout(Exception):
+    pass
+
+
+def _init_worker(lang_codes):
+    # Spawned workers start from a blank interpreter.
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    import django
+
+    django.setup()
+
+    from .tts_kokoro import warm
+
+    warm(lang_codes)
+
+
+def _call_in_worker(fn, *args):
+    # What the parent can't see from here: the spans the job recorded
+    # and this worker's in-memory TTS caches.
+    from .tts_cache import PHONEME_CACHE, SEGMENT_CACHE
+
+    result, spans = capture_spans(fn, *args)
+    caches = {
+        "tts_segment_cache": SEGMENT_CACHE.stats(),
+        "tts_phoneme_cache": PHONEME_CACHE.stats(),
+    }
+    return result, spans, os.getpid(), caches
+
+
+class TTSWorkerPool:
+    """
+    Runs Kokoro inference in a fixed set of worker processes, each holding
+    its own copy of the model, so request threads only wait on a future.
+
+    At most ``workers + queue_depth`` jobs are admitted at once; anything
+    beyond that is rejected with TTSQueueFull instead of piling up.
+    A job keeps its slot until the worker finishes it, even if the
+    request that submitted it has already timed out.
+
+    Spans recorded in a worker are replayed in the calling request, and
+    each worker's cache stats are kept for /metrics.
+    """
+
+    def __init__(self, workers: int, queue_depth: int, timeout: float, retry_after: int):
+        self.workers = workers
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + queue_depth)
+        self._busy = 0
+        self._worker_caches = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(settings.TTS_PRELOAD_LANGS,),
+                )
+            return self._executor
+
+    def _reset(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            self._worker_caches.clear()
+
+    def _unpack(self, packed):
+        result, spans, pid, caches = packed
+        for name, seconds in spans:
+            record(name, seconds)
+        with self._lock:
+            self._worker_caches[pid] = caches
+        return result
+
+    def worker_cache_stats(self) -> dict:
+        """``{cache name: stats}`` summed over the workers."""
+        with self._lock:
+            per_worker = list(self._worker_caches.values())
+
+        totals = {}
+        for caches in per_worker:
+            for name, stats in caches.items():
+                total = totals.setdefault(name, {})
+                for key, value in stats.items():
+                    total[key] = total.get(key, 0) + value
+        return totals
+
+    def idle(self) -> bool:
+        """True if a job admitted now would start right away."""
+        with self._lock:
+            return self._busy < max(self.workers, 1)
+
+    def _acquire(self) -> None:
+        if not self._slots.acquire(blocking=False):
+            raise TTSQueueFull(self.retry_after)
+        with self._lock:
+            self._busy += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._busy -= 1
+        self._slots.release()
+
+    @contextmanager
+    def slot(self):
+        self._acquire()
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _submit(self, fn, *args):
+        self._acquire()
+        try:
+            future = self._get_executor().submit(_call_in_worker, fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def run(self, fn, *args):
+        if not self.workers:
+            with self.slot():
+                return fn(*args)
+
+        future = self._submit(fn, *args)
+        try:
+            return self._unpack(future.result(timeout=self.timeout))
+        except FutureTimeout:
+            future.cancel()
+            raise TTSTimeout(f"TTS did not finish within {self.timeout:g}s")
+        except BrokenProcessPool:
+            # A worker died (most likely OOM); start fresh on the next job.
+            self._reset()
+            raise
+
+    async def arun(self, fn, *args):
+        """run() for async callers: awaits the job without holding a thread."""
+        if not self.workers:
+            with self.slot():
+                return await asyncio.to_thread(fn, *args)
+
+        future = self._submit(fn, *args)
+        try:
+            return self._unpack(await asyncio.wait_for(asyncio.wrap_future(future), self.timeout))
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise TTSTimeout(f"TTS did not finish within {self.timeout:g}s")
+        except BrokenProcessPool:
+            self._reset()
+            raise
+
+
+TTS_POOL = TTSWorkerPool(
+    workers=settings.TTS_WORKERS,
+    queue_depth=settings.TTS_QUEUE_DEPTH,
+    timeout=settings.TTS_TIMEOUT,
+    retry_after=settings.TTS_RETRY_AFTER,
+)
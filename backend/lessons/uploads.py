@@ -0,0 +1,185 @@
+# lessons/uploads.py
+import io
+import logging
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .catalog_cache import bump_catalog_version
+from .models import Media, Topic
+from .mp4 import MP4Error, duration_seconds, faststart
+
+logger = logging.getLogger(__name__)
+
+# Pillow format name and file extension per THUMBNAIL_FORMATS entry.
+IMAGE_FORMATS = {"webp": ("WEBP", "webp"), "jpeg": ("JPEG", "jpg")}
+
+
+# =======================
+#  THUMBNAILS
+# =======================
+def thumbnail_is_stale(topic: Topic) -> bool:
+    source = topic.thumbnail.name if topic.thumbnail else None
+    return (topic.thumbnail_variants or {}).get("source") != source
+
+
+def _variant_names(variants):
+    for fmt in IMAGE_FORMATS:
+        yield from (variants or {}).get(fmt, {}).values()
+
+
+def delete_thumbnail_variants(variants, storage) -> None:
+    for name in _variant_names(variants):
+        storage.delete(name)
+
+
+def process_thumbnail(topic: Topic) -> bool:
+    """
+    Store THUMBNAIL_WIDTHS-wide copies of the topic thumbnail in each of
+    THUMBNAIL_FORMATS. Widths at or above the original are skipped; an
+    image narrower than all of them gets one copy at its own width.
+    If the thumbnail was replaced meanwhile, the copies are discarded.
+    """
+    from PIL import Image, ImageOps
+
+    if not thumbnail_is_stale(topic):
+        return False
+
+    storage = topic.thumbnail.storage
+    old = topic.thumbnail_variants
+    variants = {"source": topic.thumbnail.name if topic.thumbnail else None}
+
+    if topic.thumbnail:
+        with topic.thumbnail.open("rb") as f:
+            image = ImageOps.exif_transpose(Image.open(f))
+            image.load()
+
+        stem = os.path.splitext(os.path.basename(topic.thumbnail.name))[0]
+        widths = [w for w in settings.THUMBNAIL_WIDTHS if w < image.width] or [image.width]
+        for fmt in settings.THUMBNAIL_FORMATS:
+            pil_format, extension = IMAGE_FORMATS[fmt]
+            variants[fmt] = {}
+            for width in widths:
+                height = max(round(image.height * width / image.width), 1)
+                resized = image.resize((width, height), Image.LANCZOS)
+                if pil_format == "JPEG" and resized.mode != "RGB":
+                    resized = resized.convert("RGB")
+
+                buffer = io.BytesIO()
+                resized.save(buffer, pil_format, quality=settings.THUMBNAIL_QUALITY)
+                variants[fmt][str(width)] = storage.save(
+                    f"thumbnails/{stem}_{width}.{extension}", ContentFile(buffer.getvalue())
+                )
+
+    # .update() so the post_save hook doesn't fire again. Filtered on the
+    # source so variants of an image that has since been replaced can't
+    # overwrite those of the new one.
+    current = Topic.objects.filter(pk=topic.pk)
+    if variants["source"]:
+        current = current.filter(thumbnail=variants["source"])
+    else:
+        current = current.filter(Q(thumbnail="") | Q(thumbnail__isnull=True))
+    if not current.update(thumbnail_variants=variants):
+        delete_thumbnail_variants(variants, storage)
+        return False
+    topic.thumbnail_variants = variants
+    bump_catalog_version()
+
+    delete_thumbnail_variants(old, storage)
+    return True
+
+
+# =======================
+#  VIDEOS
+# =======================
+def video_needs_processing(media: Media) -> bool:
+    return bool(media.uploaded_file) and media.processed_file != media.uploaded_file.name
+
+
+def process_video(media: Media) -> bool:
+    """
+    Move the moov atom to the front of an uploaded MP4 so playback can
+    start before the whole file is fetched, and record its duration.
+    The rewritten file is saved under a new name (uploads are served as
+    immutable) and the original deleted.
+
+    Files that aren't MP4s, or have no usable mvhd, are marked as
+    processed all the same and left alone until the upload changes.
+    Storage errors are raised and leave the upload pending. If another
+    file was uploaded meanwhile, the result is discarded.
+    """
+    if not video_needs_processing(media):
+        return False
+
+    storage = media.uploaded_file.storage
+    old_name = media.uploaded_file.name
+    update = {"processed_file": old_name}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            local = storage.path(old_name)
+        except NotImplementedError:
+            # Remote storage: pull a local copy to work from.
+            local = os.path.join(tmp, "source.mp4")
+            with storage.open(old_name, "rb") as src, open(local, "wb") as dst:
+                for chunk in src.chunks():
+                    dst.write(chunk)
+
+        try:
+            duration = duration_seconds(local)
+            rewritten = os.path.join(tmp, "faststart.mp4")
+            moved = faststart(local, rewritten)
+        except MP4Error as e:
+            logger.warning("Media %s: can't process %s: %s", media.pk, old_name, e)
+            duration, moved = None, False
+
+        if duration is not None:
+            update["duration"] = max(round(duration), 1)
+        if moved:
+            with open(rewritten, "rb") as f:
+                update["uploaded_file"] = update["processed_file"] = storage.save(old_name, File(f))
+
+    # .update() so the post_save hook doesn't fire again. Filtered on the
+    # upload so a newer one isn't overwritten with this file's copy.
+    if not Media.objects.filter(pk=media.pk, uploaded_file=old_name).update(**update):
+        if "uploaded_file" in update:
+            storage.delete(update["uploaded_file"])
+        return False
+    for field, value in update.items():
+        setattr(media, field, value)
+    if len(update) == 1:
+        return False
+
+    bump_catalog_version()
+    if "uploaded_file" in update:
+        storage.delete(old_name)
+    return True
+
+
+def schedule_upload_processing(model, pk) -> None:
+    """
+    Process a Topic thumbnail or Media upload in a background thread
+    once the transaction commits. Failures are only logged;
+    ``manage.py process_uploads`` picks them up later.
+    """
+    process = process_thumbnail if model is Topic else process_video
+
+    def run():
+        try:
+            process(model.objects.get(pk=pk))
+        except model.DoesNotExist:
+            pass
+        except Exception:
+            logger.exception("Processing %s %s failed", model.__name__, pk)
+        finally:
+            connection.close()
+
+    transaction.on_commit(
+        lambda: threading.Thread(target=run, daemon=True).start()
+    )
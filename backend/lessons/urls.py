@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
@@ -6,6 +7,9 @@ from .views import (
     GamificationProgressViewSet,
     tts_kokoro,
     kokoro_voices,
+    leaderboard,
+    leaderboard_me,
+    topic_stats,
 )
 
 router = DefaultRouter()
@@ -17,4 +21,20 @@ urlpatterns = [
     path("", include(router.urls)),
     path("tts/kokoro/", tts_kokoro),
     path("tts/kokoro/voices/", kokoro_voices),
+    path("leaderboard/", leaderboard),
+    path("leaderboard/me/", leaderboard_me),
+    path("leaderboard/topics/", topic_stats),
 ]
+
+if settings.ASYNC_VIEWS:
+    from . import async_views
+
+    # Matched ahead of the router and the sync views above.
+    urlpatterns = [
+        path("topics/", async_views.topic_list),
+        path("topics/<pk>/", async_views.topic_detail),
+        path("media/", async_views.media_list),
+        path("media/<pk>/", async_views.media_detail),
+        path("tts/kokoro/", async_views.tts_kokoro),
+        path("tts/kokoro/voices/", async_views.voices),
+    ] + urlpatterns
@@ -1,37 +1,82 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import AllowAny
-from django.http import HttpResponse
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import timedelta, timezone as dt_timezone
+from functools import partial
+from itertools import chain
 
-from .models import Topic, Media, GamificationProgress
+from .catalog_cache import CatalogCacheMixin, catalog_cached
+from .leaderboard import learner_rank, lock_learners, record_progress_changes, top_learners
+from .models import Topic, Media, GamificationProgress, LearnerSummary, TopicStats
+from .pagination import CreatedAtCursorPagination, IdCursorPagination
 from .serializers import (
     TopicSerializer,
+    TopicListSerializer,
     MediaSerializer,
     GamificationProgressSerializer,
+    GamificationProgressListSerializer,
+    ProgressEventSerializer,
+    query_list,
 )
+from .progress_buffer import PROGRESS_BUFFER
 
-from .tts_kokoro import synthesize_wav_bytes
+from .tts_kokoro import (
+    AUDIO_FORMATS,
+    STREAM_FORMATS,
+    make_encoding,
+    render_segment,
+    stream_audio,
+)
+from .tts_backends import synthesize_with_failover
+from .tts_pool import TTS_POOL, TTSQueueFull, TTSTimeout
+
+
+def _media_prefetch(prefix=""):
+    # Nested media in upload order, fetched in one query for all topics.
+    return Prefetch(f"{prefix}media", queryset=Media.objects.order_by("id"))
 
 
 # =======================
 #  TOPIC VIEWSET
 # =======================
-class TopicViewSet(viewsets.ModelViewSet):
+class TopicViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Topic.objects.all().order_by("-created_at")
     serializer_class = TopicSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = CreatedAtCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != "list" or "media" in query_list(self.request, "expand"):
+            queryset = queryset.prefetch_related(_media_prefetch())
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return TopicListSerializer
+        return TopicSerializer
 
 
 # =======================
 #  MEDIA VIEWSET
 # =======================
-class MediaViewSet(viewsets.ModelViewSet):
+class MediaViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Media.objects.all().order_by("-created_at")
     serializer_class = MediaSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     parser_classes = [MultiPartParser, FormParser]
+    pagination_class = CreatedAtCursorPagination
 
 
 # =======================
@@ -41,6 +86,47 @@ class GamificationProgressViewSet(viewsets.ModelViewSet):
     queryset = GamificationProgress.objects.all()
     serializer_class = GamificationProgressSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = IdCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != "list" or "topic" in query_list(self.request, "expand"):
+            queryset = queryset.select_related("topic").prefetch_related(
+                _media_prefetch("topic__")
+            )
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return GamificationProgressListSerializer
+        return GamificationProgressSerializer
+
+    # Keep the summary tables in step with edits made through the
+    # regular update/delete routes as well.
+    @transaction.atomic
+    def perform_update(self, serializer):
+        progress = serializer.instance
+        lock_learners([progress.user_id])
+        old = (
+            GamificationProgress.objects.filter(pk=progress.pk)
+            .values_list("stars_earned", "completed")
+            .first()
+        )
+        progress = serializer.save()
+        record_progress_changes([
+            (progress.user_id, progress.topic_id, old, (progress.stars_earned, progress.completed))
+        ])
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        lock_learners([instance.user_id])
+        old = (
+            GamificationProgress.objects.filter(pk=instance.pk)
+            .values_list("stars_earned", "completed")
+            .first()
+        )
+        record_progress_changes([(instance.user_id, instance.topic_id, old, None)])
+        instance.delete()
 
     @action(detail=False, methods=["post"], url_path="update-progress")
     def update_progress(self, request):
@@ -57,24 +143,212 @@ class GamificationProgressViewSet(viewsets.ModelViewSet):
         except Topic.DoesNotExist:
             return Response({"error": "Topic not found"}, status=404)
 
-        progress, _ = GamificationProgress.objects.update_or_create(
-            user=user,
-            topic=topic,
-            defaults={"stars_earned": stars, "completed": completed},
+        event = ProgressEventSerializer(
+            data={"topic_id": topic.id, "stars_earned": stars, "completed": completed}
         )
+        event.is_valid(raise_exception=True)
+        stars = event.validated_data["stars_earned"]
+        completed = event.validated_data["completed"]
+
+        with transaction.atomic():
+            lock_learners([user.id])
+            old = (
+                GamificationProgress.objects.filter(user=user, topic=topic)
+                .values_list("stars_earned", "completed")
+                .first()
+            )
+            progress, _ = GamificationProgress.objects.update_or_create(
+                user=user,
+                topic=topic,
+                defaults={"stars_earned": stars, "completed": completed},
+            )
+            record_progress_changes([(user.id, topic.id, old, (stars, completed))])
 
         return Response(self.get_serializer(progress).data)
 
+    @action(detail=False, methods=["post"], url_path="bulk-progress")
+    def bulk_progress(self, request):
+        events = request.data.get("events") if isinstance(request.data, dict) else request.data
+        serializer = ProgressEventSerializer(data=events, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        topic_ids = {event["topic_id"] for event in serializer.validated_data}
+        known = set(Topic.objects.filter(id__in=topic_ids).values_list("id", flat=True))
+
+        accepted = 0
+        for event in serializer.validated_data:
+            if event["topic_id"] not in known:
+                continue
+            PROGRESS_BUFFER.add(
+                request.user.id,
+                event["topic_id"],
+                event["stars_earned"],
+                event["completed"],
+            )
+            accepted += 1
+
+        return Response(
+            {"accepted": accepted, "unknown_topics": sorted(topic_ids - known)},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+    @action(detail=False, methods=["get"])
+    def sync(self, request):
+        """
+        The caller's progress rows written after ``?since=<watermark>``
+        (all of them when omitted) as ``[topic_id, stars, completed]``,
+        plus the watermark to send next time.
+
+        The watermark trails the clock by PROGRESS_SYNC_LAG so rows from
+        writes still in flight aren't skipped; rows inside that window
+        may come back again, which is harmless since each row is the
+        full state for its topic. Deleted rows are not reported.
+        """
+        since = request.query_params.get("since")
+        if since:
+            since = parse_datetime(since)
+            if since is None or timezone.is_naive(since):
+                return Response({"error": "since must be an ISO 8601 timestamp with offset"}, status=400)
+
+        # Served by progress_user_watched_idx (user, last_watched).
+        queryset = GamificationProgress.objects.filter(user=request.user)
+        if since:
+            queryset = queryset.filter(last_watched__gt=since)
+        rows = list(
+            queryset.order_by("last_watched").values_list(
+                "topic_id", "stars_earned", "completed", "last_watched"
+            )
+        )
+
+        watermark = rows[-1][3] if rows else since
+        if watermark:
+            watermark = min(watermark, timezone.now() - timedelta(seconds=settings.PROGRESS_SYNC_LAG))
+            if since:
+                watermark = max(watermark, since)
+
+        return Response({
+            # UTC with "Z" so it can go back in a query string unescaped.
+            "watermark": watermark.astimezone(dt_timezone.utc).isoformat().replace("+00:00", "Z") if watermark else None,
+            "rows": [row[:3] for row in rows],
+        })
+
+
+# =======================
+#  LEADERBOARD
+# =======================
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def leaderboard(request):
+    try:
+        limit = min(max(int(request.query_params.get("limit", 10)), 1), 100)
+    except ValueError:
+        limit = 10
+
+    rows = top_learners(limit)
+    names = dict(
+        User.objects.filter(id__in=[row["user_id"] for row in rows]).values_list("id", "username")
+    )
+    for row in rows:
+        row["username"] = names.get(row["user_id"], "")
+
+    return Response({"results": rows})
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def leaderboard_me(request):
+    rank, total_stars, ranked = learner_rank(request.user.id)
+    summary = LearnerSummary.objects.filter(user=request.user).first()
+
+    return Response({
+        "rank": rank,
+        "ranked_learners": ranked,
+        "total_stars": total_stars,
+        "completed_topics": summary.completed_topics if summary else 0,
+    })
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def topic_stats(request):
+    return Response({
+        "results": list(
+            TopicStats.objects.values("topic_id", "learners", "completions").order_by("topic_id")
+        )
+    })
+
 
 # =======================
 #  TEXT-TO-SPEECH (Kokoro)
 # =======================
+def _queue_full(exc):
+    response = Response({"error": str(exc)}, status=503)
+    response["Retry-After"] = str(exc.retry_after)
+    return response
+
+
+# Accept-header aliases on top of the canonical AUDIO_FORMATS types
+ACCEPT_ALIASES = {
+    "audio/x-wav": "wav",
+    "audio/wave": "wav",
+    "audio/x-flac": "flac",
+    "audio/opus": "ogg",
+    "audio/mp3": "mp3",
+}
+
+
+def _negotiate_format(accept):
+    # Highest q wins; wildcards and unknown types fall back to WAV.
+    formats = {info[2]: fmt for fmt, info in AUDIO_FORMATS.items()}
+    formats.update(ACCEPT_ALIASES)
+
+    best, best_q = "wav", 0.0
+    for part in (accept or "").split(","):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        fmt = formats.get(media_type.lower())
+        if fmt and q > best_q:
+            best, best_q = fmt, q
+    return best
+
+
+class AudioNegotiation(DefaultContentNegotiation):
+    """
+    tts_kokoro picks the audio format from Accept itself and returns a
+    plain HttpResponse, so DRF only ever renders its JSON error bodies.
+    Render those as JSON instead of rejecting Accept: audio/* with 406.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            return renderers[0], renderers[0].media_type
+
+
+def _pooled_stream(text, voice, speed, fmt):
+    # Cached audio streams straight from disk; only segments that still
+    # need rendering go through the pool, one job (and slot) each.
+    return stream_audio(text, voice, speed, fmt, render=partial(TTS_POOL.run, render_segment))
+
+
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def tts_kokoro(request):
+    if not isinstance(request.data, dict):
+        return Response({"error": "Request body must be a JSON object"}, status=400)
+
     text = request.data.get("text")
     voice = request.data.get("voice", "af_heart")
     speed = request.data.get("speed", 1.0)
+    stream = request.data.get("stream", False)
+    fmt = request.data.get("format")
 
     if not text:
         return Response({"error": "Text is required"}, status=400)
@@ -84,16 +358,58 @@ def tts_kokoro(request):
     except Exception:
         speed = 1.0
 
+    if stream in (True, "true", "1", 1):
+        fmt = fmt or "wav"
+        if fmt not in STREAM_FORMATS:
+            return Response({"error": f"Unsupported stream format: {fmt}"}, status=400)
+
+        chunks = _pooled_stream(text, voice, speed, fmt)
+        try:
+            # Pull the first chunk here so setup errors still become a 500.
+            first = next(chunks)
+        except TTSQueueFull as e:
+            return _queue_full(e)
+        except TTSTimeout as e:
+            return Response({"error": str(e)}, status=504)
+        except Exception as e:
+            return Response({"error": str(e)}, status=500)
+
+        response = StreamingHttpResponse(
+            chain([first], chunks), content_type=STREAM_FORMATS[fmt]
+        )
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    try:
+        encoding = make_encoding(
+            fmt or _negotiate_format(request.headers.get("Accept")),
+            bitrate=request.data.get("bitrate"),
+            sample_rate=request.data.get("sample_rate"),
+        )
+    except (TypeError, ValueError) as e:
+        return Response({"error": str(e)}, status=400)
+
     try:
-        wav_bytes = synthesize_wav_bytes(text, voice, speed)
-        return HttpResponse(wav_bytes, content_type="audio/wav")
+        audio_bytes, backend = synthesize_with_failover(text, voice, speed, encoding)
+        response = HttpResponse(audio_bytes, content_type=encoding.content_type)
+        response["Vary"] = "Accept"
+        response["X-TTS-Backend"] = backend
+        return response
+    except TTSQueueFull as e:
+        return _queue_full(e)
+    except TTSTimeout as e:
+        return Response({"error": str(e)}, status=504)
     except Exception as e:
         return Response({"error": str(e)}, status=500)
 
 
+tts_kokoro.cls.content_negotiation_class = AudioNegotiation
+
+
 # =======================
 #  VOICE LIST (REAL)
 # =======================
+@catalog_cached
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def kokoro_voices(request):
@@ -0,0 +1,138 @@
+# lessons/voice_pack.py
+import json
+import logging
+import os
+import struct
+import tempfile
+import threading
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# File layout: MAGIC, little-endian u64 header length, JSON header
+# {"voices": {name: {"offset", "shape", "dtype"}}}, then the raw arrays,
+# each starting on an ALIGN-byte boundary.
+MAGIC = b"KVPACK01"
+ALIGN = 64
+
+
+class VoicePackError(ValueError):
+    pass
+
+
+def _aligned(n: int) -> int:
+    return -(-n // ALIGN) * ALIGN
+
+
+def write_voice_pack(path: str, voices: dict) -> int:
+    """
+    Write ``{name: array}`` to ``path`` as one voice pack file, replacing
+    any existing one atomically. Returns the file size.
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in sorted(voices.items())}
+
+    entries = {}
+    offset = 0
+    for name, array in arrays.items():
+        entries[name] = {"offset": offset, "shape": list(array.shape), "dtype": array.dtype.str}
+        offset = _aligned(offset + array.nbytes)
+
+    header = json.dumps({"voices": entries}, separators=(",", ":")).encode("utf-8")
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+            for name, array in arrays.items():
+                f.seek(data_start + entries[name]["offset"])
+                f.write(array.tobytes())
+            f.truncate(data_start + offset)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return data_start + offset
+
+
+class VoicePack:
+    """
+    Read-only view of a voice pack file, memory-mapped on first use.
+
+    The mapping is copy-on-write: every process reading the same file
+    shares its pages through the page cache, and nothing ever writes to
+    them. A missing file just means an empty pack.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._voices = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        if self._voices is not None:
+            return self._voices
+
+        with self._lock:
+            if self._voices is None:
+                self._voices = self._map() if self.path and os.path.exists(self.path) else {}
+        return self._voices
+
+    def _map(self) -> dict:
+        with open(self.path, "rb") as f:
+            prefix = f.read(len(MAGIC) + 8)
+            if len(prefix) < len(MAGIC) + 8 or prefix[:len(MAGIC)] != MAGIC:
+                raise VoicePackError(f"{self.path} is not a voice pack")
+            (length,) = struct.unpack("<Q", prefix[len(MAGIC):])
+            try:
+                entries = json.loads(f.read(length))["voices"]
+            except (ValueError, KeyError, TypeError) as e:
+                raise VoicePackError(f"{self.path}: bad header: {e!r}") from e
+
+        raw = np.memmap(self.path, dtype=np.uint8, mode="c")
+        data_start = _aligned(len(MAGIC) + 8 + length)
+
+        voices = {}
+        for name, entry in entries.items():
+            dtype = np.dtype(entry["dtype"])
+            start = data_start + entry["offset"]
+            end = start + dtype.itemsize * int(np.prod(entry["shape"]))
+            if end > raw.size:
+                raise VoicePackError(f"{self.path}: voice {name!r} is truncated")
+            voices[name] = raw[start:end].view(dtype).reshape(entry["shape"])
+        return voices
+
+    def names(self) -> list:
+        return sorted(self._load())
+
+    def get(self, name: str):
+        return self._load().get(name)
+
+    def attach(self, pipeline, lang_code: str, convert=None) -> int:
+        """
+        Put this language's voices into ``pipeline.voices``, the dict
+        KPipeline.load_voice checks before downloading anything.
+        ``convert`` turns the mapped arrays into what the pipeline
+        expects (torch.from_numpy for Kokoro, which doesn't copy).
+        A pack that can't be read is logged and skipped.
+        """
+        try:
+            voices = self._load()
+        except (OSError, VoicePackError) as e:
+            logger.warning("Ignoring voice pack: %s", e)
+            self._voices = {}
+            return 0
+
+        attached = 0
+        for name, array in voices.items():
+            if name.startswith(lang_code) and name not in pipeline.voices:
+                pipeline.voices[name] = convert(array) if convert else array
+                attached += 1
+        return attached
+
+
+VOICE_PACK = VoicePack(settings.TTS_VOICE_PACK)
@@ -1 +1,2 @@
 from .sdk import speech
+from .client import AsyncVoiceRSSClient, VoiceRSSClient, VoiceRSSError
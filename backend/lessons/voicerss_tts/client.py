@@ -0,0 +1,107 @@
+# Pooled Voice RSS client: keep-alive connections, timeouts and retries
+import asyncio
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_URL = "https://api.voicerss.org/"
+
+# Worth another try: rate limiting and transient upstream failures.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class VoiceRSSError(Exception):
+    pass
+
+
+class VoiceRSSClient:
+    """
+    Thread-safe client that reuses TCP/TLS connections across calls.
+
+    Connection errors, timeouts and RETRY_STATUSES are retried up to
+    ``retries`` times with full-jitter exponential backoff. API errors
+    (a 200 body starting with "ERROR") are not retried.
+    """
+
+    def __init__(
+        self,
+        key=None,
+        base_url=DEFAULT_URL,
+        timeout=10.0,
+        retries=2,
+        backoff=0.25,
+        pool_size=10,
+    ):
+        self.key = key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def speech(self, src, hl="en-us", v="", r=0, c="WAV", f="24khz_16bit_mono", ssml=False):
+        if not self.key:
+            raise VoiceRSSError("The API key is undefined")
+        return self.request({
+            "key": self.key,
+            "src": src,
+            "hl": hl,
+            "v": v,
+            "r": r,
+            "c": c,
+            "f": f,
+            "ssml": "true" if ssml else "false",
+        })
+
+    def request(self, params) -> bytes:
+        error = None
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+
+            try:
+                response = self.session.post(self.base_url, data=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+                continue
+
+            if response.status_code in RETRY_STATUSES:
+                error = VoiceRSSError(f"HTTP {response.status_code} {response.reason}")
+                continue
+            if response.status_code != 200:
+                raise VoiceRSSError(f"HTTP {response.status_code} {response.reason}")
+            if response.content.startswith(b"ERROR"):
+                raise VoiceRSSError(response.content.decode("utf-8", "replace"))
+            return response.content
+
+        raise VoiceRSSError(str(error)) from error
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncVoiceRSSClient:
+    """
+    asyncio front for ASGI views. Calls run on the default executor
+    against the pooled sync client, capped at ``max_concurrency`` so a
+    burst can't exhaust the connection pool.
+    """
+
+    def __init__(self, client: VoiceRSSClient, max_concurrency=10):
+        self.client = client
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def speech(self, *args, **kwargs) -> bytes:
+        async with self._semaphore:
+            return await asyncio.to_thread(self.client.speech, *args, **kwargs)
+
+    async def request(self, params) -> bytes:
+        async with self._semaphore:
+            return await asyncio.to_thread(self.client.request, params)
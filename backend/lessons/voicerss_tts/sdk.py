@@ -1,6 +1,7 @@
 # Voice RSS text-to-speech SDK for Python 3.x
-import http.client
-import urllib.parse
+from .client import VoiceRSSClient, VoiceRSSError
+
+__clients = {}
 
 def speech(settings):
     __validate(settings)
@@ -15,30 +16,20 @@ def __validate(settings):
 def __request(settings):
     result = {'error': None, 'response': None}
 
-    headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8'}
-    params = urllib.parse.urlencode(__buildRequest(settings))
-    
-    if 'ssl' in settings and settings['ssl']:
-        conn = http.client.HTTPSConnection('api.voicerss.org:443')
-    else:
-        conn = http.client.HTTPConnection('api.voicerss.org:80')
-        
-    conn.request('POST', '/', params, headers)
-    
-    response = conn.getresponse()
-    content = response.read()
-    
-    if response.status != 200:
-        result['error'] = response.reason
-    elif content.find(b'ERROR') == 0:
-        result['error'] = content
-    else:
-        result['response'] = content
-        
-    conn.close()
+    try:
+        result['response'] = __client(settings).request(__buildRequest(settings))
+    except VoiceRSSError as e:
+        result['error'] = str(e)
 
     return result
 
+def __client(settings):
+    # One pooled client per scheme, so repeated calls reuse connections.
+    scheme = 'https' if 'ssl' in settings and settings['ssl'] else 'http'
+    if scheme not in __clients:
+        __clients[scheme] = VoiceRSSClient(base_url=scheme + '://api.voicerss.org/')
+    return __clients[scheme]
+
 def __buildRequest(settings):
     params = {'key': '', 'src': '', 'hl': '', 'v': '', 'r': '', 'c': '', 'f': '', 'ssml': '', 'b64': ''}
     
@@ -42,14 +42,28 @@ export async function createMedia(data) {
   return await response.json();
 }
 
+// only the fields the grid, player and admin actually render
+const TOPIC_LIST_FIELDS =
+  "id,title,letter,theme,description,thumbnail,thumbnails,is_active,narration,narration_voice";
+
 export async function fetchTopics() {
-  const response = await authorizedFetch(`${API_URL}/topics/`, {
-    method: "GET",
-    headers: { "Content-Type": "application/json" },
-  });
+  const topics = [];
+  let url = `${API_URL}/topics/?expand=media&fields=${TOPIC_LIST_FIELDS}&page_size=200`;
+
+  // follow the cursor until the last page
+  while (url) {
+    const response = await authorizedFetch(url, {
+      method: "GET",
+      headers: { "Content-Type": "application/json" },
+    });
+
+    if (!response.ok) throw new Error("Failed to fetch topics");
+    const page = await response.json();
+    topics.push(...page.results);
+    url = page.next;
+  }
 
-  if (!response.ok) throw new Error("Failed to fetch topics");
-  return await response.json();
+  return topics;
 }
 
 export const updateTopic = async (id, data) => {
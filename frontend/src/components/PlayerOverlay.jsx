@@ -149,6 +149,12 @@ export default function PlayerOverlay({ topic, onClose, onFinished }) {
       return;
     }
 
+    // use the pre-rendered narration when it matches the chosen voice
+    if (topic.narration && topic.narration_voice === voice) {
+      audioRef.current = new Audio(topic.narration);
+      return;
+    }
+
     if (isLoading) return;
     setIsLoading(true);
 
@@ -33,6 +33,13 @@ export default function TopicCard({ topic, onClick }) {
       ? topic.thumbnail
       : `${import.meta.env.VITE_API_URL}${topic.thumbnail}`;
 
+  // resized copies generated on upload, e.g. "https://…/apple_320.webp 320w"
+  const thumbnailSrcSet = (format) =>
+    Object.entries(topic.thumbnails?.[format] || {})
+      .map(([width, url]) => `${url} ${width}w`)
+      .join(", ");
+  const thumbnailSizes = "(max-width: 640px) 100vw, 400px";
+
   return (
     <div
       className="relative group bg-white rounded-xl overflow-hidden transition-all hover:scale-[1.02] cursor-pointer"
@@ -43,12 +50,23 @@ export default function TopicCard({ topic, onClick }) {
       <div className="relative h-48 w-full overflow-hidden rounded-t-xl">
         {/* Thumbnail or Video */}
         {!isHovered ? (
-          <img
-            src={thumbnailSrc}
-            alt={topic.title}
-            onError={(e) => (e.target.src = "/placeholder.png")}
-            className="h-full w-full object-cover transition-transform duration-500 group-hover:scale-105"
-          />
+          <picture>
+            {thumbnailSrcSet("webp") && (
+              <source
+                type="image/webp"
+                srcSet={thumbnailSrcSet("webp")}
+                sizes={thumbnailSizes}
+              />
+            )}
+            <img
+              src={thumbnailSrc}
+              srcSet={thumbnailSrcSet("jpeg") || undefined}
+              sizes={thumbnailSizes}
+              alt={topic.title}
+              onError={(e) => (e.target.src = "/placeholder.png")}
+              className="h-full w-full object-cover transition-transform duration-500 group-hover:scale-105"
+            />
+          </picture>
         ) : youtubeEmbed ? (
           <iframe
             src={youtubeEmbed}